@@ -6,9 +6,11 @@ import srh_code.parameters as param
 from srh_code.utilities import helpers
 from srh_code.utilities import tables, charts, maps
 import srh_code.utilities.publication_files as publication
-from srh_code.utilities.write import write_data
+from srh_code.utilities import chart_images
+from srh_code.utilities.write import write_data, write_session
+import srh_code.utilities.processing.processing_publication as processing
 from srh_code.utilities import load, pre_processing
-import xlwings as xw
+from srh_code.utilities import data_connections
 
 
 def main():
@@ -38,6 +40,7 @@ def main():
     run_charts_ahas = param.RUN_CHARTS_AHAS
     run_maps_srhad = param.RUN_MAPS_SRHAD
     run_pub_outputs = param.RUN_PUBLICATION_OUTPUTS
+    spill_reference_data = param.SPILL_REFERENCE_DATA
     # Load the expected column content for the external import files
     cols_prescribing_source = param.PRESCRIBING_SOURCE_COLS
     cols_prescribing_ref = param.PRESCRIBING_REF_COLS
@@ -46,24 +49,51 @@ def main():
 
     # Run the data imports and pre-processing
     if run_tables_srhad or run_charts_srhad or run_tables_ahas or run_charts_ahas or run_maps_srhad:
-        # Import LA reference data for the current period and
-        # apply pre-processing updates. Add to cache for later use.
-        df_org_ref = pre_processing.create_la_ref_data()
-        df_org_ref.to_feather('cached_dataframes/df_la_ref.ft')
-
-        # Import the old to new LSOA lookup
-        df_lsoa_ref = load.import_lsoa_ref()
-        # Import and process the IMD reference data (LSOA to IMD decile lookup)
-        df_imd_ref = pre_processing.create_imdref_data()
-        # Import and process population data. Add to cached folder
-        df_pop = load.import_population_data()
-        df_pop = pre_processing.update_population_data(df_pop,
-                                                       df_org_ref,
-                                                       df_imd_ref)
-        df_pop.to_feather("cached_dataframes/df_pop.ft")
-
-        # Import the srhad source data
-        df_srhad = load.import_reporting_table_data()
+        # Set the data imports and the reference data processing steps that
+        # depend on them. These are run concurrently, with each step starting
+        # as soon as the imports it depends on have completed.
+        import_tasks = {
+            # Import LA reference data for the current period and apply
+            # pre-processing updates
+            "df_la_ref": (lambda: load.import_la_ref_data(fyear), []),
+            "df_org_ref": (pre_processing.update_la_ref_data, ["df_la_ref"]),
+            # Import the old to new LSOA lookup
+            "df_lsoa_ref": (load.import_lsoa_ref, []),
+            # Import and process the IMD reference data (LSOA to IMD decile
+            # lookup)
+            "df_imd_lsoa": (load.import_imd_lsoa, []),
+            "df_imd_decile": (load.import_imd_decile, []),
+            "df_imd_ref": (pre_processing.join_imd_decile,
+                           ["df_imd_lsoa", "df_imd_decile"]),
+            # Import and process population data
+            "df_pop_source": (load.import_population_data, []),
+            "df_pop": (pre_processing.update_population_data,
+                       ["df_pop_source", "df_org_ref", "df_imd_ref"]),
+            # Import the srhad source data
+            "df_srhad": (load.import_reporting_table_data, [])}
+        if run_tables_ahas or run_charts_ahas:
+            # Import the ahas source data (for sterilisation & vasectomy outputs)
+            import_tasks["df_ahas"] = (load.import_ahas_vas_ster_data, [])
+
+        imports = load.run_import_tasks(import_tasks)
+        df_org_ref = imports["df_org_ref"]
+        df_lsoa_ref = imports["df_lsoa_ref"]
+        df_imd_ref = imports["df_imd_ref"]
+        df_pop = imports["df_pop"]
+        df_srhad = imports["df_srhad"]
+        df_ahas = imports.get("df_ahas")
+        # Release the unprocessed imports
+        del imports
+
+        # Add the reference data to cache if required
+        if spill_reference_data:
+            df_org_ref.to_feather('cached_dataframes/df_la_ref.ft')
+            df_pop.to_feather("cached_dataframes/df_pop.ft")
+
+        # Hold the population and organisation reference data in memory for
+        # use by all the outputs
+        processing.load_reference_data(df_pop, df_org_ref)
+
         # Run pre-processing updates on the srhad data
         df_srhad = pre_processing.update_srhad_source_data(df_srhad,
                                                            df_org_ref,
@@ -72,11 +102,12 @@ def main():
                                                            fyear)
 
         if run_tables_ahas or run_charts_ahas:
-            # Import the ahas source data (for sterilisation & vasectomy outputs)
-            df_ahas = load.import_ahas_vas_ster_data()
             # Run pre-processing on the sterilisation & vasectomy data (srhad and ahas)
             df_ster_vas = pre_processing.create_ster_vas_data(df_srhad, df_ahas)
 
+    # All sql imports are complete, so close the database connection pools
+    data_connections.dispose_engines()
+
     # Run prescribing imports and pre-processing
     if run_tables_prescribing or run_charts_prescribing:
         # Import the prescribing source data and reference data files.
@@ -91,70 +122,75 @@ def main():
                                                                 df_pres_ref,
                                                                 cyear)
 
+    # Open a workbook session for each template, so that each is opened once
+    # and saved once for all of its outputs
+    tables_wb = write_session.open_workbook(tables_template)
+    charts_wb = write_session.open_workbook(charts_template)
+    maps_wb = write_session.open_workbook(maps_template)
+
     if run_tables_srhad:
         # Run the SRHAD tables as defined by the items in get_tables_shrad
         all_tables = tables.get_tables_srhad()
-        write_data.write_outputs(df_srhad, all_tables, tables_template,
+        write_data.write_outputs(df_srhad, all_tables, tables_wb,
                                  fyear)
 
     if run_tables_prescribing:
         # Run the prescribing tables as defined by the items in get_tables_prescribing
         all_tables = tables.get_tables_prescribing()
-        write_data.write_outputs(df_prescribing, all_tables, tables_template,
+        write_data.write_outputs(df_prescribing, all_tables, tables_wb,
                                  cyear)
 
     if run_tables_ahas:
         # Run the AHAS tables as defined by the items in get_tables_ahas
         all_tables = tables.get_tables_ahas()
-        write_data.write_outputs(df_ster_vas, all_tables, tables_template,
+        write_data.write_outputs(df_ster_vas, all_tables, tables_wb,
                                  fyear)
 
     # If any table content was updated, than save the Excel master tables
     # with the updated data and close Excel
     if run_tables_srhad or run_tables_prescribing or run_tables_ahas:
-        wb = xw.Book(tables_template)
-        wb.save()
-        xw.apps.active.api.Quit()
+        write_session.save_workbook(tables_wb)
 
     if run_charts_srhad:
         # Run the srhad chart outputs as defined by the items in get_charts_srhad
         all_charts = charts.get_charts_srhad()
-        write_data.write_outputs(df_srhad, all_charts, charts_template,
+        write_data.write_outputs(df_srhad, all_charts, charts_wb,
                                  fyear)
 
     if run_charts_ahas:
         # Run the AHAS chart outputs as defined by the items in get_charts_ahas
         all_charts = charts.get_charts_ahas()
-        write_data.write_outputs(df_ster_vas, all_charts, charts_template,
+        write_data.write_outputs(df_ster_vas, all_charts, charts_wb,
                                  fyear)
 
     if run_charts_prescribing:
         # Run the srhad chart outputs as defined by the items in get_charts_srhad
         all_charts = charts.get_charts_prescribing()
-        write_data.write_outputs(df_prescribing, all_charts, charts_template,
+        write_data.write_outputs(df_prescribing, all_charts, charts_wb,
                                  cyear)
 
     # If any chart content was updated, than save the Excel master tables
     # with the updated data and close Excel
     if run_charts_srhad or run_charts_prescribing or run_charts_ahas:
-        wb = xw.Book(charts_template)
-        wb.save()
-        xw.apps.active.api.Quit()
+        write_session.save_workbook(charts_wb)
 
     if run_maps_srhad:
         # Run the map tables as defined by the items in get_maps_srhad
         all_maps = maps.get_maps_srhad()
-        write_data.write_outputs(df_srhad, all_maps, maps_template, fyear)
-        wb = xw.Book(maps_template)
-        wb.save()
-        xw.apps.active.api.Quit()
+        write_data.write_outputs(df_srhad, all_maps, maps_wb, fyear)
+        write_session.save_workbook(maps_wb)
 
     # Save the cms ready tables and chart files to the publication area
     if run_pub_outputs:
         publication.save_tables(tables_template)
-        publication.save_charts_as_image(charts_template)
-
-    # Remove the cached dataframe folder and all it's contents
+        if param.CHART_IMAGE_BACKEND == "matplotlib":
+            chart_images.save_charts_as_image(charts_template)
+        else:
+            publication.save_charts_as_image(charts_template)
+
+    # Release the in-memory reference data, and remove the cached dataframe
+    # folder and all it's contents
+    processing.clear_reference_data()
     helpers.remove_folder("cached_dataframes/")
 
 
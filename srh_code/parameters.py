@@ -27,6 +27,36 @@ SERVER = "server"
 DATABASE = "database"
 TABLE_REP = "table"
 
+# Set the connection pool for the sql database engines (one engine is shared by
+# all imports from the same server and database). Pre-ping checks that each
+# pooled connection is still open before it is used.
+SQL_POOL_SIZE = 5
+SQL_POOL_PRE_PING = True
+# Set the number of rows read at a time when importing the SRHAD data. Each
+# chunk is converted to the column data types in utilities/schema.py as it
+# is read, which keeps the memory used by the import low.
+SQL_CHUNKSIZE = 200000
+
+# Set whether the results of the sql imports should be saved to (and read back
+# from) a snapshot cache of Parquet files (True or False), so that reruns of
+# the pipeline do not re-query the databases. Snapshots are kept for each
+# distinct query, and are re-queried once older than SQL_CACHE_TTL_HOURS (set
+# to None for no expiry), or for all queries if SQL_CACHE_REFRESH is True.
+USE_SQL_CACHE = False
+SQL_CACHE_DIR = INPUT_DIR / "sql_cache"
+SQL_CACHE_TTL_HOURS = 24
+SQL_CACHE_REFRESH = False
+
+# Set the number of data imports (and the processing steps that depend on
+# them) that can be run at the same time. This should not be more than the
+# SQL_POOL_SIZE.
+IMPORT_THREADS = 4
+
+# Set whether the memory used by each pre-processing step of the SRHAD data
+# should be logged (True or False). This slows down the pre-processing, so
+# should only be used to investigate memory use.
+TRACK_MEMORY = False
+
 # Set the names of the corporate reference data tables that contain the site
 # (clinic) details for NHS and independent organisations (used for adding clinic
 # details to the OHID extract).
@@ -72,6 +102,43 @@ RUN_MAPS_SRHAD = True  # Map outputs that use SRHAD data
 # Set whether the final publication outputs should be written as part of the
 # pipeline
 RUN_PUBLICATION_OUTPUTS = True
+
+# Set whether the population and organisation reference data should also be
+# written to the cached_dataframes folder (True or False). The data is always
+# held in memory for use by the outputs, so this is only needed for debugging.
+SPILL_REFERENCE_DATA = False
+
+# Set whether the outputs sharing the same filters should be aggregated from a
+# single pre-computed group-by cube (True or False), and the largest size of a
+# cube, relative to the number of records it is built from, for it to be used.
+USE_OUTPUT_CUBES = True
+OUTPUT_CUBE_MAX_RATIO = 0.5
+
+# Set the number of processes used to create the outputs concurrently. If set
+# to None then the number of available cores is used, and if set to 1 then
+# the outputs are created one at a time.
+# Where worker processes cannot be forked (e.g. on Windows) each worker is
+# started with its own copy of the source data, and rebuilds the filter cache
+# and output cubes from it, so the peak memory use grows with every worker.
+# In that case the number of processes is capped at SPAWN_OUTPUT_PROCESSES,
+# which should only be raised where there is enough memory to hold a copy of
+# the pre-processed SRHAD data per process.
+OUTPUT_PROCESSES = None
+SPAWN_OUTPUT_PROCESSES = 1
+
+# Set the backend used to write outputs to the Excel templates. Valid options
+# are "xlwings" (drives Excel, so requires Excel to be installed) or "openpyxl"
+# (headless, so can be run without Excel). The same backend is used to save
+# the final publication tables. Note that openpyxl does not fully retain chart
+# and image formatting, so should not be used for the charts template.
+EXCEL_WRITE_BACKEND = "xlwings"
+
+# Set how the chart images are saved. Valid options are "excel" (each chart is
+# copied from Excel as an image) or "matplotlib" (headless, each chart is
+# redrawn from its definition in the chart template, with unchanged charts
+# skipped).
+CHART_IMAGE_BACKEND = "excel"
+
 # Worksheets to be removed from final publication file
 TABLES_REMOVE = ["Crosschecks"]
 
@@ -88,6 +155,11 @@ FILTER_TYPES = ["persons_first_contact", "persons_main_contact",
                 "females_emergency_contraception",
                 "females_emergency_contraception_imd"]
 
+# Columns of the source data that hold the SRH Care Activity codes
+SRH_ACTIVITY_COLUMNS = ["SRHCareActivity1", "SRHCareActivity2",
+                        "SRHCareActivity3", "SRHCareActivity4",
+                        "SRHCareActivity5", "SRHCareActivity6"]
+
 # SRH Care Activity groupings dictionary
 SRH_ACTIVITY_REF = {"SRH_advice": [1],
                     "Pregnancy": [2, 3],
@@ -0,0 +1,504 @@
+"""
+Purpose of the script: contains the headless chart rendering functions, which
+save the charts in the chart template as images without using Excel. The
+chart definitions (type, title and series data ranges) are read from the
+template with openpyxl, and the charts are redrawn with matplotlib.
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import openpyxl
+from openpyxl.utils.cell import range_to_tuple
+from openpyxl.utils.units import pixels_to_EMU, points_to_pixels, EMU_to_cm
+from openpyxl.drawing.spreadsheet_drawing import TwoCellAnchor
+import matplotlib
+import srh_code.parameters as param
+import logging
+
+# Render without a display
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+# Width in pixels of the widest digit in the default workbook font (Calibri
+# 11), which Excel uses to convert column widths to pixels
+MAX_DIGIT_WIDTH = 7
+
+
+def read_range_values(wb, wb_formulas, ref):
+    """
+    Reads the values of a worksheet range reference (as used in chart series
+    definitions, e.g. 'Chart 1'!$B$5:$B$15) as a flat list.
+
+    Parameters
+    ----------
+    wb : openpyxl.Workbook
+        Workbook loaded with the values last calculated by Excel.
+    wb_formulas : openpyxl.Workbook
+        The same workbook loaded with its formulas, used to check for formula
+        cells without a calculated value.
+    ref : str
+        Range reference including the worksheet name.
+
+    Returns
+    -------
+    list
+    """
+    sheetname, (min_col, min_row, max_col, max_row) = range_to_tuple(ref)
+    bounds = {"min_row": min_row, "max_row": max_row,
+              "min_col": min_col, "max_col": max_col}
+    values = [value for row in wb[sheetname].iter_rows(**bounds,
+                                                       values_only=True)
+              for value in row]
+
+    # Formulas have no calculated value when the file was last saved without
+    # Excel (e.g. by the openpyxl write backend), so would be drawn as blanks
+    if None in values:
+        formulas = [value for row in wb_formulas[sheetname].iter_rows(
+                        **bounds, values_only=True)
+                    for value in row]
+        for value, formula in zip(values, formulas):
+            if value is None and isinstance(formula, str) \
+                    and formula.startswith("="):
+                raise ValueError(f"The chart data in {ref} includes formulas "
+                                 "that have not been calculated. Open and "
+                                 "save the file in Excel before saving the "
+                                 "chart images.")
+
+    return values
+
+
+def read_reference(wb, wb_formulas, data_source):
+    """
+    Reads the values of a chart data source (series name, categories or
+    values), which will either reference a worksheet range or hold literal
+    values.
+
+    Parameters
+    ----------
+    wb : openpyxl.Workbook
+    wb_formulas : openpyxl.Workbook
+        See read_range_values.
+    data_source : openpyxl chart data source (e.g. NumDataSource)
+
+    Returns
+    -------
+    list
+    """
+    if data_source is None:
+        return []
+
+    for ref_type in ["numRef", "strRef", "multiLvlStrRef"]:
+        ref = getattr(data_source, ref_type, None)
+        if ref is not None and ref.f is not None:
+            return read_range_values(wb, wb_formulas, ref.f)
+
+    # Literal values held in the chart
+    for lit_type in ["numLit", "strLit"]:
+        lit = getattr(data_source, lit_type, None)
+        if lit is not None:
+            return [point.v for point in lit.pt]
+
+    return []
+
+
+def read_text(text):
+    """
+    Extracts the plain text of a chart title.
+
+    Parameters
+    ----------
+    text : openpyxl.chart.title.Title
+
+    Returns
+    -------
+    str
+    """
+    if text is None or text.tx is None or text.tx.rich is None:
+        return ""
+
+    return "".join(run.t for paragraph in text.tx.rich.p
+                   for run in (paragraph.r or []))
+
+
+def series_colour(series):
+    """
+    Extracts the fill (or line) colour set for a chart series, if any.
+
+    Parameters
+    ----------
+    series : openpyxl.chart.series.Series
+
+    Returns
+    -------
+    str
+        Hex colour (e.g. "#005EB8"), or None if not set as an RGB colour.
+    """
+    properties = series.graphicalProperties
+    if properties is None:
+        return None
+
+    for fill in [properties.solidFill,
+                 properties.line.solidFill if properties.line else None]:
+        if fill is not None and fill.srgbClr is not None:
+            return "#" + str(fill.srgbClr.val)[-6:]
+
+    return None
+
+
+def column_width(sht, col):
+    """
+    Returns the width of a worksheet column in pixels, as displayed by Excel.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    col : int
+        Column number (starting from 1).
+
+    Returns
+    -------
+    int
+    """
+    # Column widths are held against the first column of each range of
+    # columns with the same width
+    for dimension in sht.column_dimensions.values():
+        if dimension.min <= col <= dimension.max:
+            if dimension.hidden:
+                return 0
+            if dimension.customWidth:
+                return int((256 * dimension.width + int(128 / MAX_DIGIT_WIDTH))
+                           / 256 * MAX_DIGIT_WIDTH)
+
+    if sht.sheet_format.defaultColWidth is not None:
+        return int((256 * sht.sheet_format.defaultColWidth
+                    + int(128 / MAX_DIGIT_WIDTH)) / 256 * MAX_DIGIT_WIDTH)
+
+    # Otherwise the base width (in characters) plus the cell padding, which
+    # Excel rounds up to a multiple of 8 pixels
+    width = sht.sheet_format.baseColWidth * MAX_DIGIT_WIDTH + 5
+    return -(-width // 8) * 8
+
+
+def row_height(sht, row):
+    """
+    Returns the height of a worksheet row in pixels.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    row : int
+        Row number (starting from 1).
+
+    Returns
+    -------
+    int
+    """
+    height = sht.sheet_format.defaultRowHeight
+    if row in sht.row_dimensions:
+        dimension = sht.row_dimensions[row]
+        if dimension.hidden:
+            return 0
+        if dimension.ht is not None:
+            height = dimension.ht
+
+    return points_to_pixels(height)
+
+
+def chart_size(sht, chart):
+    """
+    Returns the width and height of a chart in cm, from its position on the
+    worksheet. openpyxl does not read the chart width and height from a saved
+    file, so these are worked out from the chart anchor: the size held by a
+    one cell anchor, or the cells (and offsets within them) that a two cell
+    anchor starts and ends at.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+        Worksheet the chart is on.
+    chart : openpyxl.chart.ChartBase
+
+    Returns
+    -------
+    tuple(float, float)
+    """
+    anchor = chart.anchor
+    # Charts not yet saved are anchored by a cell reference, and hold their
+    # own size
+    if isinstance(anchor, str):
+        return chart.width, chart.height
+
+    if isinstance(anchor, TwoCellAnchor):
+        # Anchor markers hold 0 based column and row numbers, and offsets in
+        # EMUs
+        start, end = anchor._from, anchor.to
+        width = (sum(pixels_to_EMU(column_width(sht, col + 1))
+                     for col in range(start.col, end.col))
+                 - start.colOff + end.colOff)
+        height = (sum(pixels_to_EMU(row_height(sht, row + 1))
+                      for row in range(start.row, end.row))
+                  - start.rowOff + end.rowOff)
+    else:
+        width, height = anchor.ext.width, anchor.ext.height
+
+    return EMU_to_cm(width), EMU_to_cm(height)
+
+
+def read_chart_definitions(source_file):
+    """
+    Reads the definitions of all the charts in an Excel file, with the series
+    data taken from the (last saved) worksheet values.
+
+    Parameters
+    ----------
+    source_file : path
+        File location of the Excel file that contains the charts.
+
+    Returns
+    -------
+    list[dict]
+        A definition for each chart, holding its image name (named as per the
+        worksheet and chart number, as save_charts_as_image), title, size and
+        plots (the type and series of each chart type in the chart).
+    """
+    wb = openpyxl.load_workbook(source_file, data_only=True)
+    wb_formulas = openpyxl.load_workbook(source_file)
+
+    definitions = []
+    for sht in wb.worksheets:
+        for chart_n, chart in enumerate(sht._charts, start=1):
+            plots = []
+            for plot in chart._charts:
+                series = []
+                for chart_series in plot.series:
+                    # The series name is either a cell reference or text
+                    name = None
+                    if chart_series.tx is not None:
+                        if chart_series.tx.strRef is not None:
+                            name = read_range_values(wb, wb_formulas,
+                                                     chart_series.tx.strRef.f)[0]
+                        else:
+                            name = chart_series.tx.v
+                    series.append({
+                        "name": "" if name is None else str(name),
+                        "categories": [str(value) for value
+                                       in read_reference(wb, wb_formulas,
+                                                         chart_series.cat)],
+                        "values": read_reference(wb, wb_formulas,
+                                                 chart_series.val),
+                        "colour": series_colour(chart_series),
+                        })
+                plots.append({"type": plot.tagname,
+                              "bar_dir": getattr(plot, "barDir", None),
+                              "grouping": getattr(plot, "grouping", None),
+                              "series": series})
+
+            width, height = chart_size(sht, chart)
+            definitions.append({"name": sht.title + "_" + str(chart_n),
+                                "title": read_text(chart.title),
+                                "width": width,
+                                "height": height,
+                                "plots": plots})
+
+    return definitions
+
+
+def chart_hash(definition, image_type, size_factor):
+    """
+    Creates a hash of a chart definition and image settings, used to identify
+    charts that are unchanged since their image was last saved.
+
+    Parameters
+    ----------
+    definition : dict
+        Chart definition (see read_chart_definitions).
+    image_type : str
+    size_factor : int
+
+    Returns
+    -------
+    str
+    """
+    content = json.dumps([definition, image_type, size_factor],
+                         sort_keys=True, default=str)
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def to_number(value):
+    """
+    Converts a chart value to a float, with blank and non-numeric values
+    (e.g. suppressed values) as nulls so that they are not plotted.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def render_chart(definition, output_file, size_factor=1.5):
+    """
+    Draws a chart from its definition with matplotlib and saves it as an image.
+    Bar (column and horizontal, clustered or stacked), line, area, pie and
+    doughnut charts are supported.
+
+    Parameters
+    ----------
+    definition : dict
+        Chart definition (see read_chart_definitions).
+    output_file : path
+        File location of the image (the image type is taken from the suffix).
+    size_factor : int
+        The factor by which the chart width and height are multiplied.
+
+    Returns
+    -------
+    None
+    """
+    # Chart sizes are held in cm
+    figsize = (definition["width"] / 2.54 * size_factor,
+               definition["height"] / 2.54 * size_factor)
+    fig, ax = plt.subplots(figsize=figsize)
+
+    for plot in definition["plots"]:
+        series_list = plot["series"]
+        if not series_list:
+            continue
+        categories = series_list[0]["categories"]
+        positions = list(range(len(categories)))
+
+        if plot["type"] in ["barChart", "bar3DChart"]:
+            stacked = plot["grouping"] in ["stacked", "percentStacked"]
+            width = 0.8 if stacked else 0.8 / len(series_list)
+            bases = [0.0] * len(categories)
+            draw = ax.barh if plot["bar_dir"] == "bar" else ax.bar
+            for series_n, series in enumerate(series_list):
+                values = [to_number(value) for value in series["values"]]
+                if stacked:
+                    offsets = positions
+                else:
+                    offsets = [position - 0.4 + width * (series_n + 0.5)
+                               for position in positions]
+                if plot["bar_dir"] == "bar":
+                    draw(offsets, values, width, left=bases,
+                         label=series["name"], color=series["colour"])
+                else:
+                    draw(offsets, values, width, bottom=bases,
+                         label=series["name"], color=series["colour"])
+                if stacked:
+                    bases = [base + (0 if value != value else value)
+                             for base, value in zip(bases, values)]
+            if plot["bar_dir"] == "bar":
+                ax.set_yticks(positions)
+                ax.set_yticklabels(categories)
+                ax.invert_yaxis()
+            else:
+                ax.set_xticks(positions)
+                ax.set_xticklabels(categories, rotation=45, ha="right")
+
+        elif plot["type"] in ["pieChart", "pie3DChart", "doughnutChart"]:
+            series = series_list[0]
+            values = [to_number(value) for value in series["values"]]
+            wedge_width = 0.4 if plot["type"] == "doughnutChart" else None
+            ax.pie([0 if value != value else value for value in values],
+                   labels=categories, autopct="%1.0f%%",
+                   wedgeprops={"width": wedge_width} if wedge_width else None)
+            ax.axis("equal")
+
+        else:
+            # Line and area charts
+            for series in series_list:
+                values = [to_number(value) for value in series["values"]]
+                if plot["type"] in ["areaChart", "area3DChart"]:
+                    ax.fill_between(positions, values, label=series["name"],
+                                    color=series["colour"], alpha=0.8)
+                else:
+                    ax.plot(positions, values, label=series["name"],
+                            color=series["colour"], marker="o")
+            ax.set_xticks(positions)
+            ax.set_xticklabels(categories, rotation=45, ha="right")
+
+    ax.set_title(definition["title"])
+    if sum(len(plot["series"]) for plot in definition["plots"]) > 1:
+        ax.legend(loc="upper center", bbox_to_anchor=(0.5, -0.2),
+                  ncol=3, frameon=False)
+    for side in ["top", "right"]:
+        ax.spines[side].set_visible(False)
+
+    fig.savefig(output_file, bbox_inches="tight")
+    plt.close(fig)
+
+
+def render_chart_worker(args):
+    """
+    Runs render_chart for a process pool worker (args as a single tuple).
+    """
+    render_chart(*args)
+
+
+def save_charts_as_image(source_file, output_path=param.CHART_DIR,
+                         image_type="png", size_factor=1.5, processes=None):
+    """
+    Save the charts in the chart template as images to the final charts folder,
+    without using Excel. Each chart is redrawn from its definition in the
+    template, with the charts rendered in parallel in a process pool.
+    A hash of each chart's definition and data is stored in the output folder
+    (chart_hashes.json), and charts whose image is unchanged are skipped.
+
+    Parameters
+    ----------
+    source_file : path
+        File location of the Excel file that contains the charts to be saved.
+    output_path : path
+        Folder location where the images should be saved.
+    image_type: str
+        Type of image file to create (e.g. png or svg). Default is png.
+    size_factor: int
+        The factor by which the image length and width will be multiplied by.
+    processes: int
+        Number of worker processes. Defaults to param.OUTPUT_PROCESSES, and
+        where that is None, the number of available cores.
+    Returns
+    -------
+        None
+    """
+    logging.info("Saving final publication charts (headless)")
+
+    definitions = read_chart_definitions(source_file)
+
+    # Load the hashes of the previously saved images
+    hash_file = output_path / "chart_hashes.json"
+    if hash_file.exists():
+        with open(hash_file, "r") as file:
+            saved_hashes = json.load(file)
+    else:
+        saved_hashes = {}
+
+    # Select the charts that have changed (or where the image is missing)
+    hashes = {}
+    to_render = []
+    for definition in definitions:
+        output_file = output_path / (definition["name"] + "." + image_type)
+        hashes[output_file.name] = chart_hash(definition, image_type,
+                                              size_factor)
+        if (saved_hashes.get(output_file.name) != hashes[output_file.name]
+                or not output_file.exists()):
+            to_render.append((definition, output_file, size_factor))
+
+    logging.info(f"Rendering {len(to_render)} of {len(definitions)} charts "
+                 "(others unchanged)")
+
+    if processes is None:
+        processes = param.OUTPUT_PROCESSES or mp.cpu_count()
+    processes = min(processes, len(to_render))
+
+    if processes <= 1:
+        for args in to_render:
+            render_chart_worker(args)
+    else:
+        with mp.Pool(processes) as pool:
+            pool.map(render_chart_worker, to_render, chunksize=1)
+
+    # Store the hashes of the saved images
+    with open(hash_file, "w") as file:
+        json.dump(hashes, file, indent=2)
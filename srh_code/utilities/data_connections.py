@@ -1,33 +1,162 @@
 """
 Purpose of script: handles reading data in from sql.
 """
+import threading
+import timeit
 import sqlalchemy as sa
 import pandas as pd
+import srh_code.parameters as param
+from srh_code.utilities import schema, snapshot_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
 import pyodbc
 
+# Registry of the sqlalchemy engines created (or registered) for each server
+# and database, so that all the imports from the same database share a single
+# engine and its connection pool. Engines are released by dispose_engines.
+# The lock prevents duplicate engines when queries are run from several threads.
+_engines = {}
+_engines_lock = threading.Lock()
 
-def df_from_sql(query, server, database) -> pd.DataFrame:
+
+def create_mssql_engine(server, database):
+    """
+    Creates a sqlalchemy engine for the NHSD server and database with the help
+    of mssql and pyodbc packages, with a connection pool as per the SQL_POOL
+    parameters.
+
+    Parameters
+    ----------
+    server : str
+        Server name
+    database : str
+        Database name
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+    """
+    return sa.create_engine(
+        f"mssql+pyodbc://{server}/{database}?driver=SQL+Server",
+        fast_executemany=True,
+        pool_size=param.SQL_POOL_SIZE,
+        pool_pre_ping=param.SQL_POOL_PRE_PING)
+
+
+def register_engine(server, database, engine):
+    """
+    Registers an existing engine for a server and database, so that it is
+    used by df_from_sql in place of an mssql engine (e.g. a local SQLite
+    engine for testing).
+
+    Parameters
+    ----------
+    server : str
+        Server name
+    database : str
+        Database name
+    engine : sqlalchemy.engine.Engine
+
+    Returns
+    -------
+    None
+    """
+    _engines[(server, database)] = engine
+
+
+def get_engine(server, database):
+    """
+    Returns the engine for a server and database, creating it on first use.
+
+    Parameters
+    ----------
+    server : str
+        Server name
+    database : str
+        Database name
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+    """
+    with _engines_lock:
+        if (server, database) not in _engines:
+            logger.info(f"Creating engine for SQL database {database}")
+            _engines[(server, database)] = create_mssql_engine(server,
+                                                               database)
+
+    return _engines[(server, database)]
+
+
+def dispose_engines():
+    """
+    Closes the connection pools of all the engines in the registry and clears
+    it. Should be run at the end of the pipeline.
+
+    Returns
+    -------
+    None
+    """
+    for (server, database), engine in _engines.items():
+        logger.info(f"Disposing engine for SQL database {database}")
+        engine.dispose()
+
+    _engines.clear()
+
+
+def df_from_sql(query, server, database, chunksize=None,
+                dtypes=None) -> pd.DataFrame:
     """
     Use sqlalchemy to connect to the NHSD server and database with the help
-    of mssql and pyodbc packages
+    of mssql and pyodbc packages. The engine (and its connection pool) is
+    shared by all queries to the same server and database. If USE_SQL_CACHE
+    is set in parameters.py, the results are read from (or written to) the
+    snapshot cache (see snapshot_cache.py).
 
     Inputs:
         server: server name
         database: database name
         query: string containing a sql query
+        chunksize: number of rows to read at a time. If set, the results are
+            streamed in chunks, each converted to the dtypes as it arrives, and
+            the chunks are concatenated once. Defaults to reading all rows at
+            once.
+        dtypes: dictionary of the data types to convert the columns to
+            (e.g. schema.SRHAD_DTYPES)
 
     Output:
         pandas Dataframe
     """
-    conn = sa.create_engine(f"mssql+pyodbc://{server}/{database}?driver=SQL+Server", fast_executemany=True)
-    conn.execution_options(autocommit=True)
+    # Use the snapshot of the query results, if one has been saved
+    if param.USE_SQL_CACHE:
+        key = snapshot_cache.snapshot_key(query, server, database, dtypes)
+        df = snapshot_cache.read_snapshot(key)
+        if df is not None:
+            return df
+
+    conn = get_engine(server, database)
     logger.info(f"Getting dataframe from SQL database {database}")
     logger.info(f"Running query:\n\n {query}")
-    df = pd.read_sql_query(query, conn)
+    start_time = timeit.default_timer()
+    if chunksize is None:
+        df = pd.read_sql_query(query, conn)
+        if dtypes is not None:
+            df = schema.apply_dtypes(df, dtypes)
+    else:
+        chunks = []
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+            if dtypes is not None:
+                chunk = schema.apply_dtypes(chunk, dtypes)
+            chunks.append(chunk)
+        df = schema.concat_chunks(chunks)
+    query_time = timeit.default_timer() - start_time
+    logger.info(f"Query returned {len(df)} rows from {database} in "
+                f"{query_time:.2f} seconds")
+
+    if param.USE_SQL_CACHE:
+        snapshot_cache.write_snapshot(key, df, server, database)
     return df
 
     print("This message shows that you have successfully imported \
@@ -5,6 +5,8 @@ Purpose of script: define commonly used calculated/added fields for the pipeline
 from srh_code.utilities import helpers
 import srh_code.parameters as param
 import numpy as np
+import pandas as pd
+import logging
 
 
 def create_age_groups(df, source_field,
@@ -114,7 +116,7 @@ def create_age_groups_ster_vas(df, source_field,
 
     """
 
-    age_groups = {"<20": {1: 20},
+    age_groups = {"<20": {1: 19},
                   "20-24": {20: 24},
                   "25-29": {25: 29},
                   "30-34": {30: 34},
@@ -156,7 +158,8 @@ def contraceptive_care_flags(df):
 
 def srh_activity_flags(df):
     """
-    Creates new fields with flags to indicate SRH code activity
+    Creates new fields with flags to indicate SRH code activity (the number of
+    the SRH activity codes for the contact that are in each activity group)
 
     Parameters
     ----------
@@ -168,20 +171,15 @@ def srh_activity_flags(df):
         Dataframe with SRH code activity flags added
 
     """
-    input_columns = ["SRHCareActivity1",
-                     "SRHCareActivity2",
-                     "SRHCareActivity3",
-                     "SRHCareActivity4",
-                     "SRHCareActivity5",
-                     "SRHCareActivity6"]
+    input_columns = param.SRH_ACTIVITY_COLUMNS
 
     srh_groups = param.SRH_ACTIVITY_REF
 
-    for col_label, srh_codes in srh_groups.items():
-        df[col_label] = 0
-        for input_column in input_columns:
-            df.loc[df[input_column].isin(srh_codes),
-                   col_label] = df[col_label] + 1
+    # Count the number of SRH activity codes in each group for each record
+    counts = helpers.count_code_groups(df, input_columns, srh_groups)
+
+    for group_position, col_label in enumerate(srh_groups):
+        df[col_label] = counts[:, group_position]
 
     return df
 
@@ -284,10 +282,11 @@ def cross_boundary_check(df, clinic_la, residence_la, new_column_name):
     """
 
     # Assign the value by checking LA of clinic location against LA of residence
-    df.loc[(df[clinic_la] == df[residence_la]),
-           new_column_name] = "Inside"
-    df.loc[(df[clinic_la] != df[residence_la]),
-           new_column_name] = "Outside"
+    # (compared as values, as categorical columns with different categories
+    # can not be compared directly)
+    same_la = (df[clinic_la].astype(object) == df[residence_la].astype(object))
+    df.loc[same_la, new_column_name] = "Inside"
+    df.loc[~same_la, new_column_name] = "Outside"
     # Replace with unknown where LA of residence was the not known default code
     df.loc[(df[residence_la] == "X99999999"),
            new_column_name] = "Unknown"
@@ -295,15 +294,22 @@ def cross_boundary_check(df, clinic_la, residence_la, new_column_name):
     return df
 
 
-def dq_duplicate_flag(df):
+def dq_duplicate_flag(df, provider_column="Org_code"):
     """
     Adds a 1 (Yes) or 0 (No) flag as a new column to indicate duplicate
     records (excluding row number, first contact, and main contact fields,
      which are all added in processing).
+    Each record is reduced to a 64-bit hash of the checked columns, and only
+    the records that share a hash are compared in full (so records with the
+    same hash that are not duplicates are not flagged). The number of
+    duplicate groups and records found for each provider is logged.
 
     Parameters
     ----------
     df : pandas.DataFrame
+    provider_column : str
+        Name of the column that holds the provider code (used for the
+        duplicate summary).
 
     Returns
     -------
@@ -318,16 +324,57 @@ def dq_duplicate_flag(df):
     # for the duplicate check
     check_columns = [item for item in all_columns if item not in remove_columns]
 
-    # Create a boolean flag that identifies duplicates (will not mark the first
-    # version as a duplicate, only subsequent versions)
-    df["Duplicate"] = df.duplicated(subset=check_columns)
+    # Hash the columns to be checked for each record
+    hashes = pd.Series(helpers.hash_rows(df, check_columns), index=df.index)
+
+    # Compare the records that share a hash in full, creating a boolean flag
+    # that identifies duplicates (will not mark the first version as a
+    # duplicate, only subsequent versions)
+    shared_hash = hashes.duplicated(keep=False).to_numpy()
+    duplicate = np.zeros(len(df), dtype=bool)
+    if shared_hash.any():
+        duplicate[shared_hash] = (df.loc[shared_hash, check_columns]
+                                  .duplicated().to_numpy())
 
-    # Covert the boolean flag to a string
-    df["Duplicate"] = np.where(df["Duplicate"] == True, 1, 0)
+    # Covert the boolean flag to a number
+    df["Duplicate"] = np.where(duplicate, 1, 0)
+
+    if provider_column in df.columns and duplicate.any():
+        df_summary = dq_duplicate_summary(df.loc[duplicate, provider_column],
+                                          hashes[duplicate])
+        logging.info("Duplicate records found by provider:\n"
+                     f"{df_summary.to_string()}")
 
     return df
 
 
+def dq_duplicate_summary(providers, hashes):
+    """
+    Summarises the duplicate records for each provider, as the number of
+    duplicate groups (distinct records that have been duplicated) and the
+    number of duplicate records (excluding the first version of each).
+
+    Parameters
+    ----------
+    providers : pandas.Series
+        Provider code of each duplicate record
+    hashes : pandas.Series
+        Hash of each duplicate record (see dq_duplicate_flag)
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by provider, with Duplicate_groups and Duplicate_records
+        columns.
+    """
+    df_duplicates = pd.DataFrame({"Provider": np.asarray(providers),
+                                  "Hash": np.asarray(hashes)})
+
+    return (df_duplicates.groupby("Provider")
+            .agg(Duplicate_groups=("Hash", "nunique"),
+                 Duplicate_records=("Hash", "size")))
+
+
 def dq_extreme_age_flag(df):
     """
     Adds a 1 (Yes) or 0 (No) flag as a new column to indicate if the patient
@@ -1,6 +1,8 @@
 """
 Purpose of script: define commonly used filters for the pipeline
 """
+from srh_code.utilities import helpers
+import srh_code.parameters as param
 
 
 def filter_persons_first_contact(df):
@@ -176,16 +178,13 @@ def filter_vasectomies(df):
 
     """
     # Set the columns to check for the relevent srh activity code
-    input_columns = ["SRHCareActivity1",
-                     "SRHCareActivity2",
-                     "SRHCareActivity3",
-                     "SRHCareActivity4",
-                     "SRHCareActivity5",
-                     "SRHCareActivity6"]
+    input_columns = param.SRH_ACTIVITY_COLUMNS
+
+    # Count the vasectomy srh activity codes for each record
+    counts = helpers.count_code_groups(df, input_columns, {"Vasectomy": [15]})
 
     # Create a filter for any records where the gender is male and the srh code
     # is present
-    df = df.loc[(df[input_columns].eq(15).any(axis=1))
-                & (df["Gender"] == "1")]
+    df = df.loc[(counts[:, 0] > 0) & (df["Gender"] == "1")]
 
     return df
@@ -1,4 +1,6 @@
 from pathlib import Path
+import logging
+import timeit
 import pandas as pd
 import numpy as np
 import math
@@ -9,6 +11,7 @@ from itertools import chain, combinations
 from decimal import Decimal, ROUND_HALF_UP, getcontext
 import multiprocessing as mp
 from multiprocessing import Pool
+from srh_code.utilities import memory_tracker
 
 
 def create_folder(directory):
@@ -152,6 +155,108 @@ def lookup_column(df, from_column, lookup, new_column):
     return df
 
 
+def copy_columns(df, columns, suffix):
+    """
+    Copies columns of a dataframe to new columns, named with a suffix. The
+    copy of a categorical column (e.g. as set by schema.SRHAD_DTYPES when the
+    data is imported) only holds the integer codes of its values, and shares
+    the categories of the original column.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list[str]
+        Names of the columns to copy
+    suffix : str
+        Added to the column names to name the copies (e.g. "_unedited")
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        with the copied columns added
+    """
+    for column in columns:
+        df[column + suffix] = df[column]
+
+    return df
+
+
+def upper_case_columns(df, columns):
+    """
+    Converts the values of string columns to upper case. For categorical
+    columns only the categories are converted, unless this would combine
+    categories (e.g. "Brook" and "BROOK"), in which case the values are.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list[str]
+        Names of the columns to convert
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            categories = df[column].cat.categories.str.upper()
+            if categories.is_unique:
+                df[column] = df[column].cat.rename_categories(categories)
+                continue
+        df[column] = df[column].str.upper()
+
+    return df
+
+
+def fill_null_values(df, column, value):
+    """
+    Replaces the nulls in a column with a value.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    column : str
+    value
+        Value that replaces the nulls
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    df[column] = df[column].fillna(value)
+
+    return df
+
+
+def run_steps(df, steps):
+    """
+    Applies a list of processing steps to a dataframe in turn. The time taken
+    by each step is logged, as is the memory used when memory tracking has been
+    started (see memory_tracker.py).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    steps : list[tuple(str, function, dict)]
+        Description of each step, the function that applies it (taking the
+        dataframe as its first argument and returning the updated dataframe)
+        and any further (keyword) arguments of the function.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    for step_name, func, kwargs in steps:
+        memory_tracker.start_step()
+        start_time = timeit.default_timer()
+        df = func(df, **kwargs)
+        step_time = timeit.default_timer() - start_time
+        logging.info(f"{step_name} took {step_time:.2f} seconds")
+        memory_tracker.log_step_memory(step_name, df)
+
+    return df
+
+
 def replace_col_value(df, col_names, replace_value):
     """
     Will replace all values in a column(s) with a specified default value
@@ -428,7 +533,8 @@ def add_subtotals(df, columns,
             default_df[col] = total_name
 
         # Aggregate the column values / counts
-        default_df = default_df.groupby(columns).sum().reset_index()
+        default_df = (default_df.groupby(columns, observed=True).sum()
+                      .reset_index())
 
         # Add each of the subgroup datafranes just created to the total
         # dataframe list
@@ -472,7 +578,7 @@ def add_subgroup_rows(df, breakdown, subgroup):
             df_subgroup = df[df[subgroup_column].isin(subgroup_values)].copy()
             df_subgroup[subgroup_column] = subgroup_code
             df_subgroup = (
-                df_subgroup.groupby([*breakdown])
+                df_subgroup.groupby([*breakdown], observed=True)
                 .sum()
                 .reset_index()
                 )
@@ -531,11 +637,63 @@ def order_by_list(df, column, order):
     return ordered_df
 
 
+def numeric_group_bands(group_info):
+    """
+    Converts a numeric group definition (as used by group_numeric_values) to
+    its bands, sorted by their start values, and checks that the bands do not
+    overlap and that there are no gaps between them. The groups are for whole
+    number values (e.g. single year of age), so a band is expected to start
+    one after the end of the previous band.
+
+    Parameters
+    ----------
+    group_info : dict(dict)
+        Dictionary containing the labels and ranges for each group
+        e.g. {"<16": {0: 15}, "16-17": {16: 17}}
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        Start value of each band (in ascending order).
+    ends : numpy.ndarray
+        End value of each band.
+    label_codes : numpy.ndarray
+        Position of each band's label in the group_info labels.
+    """
+    labels = list(group_info.keys())
+    bands = sorted((range_start, range_end, labels.index(range_label))
+                   for range_label, range_info in group_info.items()
+                   for range_start, range_end in range_info.items())
+
+    for (start, end, code), (next_start, next_end, next_code) in zip(
+            bands, bands[1:]):
+        if next_start <= end:
+            raise ValueError(f"The group {labels[next_code]} ({next_start} to "
+                             f"{next_end}) overlaps the group {labels[code]} "
+                             f"({start} to {end})")
+        if next_start > end + 1:
+            raise ValueError(f"There is a gap between the group {labels[code]}"
+                             f" (ends {end}) and the group {labels[next_code]} "
+                             f"(starts {next_start})")
+    for start, end, code in bands:
+        if end < start:
+            raise ValueError(f"The group {labels[code]} ends ({end}) before it "
+                             f"starts ({start})")
+
+    starts, ends, label_codes = (np.array(values) for values in zip(*bands))
+
+    return starts, ends, label_codes
+
+
 def group_numeric_values(df, source_field, group_name,
                          group_info, default_value):
     '''
     Creates a new column in the dataframe based on an existing one by grouping
-    numeric values in the existing column
+    numeric values in the existing column. The new column is an ordered
+    categorical, with the groups in the order they are defined in followed by
+    the default value (included even where no values are set to it). The group definition is checked for overlapping and
+    missing ranges before it is applied (see numeric_group_bands), and each
+    distinct value is assigned to its group once.
 
     Parameters
     ----------
@@ -549,23 +707,167 @@ def group_numeric_values(df, source_field, group_name,
         Dictionary containing the labels and ranges for each group
     default_value : str
         String of the initial default value upon column creation. Can be set to
-        None if not required.
+        None if not required (the existing values of the column are then kept
+        where a value is not in any group).
 
     Returns
     -------
         pandas.Dataframe with new column added or modified
     '''
+    labels = list(group_info.keys())
+    starts, ends, label_codes = numeric_group_bands(group_info)
+
+    # Find the group of each distinct value, using the band that starts at or
+    # before the value (where the value is also within the end of the band)
+    value_codes, values = pd.factorize(df[source_field])
+    values = np.asarray(values, dtype=float)
+    band = np.searchsorted(starts, values, side="right") - 1
+    in_band = (band >= 0) & (values <= ends[band.clip(0)])
+    group_codes = np.where(in_band, label_codes[band.clip(0)], -1)
+
+    # Assign the group of each distinct value to the records (nulls are not
+    # in any group)
+    codes = np.where(value_codes >= 0, group_codes[value_codes], -1)
+
+    # Values that are not in any group are set to the default value, or the
+    # existing value of the column. The default value is always a category
+    # (whether or not any values are set to it), so that the column has the
+    # same categories for any data grouped with the same definition.
     if default_value is not None:
-        df[group_name] = default_value
-
-    for range_label, range_info in group_info.items():
-        for range_start, range_end in range_info.items():
-            df.loc[df[source_field].between(range_start, range_end),
-                   group_name] = range_label
+        fill_values = pd.Series(default_value, index=df.index)
+        fill_categories = [default_value]
+    else:
+        if group_name in df.columns:
+            fill_values = df[group_name].astype(object)
+        else:
+            fill_values = pd.Series(np.nan, index=df.index, dtype=object)
+        fill_categories = [value for value
+                           in pd.unique(fill_values[codes == -1])
+                           if pd.notna(value)]
+    fill_categories = [value for value in fill_categories
+                       if value not in labels]
+
+    categories = labels + fill_categories
+    codes[codes == -1] = pd.Categorical(fill_values[codes == -1],
+                                        categories=categories).codes
+    df[group_name] = pd.Categorical.from_codes(codes, categories,
+                                               ordered=True)
 
     return df
 
 
+def hash_rows(df, columns):
+    """
+    Creates a 64-bit hash of the values in a set of columns for each record.
+    Records with the same values have the same hash, but records with
+    different values can (rarely) also share a hash, so any records matched
+    on the hash should be compared in full.
+    Each column is first reduced to whole number codes (the category codes of
+    categorical columns, the bits of numeric values, or the factorised values
+    of other columns), which are much quicker to hash than the values
+    themselves.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list[str]
+        Names of the columns to hash
+
+    Returns
+    -------
+    numpy.ndarray
+        Hash of each record (uint64)
+    """
+    row_hash = np.zeros(len(df), dtype=np.uint64)
+
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy(dtype=np.int64)
+        elif pd.api.types.is_numeric_dtype(values.dtype):
+            # Numbers are held as floats, with -0.0 as 0.0 and all nulls the
+            # same NaN, so that equal values have the same bits
+            numbers = values.to_numpy(dtype="float64", na_value=np.nan) + 0.0
+            numbers[np.isnan(numbers)] = np.nan
+            codes = numbers.view(np.int64)
+        else:
+            codes = pd.factorize(values)[0]
+        # Combine the hash of the column with the hash of the previous columns
+        row_hash = ((row_hash * np.uint64(1000003))
+                    ^ pd.util.hash_array(codes))
+
+    return row_hash
+
+
+def code_group_lookup(code_groups):
+    """
+    Creates a lookup array of the group of each code, where the position in
+    the array is the code value (e.g. lookup[15] is the position of the group
+    that includes code 15). Codes that are not in any group are -1.
+
+    Parameters
+    ----------
+    code_groups : dict(list)
+        Dictionary of the group names and the (whole number) codes in each
+        group e.g. param.SRH_ACTIVITY_REF
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    all_codes = [code for codes in code_groups.values() for code in codes]
+    lookup = np.full(max(all_codes) + 1, -1, dtype=np.int64)
+
+    for group_position, codes in enumerate(code_groups.values()):
+        for code in codes:
+            if lookup[code] not in [-1, group_position]:
+                raise ValueError(f"The code {code} is in more than one group")
+            lookup[code] = group_position
+
+    return lookup
+
+
+def count_code_groups(df, columns, code_groups):
+    """
+    Counts, for each record, the number of columns that hold a code in each
+    code group. The codes in all the columns are mapped to their group
+    through a lookup array (see code_group_lookup) and counted in a single
+    operation.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list[str]
+        Names of the columns that hold the codes
+    code_groups : dict(list)
+        Dictionary of the group names and the codes in each group
+
+    Returns
+    -------
+    numpy.ndarray
+        Counts with a row for each record and a column for each group (in the
+        order of code_groups).
+    """
+    lookup = code_group_lookup(code_groups)
+
+    # Map each code to its group, with nulls and codes not in the lookup as -1
+    codes = df[columns].to_numpy(dtype="float64", na_value=np.nan)
+    valid = ((codes >= 0) & (codes < len(lookup))
+             & (codes == np.floor(codes)))
+    groups = np.full(codes.shape, -1, dtype=np.int64)
+    groups[valid] = lookup[codes[valid].astype(np.int64)]
+
+    # Count the groups of each record, using the record and group positions
+    # as a flat position in the output
+    n_records, n_groups = len(df), len(code_groups)
+    records = np.broadcast_to(np.arange(n_records)[:, None], groups.shape)
+    in_group = groups >= 0
+    counts = np.bincount(records[in_group] * n_groups + groups[in_group],
+                         minlength=n_records * n_groups)
+
+    return counts.reshape(n_records, n_groups)
+
+
 def add_organisation_type(df, org_code_column, missing_value="None"):
     """
     Adds a new organisation type and level columns to a dataframe
@@ -646,10 +948,15 @@ def calendar_year_to_fyear(df, year_field="ReportingYear"):
     -------
         reformatted year string
     '''
-    # Reformat SRHAD year into the required style
-    df[year_field] = (df[year_field].astype(str).str[:4]
-                      + "-"
-                      + (df[year_field]+1).astype(int).astype(str).str[-2:])
+    # Reformat SRHAD year into the required style. The distinct years are
+    # reformatted and then assigned to each record by position.
+    codes, years = pd.factorize(df[year_field])
+    years = pd.Index(np.asarray(years))
+    fyears = (years.astype(str).str[:4]
+              + "-"
+              + (years+1).astype(int).astype(str).str[-2:])
+    df[year_field] = pd.api.extensions.take(np.asarray(fyears, dtype=object),
+                                            codes, allow_fill=True)
 
     return df
 
@@ -705,8 +1012,8 @@ def add_group_to_df(df, group_on, group_value, count_column):
     grouped_fields = list(set(all_fields) - set(fields_to_remove))
 
     # created a new dataframe grouped on the required column
-    df_grouped = df.groupby(grouped_fields,
-                            as_index=False)[count_column].sum()
+    df_grouped = df.groupby(grouped_fields, as_index=False,
+                            observed=True)[count_column].sum()
     # Insert a new column to represent the grouped data and apply the user
     # defined value
     df_grouped.insert(insert_position, group_on, group_value)
@@ -748,28 +1055,52 @@ def suppress_column(column_to_suppress,
     pd.Series
 
     """
-    # Copy of the column to suppress
-    suppression = column_to_suppress.copy(deep=True)
+    return suppress_values(column_to_suppress, lower, upper, base)
+
+
+def suppress_values(values, lower=1, upper=7, base=5):
+    """
+    Applies the suppress_column disclosure control logic to a whole block of
+    count columns in a single vectorised operation.
+
+    Values between the lower and upper bounds (inclusive) are replaced with
+    nulls, and values above the upper bound are rounded to the nearest base.
+    As with Python's round function, numpy's rint rounds halves to the nearest
+    even number (e.g. with a base of 10, 25 would round to 20 and 35 to 40),
+    so the results are identical to the original element by element rounding.
+
+    Parameters
+    ----------
+    values: pd.DataFrame or pd.Series
+        Numeric count column(s) that should be suppressed
+    lower: int
+        Lower bound - default is 1
+    upper: int
+        Upper bound - default is 7
+    base: int
+        Round to the nearest base - default is 5
+
+    Returns
+    -------
+    pd.DataFrame or pd.Series
+        Same shape as the input, with suppression and rounding applied.
+        Values are returned as floats so that suppressed values can be nulls.
+    """
+    # Extract the counts as a float array (nulls are retained as NaN)
+    counts = values.to_numpy(dtype=float, na_value=np.nan)
 
-    # Filter data between lower and upper bound that should be suppressed
-    # for sub-national level
-    should_suppress = (column_to_suppress.between(lower, upper, inclusive="both"))
-    # Filter data above upper limit to be rounded for sub-national level
-    should_round = (column_to_suppress > upper)
+    # Identify values to be suppressed (replaced with nulls) and rounded
+    should_suppress = (counts >= lower) & (counts <= upper)
+    should_round = counts > upper
 
-    # Suppression and rounding logic for relevant data defined by above filters
-    # if data should be suppressed, replace with nulls (will be updated later)
-    suppression.loc[should_suppress] = np.nan
+    # Round to the nearest base and then suppress
+    suppressed = np.where(should_round, base * np.rint(counts / base), counts)
+    suppressed[should_suppress] = np.nan
 
-    # If data should be rounded, round to the nearest base
-    suppression.loc[should_round] = (
-        suppression[should_round]
-        .apply(
-            lambda p: base * round(p/base)
-            )
-        )
+    if isinstance(values, pd.Series):
+        return pd.Series(suppressed, index=values.index, name=values.name)
 
-    return suppression
+    return pd.DataFrame(suppressed, index=values.index, columns=values.columns)
 
 
 def round_half_up(n, decimals=0):
@@ -802,6 +1133,65 @@ def round_half_up(n, decimals=0):
             Decimal('0.' + '0'*decimals), context=context))
 
 
+def round_half_up_values(values, decimals=0):
+    """
+    Round all the numbers in a dataframe, series or array to a given number of
+    decimal places, rounding up on >=5, and down on <5, in a single vectorised
+    operation. Gives the same results as applying round_half_up to each value.
+
+    Values are scaled by the number of decimal places and rounded half away
+    from zero. As float values cannot hold every decimal exactly (e.g. 2.675
+    is stored as 2.67499999...), any value that falls close enough to a half
+    way point for this to matter is instead rounded with round_half_up.
+    Nulls and infinite values are returned unchanged.
+
+    Parameters
+    ----------
+    values : pd.DataFrame, pd.Series or np.ndarray
+        Numbers to be rounded
+    decimals : integer, optional
+        Number of decimal places to round to. The default is 0.
+
+    Returns
+    -------
+    pd.DataFrame, pd.Series or np.ndarray
+        Same shape as the input, containing the rounded values as floats
+
+    """
+    if isinstance(values, (pd.DataFrame, pd.Series)):
+        numbers = values.to_numpy(dtype=float, na_value=np.nan)
+    else:
+        numbers = np.asarray(values, dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        # Scale the numbers so that rounding is to the nearest integer, and
+        # round half away from zero
+        scale = 10.0 ** decimals
+        scaled = np.abs(numbers) * scale
+        rounded = np.copysign(np.floor(scaled + 0.5), numbers) / scale
+
+        # Identify values close to a half way point, where float representation
+        # error may affect the result, and values too large for round_half_up
+        # to hold in the precision it uses.
+        fraction = scaled - np.floor(scaled)
+        check_scalar = ((np.abs(fraction - 0.5) <= 1e-6 + scaled * 1e-8)
+                        | ((scaled >= 1e9) & np.isfinite(scaled)))
+
+    # Apply round_half_up to these values so that they match exactly
+    for position in zip(*np.nonzero(check_scalar)):
+        rounded[position] = round_half_up(float(numbers[position]), decimals)
+
+    # Return unchanged any nulls and infinite values
+    rounded = np.where(np.isfinite(numbers), rounded, numbers)
+
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame(rounded, index=values.index, columns=values.columns)
+    if isinstance(values, pd.Series):
+        return pd.Series(rounded, index=values.index, name=values.name)
+
+    return rounded
+
+
 def parallelize(data, func):
     """
     Applies parallel multi-processing to a function based on the available
@@ -1,8 +1,11 @@
 import logging
+import timeit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pandas as pd
 import srh_code.parameters as param
 import srh_code.utilities.helpers as helpers
 import srh_code.utilities.data_connections as dbc
+from srh_code.utilities import schema
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +42,11 @@ def import_reporting_table_data():
     data = data.replace("<Database>", database)
     data = data.replace("<Table>", table)
 
-    # Get SQL data
-    df = dbc.df_from_sql(data, server, database)
+    # Get SQL data, streamed in chunks with the column data types applied
+    # to each chunk as it is read
+    df = dbc.df_from_sql(data, server, database,
+                         chunksize=param.SQL_CHUNKSIZE,
+                         dtypes=schema.SRHAD_DTYPES)
 
     return df
 
@@ -499,3 +505,89 @@ def import_org_sites(table):
     df.drop(["Open_date"], axis=1, inplace=True)
 
     return df
+
+
+def timed_call(func, *args):
+    """
+    Runs a function and times it.
+
+    Parameters
+    ----------
+    func : function
+    *args
+        Arguments passed to the function.
+
+    Returns
+    -------
+    tuple
+        The function result and the running time in seconds.
+    """
+    start_time = timeit.default_timer()
+    result = func(*args)
+
+    return result, timeit.default_timer() - start_time
+
+
+def run_import_tasks(tasks, max_workers=None):
+    """
+    Runs the data imports and the processing steps that depend on them
+    concurrently in a bounded thread pool (the imports spend most of their
+    time waiting on the database). Each task starts as soon as all of the
+    tasks it depends on have completed, and the running time of each is
+    logged.
+
+    Parameters
+    ----------
+    tasks : dict
+        Name of each task, with a tuple of the function to run and a list of
+        the names of the tasks it depends on. The results of these tasks are
+        passed to the function (in the listed order) as its arguments.
+        e.g. {"df_pop": (load.import_population_data, []),
+              "df_pop_ref": (pre_processing.update_population_data,
+                             ["df_pop", "df_org_ref", "df_imd_ref"])}
+    max_workers : int
+        Maximum number of tasks run at once. Defaults to IMPORT_THREADS as set
+        in parameters.py.
+
+    Returns
+    -------
+    results : dict
+        The result of each task, by task name.
+    """
+    if max_workers is None:
+        max_workers = param.IMPORT_THREADS
+
+    # Check that every dependency is a task, so that all tasks can be run
+    for name, (func, dependencies) in tasks.items():
+        missing = [dependency for dependency in dependencies
+                   if dependency not in tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on {missing}, which are "
+                             "not in the tasks to be run")
+
+    results = {}
+    pending = dict(tasks)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Start every task whose dependencies have all completed
+            for name, (func, dependencies) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    args = [results[dependency] for dependency in dependencies]
+                    running[executor.submit(timed_call, func, *args)] = name
+                    del pending[name]
+
+            if not running:
+                raise ValueError("The dependencies of tasks "
+                                 f"{list(pending)} can not be met (circular)")
+
+            # Wait for the next task to complete
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], run_time = future.result()
+                logging.info(f"Task {name} completed in {run_time:.2f} "
+                             "seconds")
+
+    return results
@@ -0,0 +1,123 @@
+"""
+Purpose of the script: contains the memory tracker, which logs the memory used
+by each step of the data processing (see helpers.run_steps) when TRACK_MEMORY
+is set in parameters.py.
+"""
+import tracemalloc
+import srh_code.parameters as param
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Holds whether the memory tracing was started by start_tracking (so that
+# stop_tracking does not stop tracing started elsewhere)
+_tracking = {"started": False}
+
+
+def start_tracking():
+    """
+    Starts tracing the memory allocated by the pipeline (including the numpy
+    and pandas data), if TRACK_MEMORY is set in parameters.py. Tracing slows
+    down the processing, so should only be used to investigate memory use.
+
+    Returns
+    -------
+    None
+    """
+    if param.TRACK_MEMORY and not tracemalloc.is_tracing():
+        logger.info("Starting memory tracking")
+        tracemalloc.start()
+        _tracking["started"] = True
+
+
+def stop_tracking():
+    """
+    Stops tracing the memory allocated by the pipeline, if it was started by
+    start_tracking.
+
+    Returns
+    -------
+    None
+    """
+    if _tracking["started"]:
+        tracemalloc.stop()
+        _tracking["started"] = False
+
+
+def start_step():
+    """
+    Resets the peak of the traced memory, so that the peak logged by
+    log_step_memory is the peak during the step.
+
+    Returns
+    -------
+    None
+    """
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def column_sizes(df):
+    """
+    Returns the memory used by each column of a dataframe (including the
+    memory used by the values of object columns), in MB.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+
+    Returns
+    -------
+    pandas.Series
+    """
+    return df.memory_usage(index=False, deep=True) / 2**20
+
+
+def log_step_memory(step_name, df):
+    """
+    Logs the peak and current traced memory of a processing step, and the
+    size of the dataframe it returned. The dataframe size excludes the values
+    held by object columns (only their references are counted), as measuring
+    these is slow while memory is traced. Nothing is logged if memory tracking
+    has not been started.
+
+    Parameters
+    ----------
+    step_name : str
+    df : pandas.DataFrame
+        Dataframe returned by the step
+
+    Returns
+    -------
+    None
+    """
+    if not tracemalloc.is_tracing():
+        return
+
+    current, peak = tracemalloc.get_traced_memory()
+    logger.info(f"{step_name}: peak memory {peak / 2**20:.1f} MB, "
+                f"current memory {current / 2**20:.1f} MB, "
+                f"dataframe size {df.memory_usage().sum() / 2**20:.1f} MB")
+
+
+def log_column_sizes(df, name):
+    """
+    Logs the memory used by each column of a dataframe, largest first.
+    Nothing is logged if memory tracking has not been started.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    name : str
+        Name of the dataframe used in the log
+
+    Returns
+    -------
+    None
+    """
+    if not tracemalloc.is_tracing():
+        return
+
+    sizes = column_sizes(df).sort_values(ascending=False)
+    logger.info(f"Memory used by each column of {name} (MB):\n"
+                f"{sizes.round(2).to_string()}")
@@ -1,6 +1,7 @@
 """
 Purpose of script: contains the core business logic
 """
+import numpy as np
 import pandas as pd
 import logging
 from srh_code.utilities import helpers
@@ -8,76 +9,109 @@ from srh_code.utilities import field_definitions
 from srh_code.utilities import filter_definitions
 import srh_code.parameters as param
 from srh_code.utilities import load
+from srh_code.utilities import schema
+from srh_code.utilities import memory_tracker
 
 logger = logging.getLogger(__name__)
 
 
-def update_non_uk_las(df):
+# Columns of the SRHAD data that hold the residence LA details, with the
+# columns of an LA mapping table (see create_la_mapping) that they are updated
+# from
+LA_MAPPING_COLUMNS = {"LA_code": "To_code",
+                      "LA_name": "To_name",
+                      "LA_code_lower": "To_code",
+                      "LA_name_lower": "To_name",
+                      "LA_parent_code": "To_code"}
+
+
+def create_la_mapping(la_codes):
     """
-    Updates Channel Islands and Isle of Man LA codes to the general outside UK
-    LA code (X99999998). Also renames the general outside UK name and parent
-    code.
+    Creates a mapping table of lower tier LA codes to the country level (or
+    outside UK) code and name that they are reported under, and the rule that
+    applies:
+        Non-English UK LA: Scottish, Welsh and Northern Ireland LAs are
+            updated to country level (e.g. Aberdeen to Scotland)
+        Non-UK LA: Channel Islands and Isle of Man LAs, and the general
+            outside UK code, are updated to the general outside UK code
+            (X99999998) and name
 
     Parameters
     ----------
-    df : pandas.DataFrame
+    la_codes : pandas.Series
+        Lower tier LA codes. Only the distinct codes are used.
 
     Returns
     -------
-    df : pandas.DataFrame
-        with the LA codes and names updated to country level
+    pandas.DataFrame
+        Indexed by the original LA code (only codes that a rule applies to),
+        with Rule, To_code and To_name columns.
     """
-    logging.info("Updating non UK LA information")
-
+    # Set the country prefixes of non-English UK LA codes and their names
+    country_names = {"S": "Scotland",
+                     "W": "Wales",
+                     "N": "Northern Ireland"}
     # Set Channel Island, Isle of Man LA codes and the outside UK code
-    la_codes = ["M99999999", "L99999999", "X99999998"]
-    # Set the default outside England code and name
-    default_code = "X99999998"
-    default_name = "Outside the United Kingdom"
-    # Update the lower and upper LA codes and names to the defaults
-    for la_code in la_codes:
-        df.loc[df["LA_code_lower"] == la_code,
-               ["LA_code", "LA_name",
-                "LA_code_lower", "LA_name_lower",
-                "LA_parent_code"]] = [default_code, default_name,
-                                      default_code, default_name,
-                                      default_code]
+    non_uk_codes = ["M99999999", "L99999999", "X99999998"]
 
-    return df
+    codes = pd.Index(pd.unique(np.asarray(la_codes.dropna(), dtype=object)),
+                     name="From_code")
+    df_mapping = pd.DataFrame(index=codes,
+                              columns=["Rule", "To_code", "To_name"],
+                              dtype=object)
+
+    # Non-English UK LAs are updated to the default country codes and names
+    prefix = codes.str[0]
+    non_english = prefix.isin(list(country_names))
+    df_mapping.loc[non_english, "Rule"] = "Non-English UK LA"
+    df_mapping.loc[non_english, "To_code"] = prefix[non_english] + "99999999"
+    df_mapping.loc[non_english, "To_name"] = prefix[non_english].map(
+        country_names)
 
+    # Non UK LAs are updated to the default outside UK code and name
+    non_uk = codes.isin(non_uk_codes)
+    df_mapping.loc[non_uk, "Rule"] = "Non-UK LA"
+    df_mapping.loc[non_uk, "To_code"] = "X99999998"
+    df_mapping.loc[non_uk, "To_name"] = "Outside the United Kingdom"
 
-def update_non_english_las(df):
+    return df_mapping[df_mapping["Rule"].notnull()]
+
+
+def map_la_values(df, key_column, df_mapping, update_columns):
     """
-    Updates non-English UK LA codes and names to country level (e.g. Aberdeen to
-    Scotland) for reporting purposes.
+    Updates the LA details of the records whose key column value is in the
+    index of a mapping table, to the replacement values in the mapping table.
+    The mapping is looked up once for each record (by position), and each
+    column is then updated in a single assignment.
 
     Parameters
     ----------
     df : pandas.DataFrame
+    key_column : str
+        Column name that holds the values to look up in the mapping table.
+    df_mapping : pandas.DataFrame
+        Mapping table, indexed by the original values (e.g. as returned by
+        create_la_mapping).
+    update_columns : dict(str, str)
+        Names of the columns to be updated, and the column of the mapping table
+        that holds their replacement values.
 
     Returns
     -------
     df : pandas.DataFrame
-        with the LA codes and names updated to country level
+        with the LA details updated
+    numpy.ndarray
+        Number of records updated by each row of the mapping table
     """
-    logging.info("Updating non-English UK LA information")
-
-    # Update Scottish, Welsh and Northern Ireland LA details to the default
-    # country codes and names
-    update_info = {"S": "Scotland",
-                   "W": "Wales",
-                   "N": "Northern Ireland"}
+    position = df_mapping.index.get_indexer(df[key_column])
+    matched = position >= 0
 
-    for country_prefix, country_name in update_info.items():
-        country_code = country_prefix + "99999999"
-        df.loc[df["LA_code_lower"].str.startswith((country_prefix)),
-               ["LA_code", "LA_name",
-                "LA_code_lower", "LA_name_lower",
-                "LA_parent_code"]] = [country_code, country_name,
-                                      country_code, country_name,
-                                      country_code]
+    for column, mapping_column in update_columns.items():
+        values = df_mapping[mapping_column].to_numpy()[position[matched]]
+        df = schema.add_categories(df, [column], values)
+        df.loc[matched, column] = values
 
-    return df
+    return df, np.bincount(position[matched], minlength=len(df_mapping))
 
 
 def update_small_las(df, column_code, column_name,
@@ -112,21 +146,79 @@ def update_small_las(df, column_code, column_name,
     # Create a dataframe from the reference data input
     df_la_update = pd.DataFrame(data=lookup)
 
-    # Create seperate dictionaries for the org code and org name lookups
-    df_code_update = dict(zip(df_la_update["From_code"],
-                              df_la_update["To_code"]))
-    df_name_update = dict(zip(df_la_update["From_name"],
-                              df_la_update["To_name"]))
-
-    # use the dictionaries to update the codes and names in the input dataframe
+    # use the lookups to update the codes and names in the input dataframe
     if column_code is not None:
-        df.replace({column_code: df_code_update}, inplace=True)
+        df, _ = map_la_values(df, column_code,
+                              df_la_update.set_index("From_code"),
+                              {column_code: "To_code"})
     if column_name is not None:
-        df.replace({column_name: df_name_update}, inplace=True)
+        df, _ = map_la_values(df, column_name,
+                              df_la_update.set_index("From_name"),
+                              {column_name: "To_name"})
 
     return df
 
 
+def normalise_las(df, lookup=param.LA_UPDATE):
+    """
+    Updates the residence LA details of the SRHAD data to the LAs they are
+    reported under, in a single stage:
+        Non-English UK and non-UK LAs are updated to country level (see
+            create_la_mapping), across the lower and upper tier LA codes and
+            names and the parent code.
+        Copies of the upper tier LA code and name are taken (as
+            LA_code_inc_small and LA_name_inc_small), as versions of these with
+            small LAs still present are required for the cross boundary outputs.
+        Small upper tier LAs are updated to the LAs that their data will be
+            combined with in the LA tables / maps (see update_small_las). The
+            audit records the number of LA codes updated.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    lookup: dict(str, list)
+        Dictionary containing the small LA codes and names and corresponding
+        replacement values.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        with the LA details updated
+    df_audit : pandas.DataFrame
+        The rule applied to each distinct LA code that was updated, with the
+        replacement code and name and the number of records updated.
+    """
+    logging.info("Updating LA information to reporting LAs")
+
+    # Update the country level LAs, keyed on the lower tier LA code
+    df_country = create_la_mapping(df["LA_code_lower"])
+    df, country_counts = map_la_values(df, "LA_code_lower", df_country,
+                                       LA_MAPPING_COLUMNS)
+    df_country["Records"] = country_counts
+
+    df = helpers.copy_columns(df, ["LA_code", "LA_name"], "_inc_small")
+
+    # Update the small LAs, with the codes and names each looked up on their
+    # own values (as update_small_las), so that records whose code and name
+    # do not match are updated in the same way
+    df_small = pd.DataFrame(data=lookup)
+    df, _ = map_la_values(df, "LA_name", df_small.set_index("From_name"),
+                          {"LA_name": "To_name"})
+    df_small = df_small.set_index("From_code")
+    df_small["Rule"] = "Small LA"
+    df, small_counts = map_la_values(df, "LA_code", df_small,
+                                     {"LA_code": "To_code"})
+    df_small["Records"] = small_counts
+
+    # Record the rule applied to each LA code that was present in the data
+    audit_columns = ["From_code", "Rule", "To_code", "To_name", "Records"]
+    df_audit = pd.concat([df_country.reset_index(),
+                          df_small.reset_index()])[audit_columns]
+    df_audit = df_audit[df_audit["Records"] > 0].reset_index(drop=True)
+
+    return df, df_audit
+
+
 def create_la_ref_data(fyear=param.FYEAR):
     """
     Imports and makes updates to the LA and regions organisation reference
@@ -144,11 +236,32 @@ def create_la_ref_data(fyear=param.FYEAR):
         and organisation type added.
 
     """
-    logging.info("Creating the LA and regions organisation reference data")
-
     # Import from the corporate reference data
     df_org_ref = load.import_la_ref_data(fyear)
 
+    return update_la_ref_data(df_org_ref)
+
+
+def update_la_ref_data(df_org_ref):
+    """
+    Makes updates to the imported LA and regions organisation reference
+    data needed for processing. Map the parent org codes in the corporate
+    reference data to parent names. Adds organisation type.
+
+    Parameters
+    ----------
+    df_org_ref: pandas.DataFrame
+        Dataframe containing the imported LA organisation reference data
+        (see load.import_la_ref_data).
+    Returns
+    -------
+    df: pandas.DataFrame
+        Dataframe containing LA organisation reference data with LA parent name
+        and organisation type added.
+
+    """
+    logging.info("Creating the LA and regions organisation reference data")
+
     # Extract the org code and org name from the reference data as a new dataframe
     df_orgs = df_org_ref[["Org_code", "Org_name"]].copy()
     # Rename org code column to parent org code
@@ -186,18 +299,37 @@ def map_org_code_to_name(df, df_org_ref, col_ref):
     """
     logging.info("Mapping organisations codes to names")
 
-    # Filtering ref data for code and name cols
-    df_org_ref = df_org_ref[["Org_code", "Org_name"]]
+    # Create a lookup of the org names from the ref data (the org codes in the
+    # ref data are unique)
+    org_names = df_org_ref.set_index("Org_code")["Org_name"]
 
     # For each column in the list specified in param
     for i in col_ref:
-        # Rename reference columns based on the column to be updated
-        df_i = df_org_ref.rename(columns={"Org_code": i})
+        # Add the name column, named based on the code column, by looking up
+        # the codes (this adds the column in place rather than merging)
         i_name = i.replace("code", "")
-        df_i = df_i.rename(columns={"Org_name": i_name+"name"})
+        df[i_name+"name"] = df[i].map(org_names)
+
+    return df
+
+
+def update_reporting_las(df):
+    """
+    Updates the residence LA details of the SRHAD data to the LAs they are
+    reported under (see normalise_las), and logs the LA updates applied.
 
-        # Merge dataframe with ref data on the ref column name
-        df = pd.merge(df, df_i, how="left", on=i)
+    Parameters
+    ----------
+    df : pandas.DataFrame
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        with the LA details updated
+    """
+    df, df_la_audit = normalise_las(df)
+    logging.info("LA updates applied:\n"
+                 f"{df_la_audit.to_string()}")
 
     return df
 
@@ -205,10 +337,16 @@ def map_org_code_to_name(df, df_org_ref, col_ref):
 def update_old_to_new_lsoa(df, df_lsoa_ref,
                            update_col="LSOA_code",
                            right_old_col="LSOA_code_old",
-                           right_new_col="LSOA_code_new"):
+                           right_new_col="LSOA_code_new",
+                           df_imd_ref=None,
+                           imd_ref_col="Org_code"):
     """
     Updates old LSOA codes to their new equivalents based on old to new LSOA
-    lookup dataframe.
+    lookup dataframe, and optionally adds the IMD reference data for the
+    updated codes.
+    The lookups are made once for each distinct LSOA code, and then applied
+    to each record through the integer codes of the distinct values, so the
+    dataframe is not merged (and copied).
 
     Parameters
     ----------
@@ -222,6 +360,12 @@ def update_old_to_new_lsoa(df, df_lsoa_ref,
         Column name in the reference data that holds the old LSOA codes
     right_new_col : str
         Column name in the reference data that holds the new LSOA codes
+    df_imd_ref : pandas.DataFrame
+        Dataframe containing the index of multiple deprivation reference data.
+        If given, its columns are added for the updated LSOA codes (as with a
+        left join).
+    imd_ref_col : str
+        Column name in the IMD reference data that holds the LSOA codes
 
     Returns
     -------
@@ -230,16 +374,36 @@ def update_old_to_new_lsoa(df, df_lsoa_ref,
 
     """
     logging.info("Updating old to new LSOA codes")
-    # Join to the old to new LSOA lookup dataframe
-    df = df.merge(df_lsoa_ref, how='left',
-                  left_on=[update_col], right_on=[right_old_col])
 
-    # Update LSOA codes to the new verions where applicable
-    df.loc[(df[right_new_col].notnull()),
-           update_col] = df[right_new_col]
-
-    # Drop the look up columns added during the merge
-    df.drop([right_old_col, right_new_col], axis=1, inplace=True)
+    # Code each record by its distinct LSOA code (nulls are coded as -1)
+    codes, lsoa_codes = pd.factorize(df[update_col])
+    lsoa_codes = np.asarray(lsoa_codes, dtype=object)
+
+    # Look up the new version of each distinct LSOA code, where applicable
+    position = pd.Index(df_lsoa_ref[right_old_col]).get_indexer(lsoa_codes)
+    new_codes = pd.api.extensions.take(
+        df_lsoa_ref[right_new_col].to_numpy(dtype=object), position,
+        allow_fill=True)
+    new_codes = np.where(pd.notnull(new_codes), new_codes, lsoa_codes)
+
+    # Re-code each record to the (sorted) distinct updated LSOA codes
+    new_index, new_lsoa_codes = pd.factorize(new_codes, sort=True)
+    codes = np.where(codes >= 0, new_index.take(codes), -1)
+    if isinstance(df[update_col].dtype, pd.CategoricalDtype):
+        df[update_col] = pd.Categorical.from_codes(codes, new_lsoa_codes)
+    else:
+        df[update_col] = pd.api.extensions.take(new_lsoa_codes, codes,
+                                                allow_fill=True)
+
+    # Add the IMD reference data of each updated LSOA code
+    if df_imd_ref is not None:
+        position = pd.Index(df_imd_ref[imd_ref_col]).get_indexer(
+            new_lsoa_codes)
+        for column in df_imd_ref.columns.drop(imd_ref_col):
+            values = pd.api.extensions.take(df_imd_ref[column].to_numpy(),
+                                            position, allow_fill=True)
+            df[column] = pd.api.extensions.take(values, codes,
+                                                allow_fill=True)
 
     return df
 
@@ -258,12 +422,31 @@ def create_imdref_data():
     df_imd_ref : pandas.DataFrame
 
     """
-    logging.info("Creating IMD reference data")
-
     # Import the imd coroprate reference data
     df_imd_lsoa = load.import_imd_lsoa()
     df_imd_decile = load.import_imd_decile()
 
+    return join_imd_decile(df_imd_lsoa, df_imd_decile)
+
+
+def join_imd_decile(df_imd_lsoa, df_imd_decile):
+    """
+    Adds the IMD decile to a dataframe containing IMD ranked LSOA data
+
+    Parameters
+    ----------
+    df_imd_lsoa : pandas.DataFrame
+        IMD rank of each LSOA (see load.import_imd_lsoa)
+    df_imd_decile : pandas.DataFrame
+        IMD decile of each IMD rank (see load.import_imd_decile)
+
+    Returns
+    -------
+    df_imd_ref : pandas.DataFrame
+
+    """
+    logging.info("Creating IMD reference data")
+
     # Join to the 2 dataframes
     df_imd_ref = pd.merge(df_imd_lsoa, df_imd_decile,
                           on="IMD_rank", how="left")
@@ -310,93 +493,94 @@ def update_srhad_source_data(df, df_org_ref, df_lsoa_ref, df_imd_ref, fyear):
                          does not match the financial year extacted from the \
                          SRHAD data ({srhad_year}). Please review')
 
-    # Add the data quality check flags
-    df = field_definitions.dq_duplicate_flag(df)
-    df = field_definitions.dq_extreme_age_flag(df)
-    df = field_definitions.dq_unknown_code_flags(df)
-
-    # Create new field which indicates if person was resident inside or outside
-    # the LA of clinic location (adds fields for lower and upper tier LA check).
-    # NOTE that this is applied before small LA's are combined for other
-    # table outputs in next step.
-    df = field_definitions.cross_boundary_check(df,
-                                                "Clinic_LA_code_lower",
-                                                "LA_code_lower",
-                                                "Cross_boundary_lower")
-    df = field_definitions.cross_boundary_check(df,
-                                                "Clinic_LA_code_upper",
-                                                "LA_code",
-                                                "Cross_boundary_upper")
-
-    # Add LA parent names to LA codes using org reference data
-    df = map_org_code_to_name(df,
-                              df_org_ref,
-                              ["LA_parent_code"])
-
-    # Copies the unedited lower and upper LA fields as these are required
-    # for the record level extract
-    la_columns = ["LA_code", "LA_name", "LA_code_lower", "LA_name_lower"]
-    for column in la_columns:
-        unedited_column = column + "_unedited"
-        df[unedited_column] = df[column]
-
-    # Update Scottish, Welsh and Northern Ireland LA details to the default
-    # country codes and names
-    df = update_non_english_las(df)
-
-    # Update Channel Island and Isle of Man LA details to the default
-    # non UK LA code and name
-    df = update_non_uk_las(df)
-
-    # Makes further copies of the upper tier LA fields as versions of these
-    # with small LAs still present are required for the cross boundary outputs
-    la_columns = ["LA_code", "LA_name"]
-    for column in la_columns:
-        unedited_column = column + "_inc_small"
-        df[unedited_column] = df[column]
-
-    # Update small upper tier LA codes and names to match the LA's that their
-    # data will be combined with in the LA tables / maps
-    df = update_small_las(df, "LA_code", "LA_name")
-
-    # Update old to new LSOA codes
-    df = update_old_to_new_lsoa(df, df_lsoa_ref)
-
-    # Add imd deciles by linking on LSOA code
-    df_imd_ref = df_imd_ref.rename(columns={"Org_code": "LSOA_code"})
-    df = pd.merge(df, df_imd_ref, on="LSOA_code", how="left")
-
-    # Update the org code and names with the clinic codes and names
-    # for those with an org code of NQ5 (Brook clinics)
-    df = apply_clinic_as_org(df, "NQ5")
-
-    # Ensure all org names are upper string
-    df["Org_name"] = df["Org_name"].str.upper()
-
-    # Create column with the standard age groups used in the outputs
-    df = field_definitions.create_age_groups(df, "Age")
-
-    # Create column with the alternate age groups used in the outputs
-    df = field_definitions.create_age_groups_alt(df, "Age")
-
-    # Update nulls in the main method field to 99 to signify no main method
-    df["ContraceptiveMainMethod"] = df["ContraceptiveMainMethod"].fillna(99)
-
-    # Create new fields with flags to indicate contraceptive care activity
-    df = field_definitions.contraceptive_care_flags(df)
-
-    # Create new fields with flags to indicate SRH code activity
-    df = field_definitions.srh_activity_flags(df)
-
-    # Create new fields with flags to indicate emergency oral contraception
-    # activity and emergency IUD contraception activity
-    df = field_definitions.ec_oral_iud_flags(df)
-
-    # Create new field with count of emergency contraception items
-    df = field_definitions.number_ec_items(df)
-
-    # Create new field which indicates if person was resident outside of England
-    df = field_definitions.outside_england_flag(df)
+    # Set the pre-processing steps, which are applied to the data in turn.
+    # Each step updates or adds columns in place, so the data is not copied.
+    steps = [
+        # Add the data quality check flags
+        ("Adding the duplicate record flag",
+         field_definitions.dq_duplicate_flag, {}),
+        ("Adding the extreme age flag",
+         field_definitions.dq_extreme_age_flag, {}),
+        ("Adding the unknown code flags",
+         field_definitions.dq_unknown_code_flags, {}),
+        # Create new field which indicates if person was resident inside or
+        # outside the LA of clinic location (adds fields for lower and upper
+        # tier LA check). NOTE that this is applied before small LA's are
+        # combined for other table outputs.
+        ("Adding the lower tier cross boundary flag",
+         field_definitions.cross_boundary_check,
+         {"clinic_la": "Clinic_LA_code_lower",
+          "residence_la": "LA_code_lower",
+          "new_column_name": "Cross_boundary_lower"}),
+        ("Adding the upper tier cross boundary flag",
+         field_definitions.cross_boundary_check,
+         {"clinic_la": "Clinic_LA_code_upper",
+          "residence_la": "LA_code",
+          "new_column_name": "Cross_boundary_upper"}),
+        # Add LA parent names to LA codes using org reference data
+        ("Adding the LA parent names", map_org_code_to_name,
+         {"df_org_ref": df_org_ref, "col_ref": ["LA_parent_code"]}),
+        # Copies the unedited lower and upper LA fields as these are required
+        # for the record level extract
+        ("Copying the unedited LA fields", helpers.copy_columns,
+         {"columns": ["LA_code", "LA_name", "LA_code_lower",
+                      "LA_name_lower"],
+          "suffix": "_unedited"}),
+        # Update Scottish, Welsh and Northern Ireland, and Channel Island and
+        # Isle of Man LA details to the default country codes and names, and
+        # small upper tier LA codes and names to match the LA's that their
+        # data will be combined with in the LA tables / maps (keeping copies
+        # with small LAs still present for the cross boundary outputs)
+        ("Updating the reporting LAs", update_reporting_las, {}),
+        # Update old to new LSOA codes, and add imd deciles by linking on the
+        # updated LSOA code
+        ("Updating the LSOA codes and adding IMD deciles",
+         update_old_to_new_lsoa,
+         {"df_lsoa_ref": df_lsoa_ref, "df_imd_ref": df_imd_ref}),
+        # Update the org code and names with the clinic codes and names
+        # for those with an org code of NQ5 (Brook clinics)
+        ("Updating Brook clinics to organisations", apply_clinic_as_org,
+         {"org_code": "NQ5"}),
+        # Ensure all org names are upper string
+        ("Upper casing the org names", helpers.upper_case_columns,
+         {"columns": ["Org_name"]}),
+        # Create column with the standard age groups used in the outputs
+        ("Adding the age groups", field_definitions.create_age_groups,
+         {"source_field": "Age"}),
+        # Create column with the alternate age groups used in the outputs
+        ("Adding the alternate age groups",
+         field_definitions.create_age_groups_alt, {"source_field": "Age"}),
+        # Update nulls in the main method field to 99 to signify no main
+        # method
+        ("Updating null main methods", helpers.fill_null_values,
+         {"column": "ContraceptiveMainMethod", "value": 99}),
+        # Create new fields with flags to indicate contraceptive care activity
+        ("Adding the contraceptive care flags",
+         field_definitions.contraceptive_care_flags, {}),
+        # Create new fields with flags to indicate SRH code activity
+        ("Adding the SRH activity flags",
+         field_definitions.srh_activity_flags, {}),
+        # Create new fields with flags to indicate emergency oral
+        # contraception activity and emergency IUD contraception activity
+        ("Adding the emergency contraception flags",
+         field_definitions.ec_oral_iud_flags, {}),
+        # Create new field with count of emergency contraception items
+        ("Adding the emergency contraception item counts",
+         field_definitions.number_ec_items, {}),
+        # Create new field which indicates if person was resident outside of
+        # England
+        ("Adding the outside England flag",
+         field_definitions.outside_england_flag, {}),
+        # Hold the code, name and group columns as categoricals to reduce the
+        # memory used and speed up the output aggregations
+        ("Converting to shared categories", schema.apply_shared_categories,
+         {"column_groups": schema.SRHAD_CATEGORY_GROUPS}),
+        ]
+
+    memory_tracker.start_tracking()
+    df = helpers.run_steps(df, steps)
+    memory_tracker.log_column_sizes(df, "the SRHAD data")
+    memory_tracker.stop_tracking()
 
     return df
 
@@ -535,7 +719,7 @@ def update_ahas_ster_vas_data(df):
     df = field_definitions.create_age_groups_ster_vas(df, "Age")
     # Re-aggregate the counts on the added age groups
     columns = ["ReportingYear", "PatientType", "ProcType", "Age_group"]
-    df = df.groupby(columns)["Count"].sum().reset_index()
+    df = df.groupby(columns, observed=True)["Count"].sum().reset_index()
 
     return df
 
@@ -571,7 +755,8 @@ def update_srh_vas_data(df):
 
     # Aggregate the data on the required fields
     columns = ["ReportingYear", "PatientType", "ProcType", "Age_group"]
-    df = df.groupby(columns)["PatientID"].count().reset_index(name='Count')
+    df = (df.groupby(columns, observed=True)["PatientID"].count()
+          .reset_index(name='Count'))
 
     return df
 
@@ -645,9 +830,12 @@ def apply_clinic_as_org(df, org_code):
     # Create the org code filter
     mask = df["Org_code"] == org_code
 
+    df = schema.add_categories(df, ["Org_code"], df.loc[mask, "Clinic_code"])
+    df = schema.add_categories(df, ["Org_name"], df.loc[mask, "Clinic_name"])
+
     # Where the org_code is found in the Org_code column, update the Org_code
     # column with the Clinic_code and the Org_name with the Clinic_name
-    df.loc[mask, "Org_code"] = df.loc[mask, "Clinic_code"]
-    df.loc[mask, "Org_name"] = df.loc[mask, "Clinic_name"]
+    df.loc[mask, "Org_code"] = df.loc[mask, "Clinic_code"].astype(object)
+    df.loc[mask, "Org_name"] = df.loc[mask, "Clinic_name"].astype(object)
 
     return df
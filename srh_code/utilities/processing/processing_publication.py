@@ -1,15 +1,453 @@
 import pandas as pd
 import numpy as np
 import logging
-from srh_code.utilities import filter_definitions, helpers
+from srh_code.utilities import filter_definitions, helpers, schema
 import srh_code.parameters as param
 
 logger = logging.getLogger(__name__)
 
+# Holds the row positions of each filtered subset of the source data while a
+# filter cache is active (see start_filter_cache). Set to None when inactive.
+_filter_cache = None
+
+# Holds the in-memory population and organisation reference data once loaded
+# (see load_reference_data). Set to None when not loaded.
+_reference_data = None
+
+# Holds the output cube plan and the aggregate cubes built from it while the
+# output cubes are active (see start_output_cubes). Set to None when inactive.
+_output_cubes = None
+
+
+def start_filter_cache(df):
+    """
+    Activates the filter cache for a source dataframe. While active,
+    filter_dataframe will compute each distinct filter subset of that dataframe
+    once, storing the subset as an array of row positions that is reused by
+    all later outputs with the same filters.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The source dataframe that outputs will be created from.
+
+    Returns
+    -------
+    None
+    """
+    global _filter_cache
+
+    _filter_cache = {"df_id": id(df),
+                     "subsets": {},
+                     "hits": 0,
+                     "misses": 0}
+
+
+def end_filter_cache():
+    """
+    Logs the filter cache hit and miss counts and deactivates the cache,
+    releasing the stored row positions.
+
+    Returns
+    -------
+    None
+    """
+    global _filter_cache
+
+    if _filter_cache is not None:
+        logging.info(f"Filter cache: {_filter_cache['hits']} hits, "
+                     f"{_filter_cache['misses']} misses "
+                     f"({len(_filter_cache['subsets'])} subsets stored)")
+
+    _filter_cache = None
+
+
+def start_output_cubes(df, output_args):
+    """
+    Plans the aggregate cubes for a set of outputs and activates them for a
+    source dataframe.
+    Each output in output_args is run in planning mode, where
+    create_output_crosstab only records the filters and the variables it groups
+    on. For each distinct set of filters used by more than one output, a cube
+    is planned that holds the counts (or sums) grouped on all the variables
+    needed by those outputs. While active, create_output_crosstab will roll up
+    its aggregate from the cube rather than regrouping the filtered records.
+    The cubes are built when first needed.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The source dataframe that outputs will be created from.
+    output_args: list[dict]
+        The outputs that will be created (as passed to write_outputs).
+
+    Returns
+    -------
+    None
+    """
+    global _output_cubes
+
+    _output_cubes = {"df_id": id(df),
+                     "planning": True,
+                     "plan": {},
+                     "cubes": {},
+                     "hits": 0}
+
+    # Run each of the output contents functions in planning mode. No outputs
+    # are created, as create_output_crosstab and create_output_multi_field
+    # return None in this mode.
+    try:
+        for output in output_args:
+            content_keys = [key for key in output if key.startswith("contents")]
+            for content_key in content_keys:
+                for content in output[content_key]:
+                    content(df)
+    finally:
+        _output_cubes["planning"] = False
+
+    # A cube is only of benefit where the filters are shared by more than one
+    # output
+    _output_cubes["plan"] = {filter_key: plan for filter_key, plan
+                             in _output_cubes["plan"].items()
+                             if plan["uses"] > 1}
+
+    logging.info(f"Output cubes planned: {len(_output_cubes['plan'])}")
+
+
+def end_output_cubes():
+    """
+    Logs the number of outputs aggregated from the output cubes and deactivates
+    them, releasing the stored cubes.
+
+    Returns
+    -------
+    None
+    """
+    global _output_cubes
+
+    if _output_cubes is not None:
+        cubes_built = [cube for cube in _output_cubes["cubes"].values()
+                       if cube is not None]
+        logging.info(f"Output cubes: {_output_cubes['hits']} outputs rolled up "
+                     f"from {len(cubes_built)} cubes")
+
+    _output_cubes = None
+
+
+def plan_output_cube(filter_key, all_variables, measure):
+    """
+    Records the filters, grouping variables and measure of an output in the
+    output cube plan (used while start_output_cubes is planning).
+
+    Parameters
+    ----------
+    filter_key : tuple
+        The filter type, filter condition and if the rates filter is applied.
+    all_variables : list[str]
+        The variables the output is grouped on.
+    measure : tuple(str, str)
+        The aggregation ("count" or "sum") and the column it is applied to.
+
+    Returns
+    -------
+    None
+    """
+    plan = _output_cubes["plan"].setdefault(filter_key,
+                                            {"variables": [],
+                                             "measures": [],
+                                             "uses": 0})
+
+    # Add any new variables and measures to the plan for these filters
+    for variable in all_variables:
+        if variable not in plan["variables"]:
+            plan["variables"].append(variable)
+    if measure not in plan["measures"]:
+        plan["measures"].append(measure)
+
+    plan["uses"] += 1
+
+
+def build_output_cube(df, filter_key):
+    """
+    Builds the output cube planned for a set of filters, holding the counts
+    (or sums) of the filtered data grouped on all the variables needed by the
+    outputs using those filters (nulls included).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    filter_key : tuple
+        The filter type, filter condition and if the rates filter is applied.
+
+    Returns
+    -------
+    None
+    """
+    filter_type, filter_condition, rates_filter = filter_key
+    plan = _output_cubes["plan"][filter_key]
+
+    # Counts and percents outputs share the same filters
+    output_type = "rates" if rates_filter else "counts"
+    df_filtered = filter_dataframe(df, filter_type, filter_condition,
+                                   output_type)
+
+    aggregations = {f"{agg}_{column}": (column, agg)
+                    for agg, column in plan["measures"]}
+    # Categorical variables are grouped on their category codes (with nulls as
+    # -1), as grouping on categoricals with nulls included gives incorrect
+    # groups in some pandas versions
+    categoricals = {variable: df_filtered[variable].cat.categories
+                    for variable in plan["variables"]
+                    if isinstance(df_filtered[variable].dtype,
+                                  pd.CategoricalDtype)}
+    keys = [df_filtered[variable].cat.codes.rename(variable)
+            if variable in categoricals else df_filtered[variable]
+            for variable in plan["variables"]]
+    cube = (df_filtered.groupby(keys, dropna=False)
+            .agg(**aggregations)
+            .reset_index())
+    for variable, categories in categoricals.items():
+        cube[variable] = pd.Categorical.from_codes(cube[variable], categories)
+
+    # Where the cube is not much smaller than the filtered data then it is
+    # not used (the outputs will aggregate the filtered data directly)
+    if len(cube) > param.OUTPUT_CUBE_MAX_RATIO * len(df_filtered):
+        logging.info(f"Output cube for filters {filter_key} not used "
+                     f"({len(cube)} rows from {len(df_filtered)} records)")
+        cube = None
+
+    _output_cubes["cubes"][filter_key] = cube
+
+
+def build_output_cubes(df):
+    """
+    Builds all the planned output cubes not yet built. Used before outputs are
+    created in parallel, so that each cube is built once and shared.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The source dataframe the output cubes were planned for.
+
+    Returns
+    -------
+    None
+    """
+    if _output_cubes is None or _output_cubes["df_id"] != id(df):
+        return
+
+    for filter_key in _output_cubes["plan"]:
+        if filter_key not in _output_cubes["cubes"]:
+            build_output_cube(df, filter_key)
+
+
+def aggregate_from_cube(df, filter_type, filter_condition, output_type,
+                        all_variables, measure):
+    """
+    Aggregates the data for an output from the output cube planned for its
+    filters, building the cube if this is the first output to use it.
+    The cube holds the counts (or sums) of the filtered data grouped on all the
+    variables needed for the filters (nulls included), so summing these on the
+    output variables gives the same result as aggregating the filtered data.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    filter_type : str
+        Determines which of the pre-defined filters are to be applied.
+    filter_condition : str
+        The optional general dataframe filter.
+    output_type : str
+        The type of output being created (counts, percents, rates).
+    all_variables : list[str]
+        The variables the output is grouped on.
+    measure : tuple(str, str)
+        The aggregation ("count" or "sum") and the column it is applied to.
+
+    Returns
+    -------
+    df_agg : pandas.DataFrame
+        Grouped on all_variables with the aggregate in the Count column, or
+        None if there is no cube available for the output.
+    """
+    if _output_cubes is None or _output_cubes["df_id"] != id(df):
+        return None
+
+    filter_key = (filter_type, filter_condition, output_type == "rates")
+    plan = _output_cubes["plan"].get(filter_key)
+    if plan is None or measure not in plan["measures"]:
+        return None
+
+    # Build the cube if not already done.
+    if filter_key not in _output_cubes["cubes"]:
+        build_output_cube(df, filter_key)
+
+    cube = _output_cubes["cubes"][filter_key]
+    if cube is None:
+        return None
+
+    _output_cubes["hits"] += 1
+
+    # Roll up the cube to the output variables
+    agg, column = measure
+    df_agg = (cube.groupby(all_variables, observed=True)[f"{agg}_{column}"]
+              .sum()
+              .reset_index(name="Count"))
+    df_agg = schema.categories_to_values(df_agg)
+
+    return df_agg
+
+
+def load_reference_data(df_pop, df_org_ref):
+    """
+    Loads the population and organisation reference data into memory for use
+    by the output functions, replacing reads of the cached feather files.
+    The data is partitioned by organisation type (with the column names used
+    for each type applied), and each selection made from it by
+    select_population_data and select_org_ref_data is stored for reuse by
+    later outputs.
+
+    Parameters
+    ----------
+    df_pop : pandas.DataFrame
+        The processed population data (output of
+        pre_processing.update_population_data).
+    df_org_ref : pandas.DataFrame
+        The processed LA and regions organisation reference data (output of
+        pre_processing.create_la_ref_data).
+
+    Returns
+    -------
+    None
+    """
+    global _reference_data
+
+    logging.info("Loading the population and organisation reference data")
+
+    # Partition the population data by organisation type, renaming the columns
+    # as per the organisation type.
+    population = {}
+    for org_type, df_type in df_pop.groupby("Org_type", observed=True):
+        population[org_type] = rename_population_columns(df_type, org_type)
+
+    # Partition the organisation reference data by organisation type.
+    org_ref = {org_type: df_type for org_type, df_type
+               in df_org_ref.groupby("Org_type", observed=True)}
+
+    # Valid local level organisation types, as added in pre_processing by
+    # helpers.add_organisation_type
+    org_types_local = (df_org_ref[df_org_ref["Org_level"] == "Local"]
+                       ["Org_type"].unique().tolist())
+
+    _reference_data = {"population": population,
+                       "population_empty": df_pop.head(0),
+                       "org_ref": org_ref,
+                       "org_types_local": org_types_local,
+                       "selections": {}}
+
+
+def clear_reference_data():
+    """
+    Releases the in-memory reference data loaded by load_reference_data.
+    Output functions will revert to reading the cached feather files.
+
+    Returns
+    -------
+    None
+    """
+    global _reference_data
+
+    _reference_data = None
+
+
+def get_reference_data():
+    """
+    Returns the in-memory reference data loaded by load_reference_data (None
+    if not loaded), so that it can be passed to other processes.
+
+    Returns
+    -------
+    dict
+    """
+    return _reference_data
+
+
+def set_reference_data(reference_data):
+    """
+    Sets the in-memory reference data to that previously returned by
+    get_reference_data (e.g. in another process).
+
+    Parameters
+    ----------
+    reference_data : dict
+
+    Returns
+    -------
+    None
+    """
+    global _reference_data
+
+    _reference_data = reference_data
+
+
+def get_population_org_type(columns):
+    """
+    Determines the organisation type of the population data required for an
+    output from the columns it contains.
+
+    Parameters
+    ----------
+    columns : list[str]
+        List of non-count column names that are needed for the output.
+
+    Returns
+    -------
+    str
+        Organisation type as assigned by helpers.add_organisation_type
+    """
+    if "LA_code" in columns:
+        return "LA"
+    elif "LA_parent_code" in columns:
+        return "LA_parent"
+    elif "IMD_decile" in columns:
+        return "LSOA"
+    else:
+        return "National"
+
+
+def rename_population_columns(df, org_type):
+    """
+    Renames the organisation columns of the population data to match the
+    source data column names for the organisation type.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Population data.
+    org_type: str
+        Organisation type of the population data being used.
+
+    Returns
+    -------
+    df: pandas.DataFrame
+    """
+    if org_type == "LA":
+        df = df.rename(columns={"Org_code": "LA_code",
+                                "Org_name": "LA_name",
+                                "Parent_code": "LA_parent_code",
+                                "Parent_name": "LA_parent_name"})
+    elif org_type == "LA_parent":
+        df = df.rename(columns={"Org_code": "LA_parent_code",
+                                "Org_name": "LA_parent_name"})
+
+    return df
+
 
 def select_population_data(columns, filter_condition):
     """
     Extracts the population data for calculating rates.
+    Uses the in-memory reference data where loaded (see load_reference_data),
+    else reads the population data from the cached folder.
 
     Parameters
     ----------
@@ -29,25 +467,26 @@ def select_population_data(columns, filter_condition):
     """
     logging.info("Extracting the required population data")
 
-    # Read in the population reference data from the cached folder.
-    df = pd.read_feather('cached_dataframes/df_pop.ft')
-
-    # Check the required organisation type from the columns argument, and
-    # rename columns in population data as per the organisation type
-    if "LA_code" in columns:
-        org_type = "LA"
-        df = df.rename(columns={"Org_code": "LA_code",
-                                "Org_name": "LA_name",
-                                "Parent_code": "LA_parent_code",
-                                "Parent_name": "LA_parent_name"})
-    elif "LA_parent_code" in columns:
-        org_type = "LA_parent"
-        df = df.rename(columns={"Org_code": "LA_parent_code",
-                                "Org_name": "LA_parent_name"})
-    elif "IMD_decile" in columns:
-        org_type = "LSOA"
+    # Check the required organisation type from the columns argument
+    org_type = get_population_org_type(columns)
+
+    # Return the stored version of this selection if already created
+    selection_key = ("population", org_type, tuple(columns), filter_condition)
+    if _reference_data is not None:
+        if selection_key in _reference_data["selections"]:
+            return _reference_data["selections"][selection_key].copy()
+
+    # Select the population data for the organisation type, with columns
+    # renamed as per the organisation type.
+    if _reference_data is not None:
+        df = _reference_data["population"].get(
+            org_type,
+            rename_population_columns(_reference_data["population_empty"],
+                                      org_type))
     else:
-        org_type = "National"
+        # Read in the population reference data from the cached folder.
+        df = pd.read_feather('cached_dataframes/df_pop.ft')
+        df = rename_population_columns(df, org_type)
 
     # Add the available columns in the population data to a list
     pop_columns = df.columns.tolist()
@@ -60,17 +499,22 @@ def select_population_data(columns, filter_condition):
                             {pop_columns} are available. Please review the output \
                             specification")
 
-    # Filter population df to required organisation level.
-    df = df[df["Org_type"] == org_type]
+    if _reference_data is None:
+        # Filter population df to required organisation level.
+        df = df[df["Org_type"] == org_type]
 
     # Apply the optional general filter
     if filter_condition is not None:
         df = df.query(filter_condition)
 
     # Group and sum population data by the required column groupings.
-    df_agg = (df.groupby(columns, as_index=False)
+    df_agg = (df.groupby(columns, as_index=False, observed=True)
               ["Count"].sum())
 
+    # Store the selection for reuse by later outputs
+    if _reference_data is not None:
+        _reference_data["selections"][selection_key] = df_agg.copy()
+
     return df_agg
 
 
@@ -78,6 +522,8 @@ def select_org_ref_data(org_type, columns):
     """
     Extracts the valid sub regional (local) level organisation reference
     data based on the org_type argument.
+    Uses the in-memory reference data where loaded (see load_reference_data),
+    else reads the organisation reference data from the cached folder.
 
     Parameters
     ----------
@@ -97,19 +543,31 @@ def select_org_ref_data(org_type, columns):
     """
     logging.info("Extracting the required type of organisation data")
 
-    # Read in the organisation reference data from the cached folder.
-    df = pd.read_feather('cached_dataframes/df_la_ref.ft')
+    # Return the stored version of this selection if already created
+    selection_key = ("org_ref", org_type, tuple(columns))
+    if _reference_data is not None:
+        if selection_key in _reference_data["selections"]:
+            return _reference_data["selections"][selection_key].copy()
+
+    if _reference_data is not None:
+        org_type_valid = _reference_data["org_types_local"]
+    else:
+        # Read in the organisation reference data from the cached folder.
+        df = pd.read_feather('cached_dataframes/df_la_ref.ft')
+        org_type_valid = df[df["Org_level"] == "Local"]
+        org_type_valid = org_type_valid["Org_type"].unique().tolist()
 
     # Check that a valid org_type has been used - exists in the organisation
     # reference data as added in pre_processing by helpers.add_organisation_type
-    org_type_valid = df[df["Org_level"] == "Local"]
-    org_type_valid = org_type_valid["Org_type"].unique().tolist()
     helpers.validate_value_with_list("Org_type",
                                      org_type,
                                      org_type_valid)
 
     # Extract the required organisation types
-    df_org_type = df[df["Org_type"] == org_type]
+    if _reference_data is not None:
+        df_org_type = _reference_data["org_ref"][org_type]
+    else:
+        df_org_type = df[df["Org_type"] == org_type]
 
     # For LA outputs, retain the lower or upper tier LA's only, as determined by
     # the level of LA being reported.
@@ -155,6 +613,10 @@ def select_org_ref_data(org_type, columns):
     # Extract the details (column names) needed for the output
     df_orgs = df_orgs[columns]
 
+    # Store the selection for reuse by later outputs
+    if _reference_data is not None:
+        _reference_data["selections"][selection_key] = df_orgs.copy()
+
     return df_orgs
 
 
@@ -206,6 +668,8 @@ def merge_org_ref_data(df, join_on, org_type, columns):
 def filter_dataframe(df, filter_type, filter_condition, output_type):
     """
     Filters a dataframe with optional filters required.
+    Where the filter cache is active for the dataframe (see start_filter_cache)
+    each distinct subset is only computed once.
 
     Parameters
     ----------
@@ -235,6 +699,25 @@ def filter_dataframe(df, filter_type, filter_condition, output_type):
         helpers.validate_value_with_list("filter_type", filter_type,
                                          valid_filter_types)
 
+    # If the filter cache is active for this dataframe then return the stored
+    # subset where these filters have already been applied. Row positions are
+    # only valid where the dataframe index is unique.
+    use_cache = (_filter_cache is not None
+                 and _filter_cache["df_id"] == id(df)
+                 and df.index.is_unique)
+    if use_cache:
+        # Counts and percents outputs share the same subset, so the output
+        # type only forms part of the key through the rates filter.
+        cache_key = (filter_type, filter_condition, output_type == "rates")
+        positions = _filter_cache["subsets"].get(cache_key)
+        if positions is not None:
+            _filter_cache["hits"] += 1
+            return df.take(positions)
+        _filter_cache["misses"] += 1
+
+    # Keep a reference to the unfiltered data for storing the row positions
+    df_source = df
+
     # Apply pre-set filters from filter_definitions.py
     if filter_type == "persons_first_contact":
         df = filter_definitions.filter_persons_first_contact(df)
@@ -263,6 +746,10 @@ def filter_dataframe(df, filter_type, filter_condition, output_type):
         df = df.query("(Outside_england == 'N')")
         df = df.query("(Age_group_alt not in['<13', '55+', 'unrecorded'])")
 
+    # Store the row positions of the subset for reuse by later outputs
+    if use_cache:
+        _filter_cache["subsets"][cache_key] = df_source.index.get_indexer(df.index)
+
     return df
 
 
@@ -372,6 +859,178 @@ def sort_for_output(df, sort_on, cols_to_remove, include_row_total=True,
     return df
 
 
+def crosstab_counts(df, rows, columns=None, row_subgroup=None,
+                    column_subgroup=None, margins_name="Grand_total"):
+    """
+    Creates a crosstab of aggregated counts, with a grand total for each row
+    and column, and any row or column subgroups.
+    Gives the same result as pivoting the data with pd.pivot_table (summing,
+    with margins) and then adding the subgroups with helpers.add_subgroup_rows
+    and helpers.add_subgroup_columns, but the counts are only grouped once.
+    The count matrix is created by unstacking the grouped counts, and the
+    totals and subgroups are then sums of the matrix.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Aggregated data with the rows and columns variables and a Count column
+    rows : list[str]
+        Variable name(s) that holds the row labels
+    columns : str
+        Single variable name that holds the column headers. If None, then only
+        the grand total column is created.
+    row_subgroup: dict(dict(str, list))
+        Optional row subgroups (see helpers.add_subgroup_rows)
+    column_subgroup: dict(str, list)
+        Optional column subgroups (see helpers.add_subgroup_columns)
+    margins_name : str
+        Label of the grand total row and column
+
+    Returns
+    -------
+    df_pivot : pandas.DataFrame
+        With the rows variables as columns, followed by a column for each
+        value of the columns variable and the grand total column. Combinations
+        of values with no data have a count of 0.
+    """
+    # Sum the counts for each combination of the row and column values
+    group_on = rows if columns is None else rows + [columns]
+    counts = df.groupby(group_on, observed=True)["Count"].sum()
+
+    # Create the count matrix, with the total of each row as the grand total
+    # column, and the grand total row as the total of each column
+    if columns is None:
+        df_matrix = counts.to_frame(margins_name)
+        column_totals = [counts.sum()]
+    else:
+        df_matrix = counts.unstack(columns)
+        df_matrix[margins_name] = counts.groupby(level=rows).sum()
+        column_totals = (counts.groupby(level=columns).sum().tolist()
+                         + [counts.sum()])
+
+    # The grand total row is labelled in the first row variable (and blank for
+    # any others)
+    total_label = (margins_name,) + ("",) * (len(rows) - 1)
+    total_index = pd.MultiIndex.from_tuples([total_label], names=rows)
+    if len(rows) == 1:
+        total_index = total_index.get_level_values(0)
+    df_totals = pd.DataFrame([column_totals], index=total_index,
+                             columns=df_matrix.columns)
+
+    # Replace null values (combinations with no data) with count of 0
+    df_matrix = pd.concat([df_matrix, df_totals]).fillna(0)
+
+    # Add the row subgroups, as the totals of the rows in each subgroup
+    if row_subgroup is not None:
+        for subgroup_column, subgroup_info in row_subgroup.items():
+            for subgroup_code, subgroup_values in subgroup_info.items():
+                in_subgroup = (df_matrix.index
+                               .get_level_values(subgroup_column)
+                               .isin(subgroup_values))
+                df_subgroup = df_matrix[in_subgroup].reset_index()
+                df_subgroup[subgroup_column] = subgroup_code
+                df_subgroup = df_subgroup.groupby(rows).sum()
+                df_matrix = pd.concat([df_matrix, df_subgroup])
+
+    # Add the column subgroups, as the totals of the columns in each subgroup
+    if column_subgroup is not None:
+        for subgroup_name, subgroup_cols in column_subgroup.items():
+            df_matrix[subgroup_name] = df_matrix[subgroup_cols].sum(axis=1)
+
+    return df_matrix.reset_index()
+
+
+def pivot_crosstab(df, rows, columns, row_subgroup, column_subgroup):
+    """
+    Pivots aggregated counts into crosstab format, with grand totals, any
+    row or column subgroups, and all the valid organisations for local level
+    outputs (see create_output_crosstab).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Aggregated data with the rows and columns variables and a Count column
+    rows : list[str]
+        Variable name(s) that holds the row labels
+    columns : str
+        Single variable name that holds the column headers (or None)
+    row_subgroup: dict(dict(str, list))
+        Optional row subgroups (see create_output_crosstab)
+    column_subgroup: dict(str, list)
+        Optional column subgroups (see create_output_crosstab)
+
+    Returns
+    -------
+    df_pivot : pandas.DataFrame
+    """
+    # Pivot the data into crosstab format, with any required row or column
+    # subgroups
+    df_pivot = crosstab_counts(df, rows, columns, row_subgroup,
+                               column_subgroup)
+
+    # Check the rows content for the presence of one of the sub regional org
+    # types defined for the project in parameters.py
+    # If present then join to the valid organisation reference data.
+    # This ensures all (and only) current valid organisations are included,
+    # even those with no data.
+    for local_col_name, local_type in param.LOCAL_LEVEL_ORGS.items():
+        if local_col_name in rows:
+            df_pivot = merge_org_ref_data(df_pivot,
+                                          local_col_name, local_type, rows)
+
+    return df_pivot
+
+
+def population_denominators(all_variables, filter_condition, rows, columns,
+                            row_subgroup, column_subgroup):
+    """
+    Returns the population denominators of a rates output, as the population
+    data for the output (see select_population_data) pivoted into the same
+    crosstab format as the counts (see pivot_crosstab).
+    Where the in-memory reference data is loaded (see load_reference_data),
+    the denominators are created once for each organisation level, set of
+    variables, filter condition and subgroups, and stored for reuse by later
+    outputs.
+
+    Parameters
+    ----------
+    all_variables : list[str]
+        The rows and columns variables of the output
+    filter_condition : str
+        Non-standard, optional dataframe filter as a string
+    rows : list[str]
+        Variable name(s) that holds the row labels
+    columns : str
+        Single variable name that holds the column headers (or None)
+    row_subgroup: dict(dict(str, list))
+        Optional row subgroups (see create_output_crosstab)
+    column_subgroup: dict(str, list)
+        Optional column subgroups (see create_output_crosstab)
+
+    Returns
+    -------
+    df_pivot : pandas.DataFrame
+    """
+    # Return the stored version of these denominators if already created
+    # (the subgroups are held as strings so that they can be part of the key)
+    selection_key = ("denominators", get_population_org_type(all_variables),
+                     tuple(all_variables), filter_condition, tuple(rows),
+                     columns, repr(row_subgroup), repr(column_subgroup))
+    if _reference_data is not None:
+        if selection_key in _reference_data["selections"]:
+            return _reference_data["selections"][selection_key].copy()
+
+    df_pop_agg = select_population_data(all_variables, filter_condition)
+    df_pivot = pivot_crosstab(df_pop_agg, rows, columns, row_subgroup,
+                              column_subgroup)
+
+    # Store the denominators for reuse by later outputs
+    if _reference_data is not None:
+        _reference_data["selections"][selection_key] = df_pivot.copy()
+
+    return df_pivot
+
+
 def df_counts_to_percents(df, rows, percent_across_columns=True,
                           disclosure_control=False, measure_type=None,
                           denominator="Grand_total", round_to_dp=0, cut_off=400):
@@ -412,56 +1071,55 @@ def df_counts_to_percents(df, rows, percent_across_columns=True,
         With percentages replacing counts
     """
 
-    # Set the columns that don't contain counts as the index.
-    df.set_index(rows, inplace=True)
-    # Determine if percents are calculated based on the row or column content
-    # If based on row content then the rows are temporarily transposed to
-    # columns whilst percents are added.
-    if not percent_across_columns:
-        df = df.transpose()
-
-    # For the data quality outputs, the rule for not showing percents based on
-    # low denominators is not applied. This section checks for the DQ columns
-    # in the output, and if present skips that element of processing.
-    if measure_type == "DQ":
-        # all records are placed in the dataframe to which percents will be applied
-        df_shown = df
-        # dummy dataframes with same structure are created for the not shown and
-        # zero denominator checks
-        df_not_shown = df.drop(df.index)
-        df_zero = df_not_shown
-
-    # For all non data quality outputs, process all rules.
+    # Set the columns that don't contain counts as the index, and get the
+    # counts as a single array
+    df = df.set_index(rows)
+    counts = df.to_numpy(dtype=float, na_value=np.nan)
+
+    # Determine if percents are calculated based on the row or column content,
+    # and get the denominator of each row (as a column of values) or of each
+    # column (as a row of values)
+    if percent_across_columns:
+        position = np.flatnonzero(
+            df.columns.get_level_values(0) == denominator)[0]
+        denominators = counts[:, [position]]
     else:
-        # Select rows with zero denominator (percent will not be applied)
-        df_zero = df[df[denominator] == 0].copy()
-        # Select rows with denominator above 0 but below cutoff (percent will
-        # not be shown)
-        df_not_shown = df[(df[denominator] > 0) & (df[denominator] < cut_off)].copy()
-        # Select all other rows (percent will be shown)
-        df_shown = df[df[denominator] >= cut_off].copy()
-
-        # For the zero denominator and not shown data, update all cells to the
-        # default values.
-        df_zero = df_zero.replace({0: param.NOT_APPLICABLE})
-        for column in df_not_shown.columns:
-            df_not_shown[column] = param.NOT_SHOWN
-
-    # For all other rows, the percent is now applied (rounded if disclosure
-    # control is true
-    df_shown = df_shown.apply(lambda a: (a/df_shown[denominator]) * 100)
+        position = np.flatnonzero(
+            df.index.get_level_values(0) == denominator)[0]
+        denominators = counts[[position], :]
+
+    # Apply the percent to all the counts in a single operation (rounded if
+    # disclosure control is true)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percents = (counts / denominators) * 100
     if disclosure_control:
-        df_shown = df_shown.applymap(lambda a: np.inf if a == np.inf else
-                                     helpers.round_half_up(a, round_to_dp))
+        percents = helpers.round_half_up_values(percents, round_to_dp)
+
+    # Hold the percents in an object array, so that the not applicable and
+    # not shown values can be added to it
+    values = percents.astype(object)
 
-    # Join the datasets back together
-    df = pd.concat([df_zero, df_not_shown, df_shown])
+    # For the data quality outputs, the rule for not showing percents based on
+    # low denominators is not applied. For all non data quality outputs,
+    # process all rules.
+    if measure_type != "DQ":
+        # Rows (or columns) with zero denominator (percent will not be
+        # applied, and zero counts are shown as not applicable)
+        zero = np.broadcast_to(denominators == 0, counts.shape)
+        values[zero] = counts[zero]
+        values[zero & (counts == 0)] = param.NOT_APPLICABLE
+
+        # Rows (or columns) with denominator above 0 but below cutoff (percent
+        # will not be shown)
+        not_shown = np.broadcast_to((denominators > 0)
+                                    & (denominators < cut_off), counts.shape)
+        values[not_shown] = param.NOT_SHOWN
 
-    # If df was transposed before percents were added, then transpose back
-    if not percent_across_columns:
-        df = df.transpose()
+    # Columns without any not applicable or not shown values are returned as
+    # numbers
+    df = pd.DataFrame(values, index=df.index, columns=df.columns)
 
-    return df.reset_index()
+    return df.infer_objects().reset_index()
 
 
 def df_apply_rates(df_denom, df_num, rows, multiplier,
@@ -505,8 +1163,7 @@ def df_apply_rates(df_denom, df_num, rows, multiplier,
 
     # Round rates if disclosure control is being applied
     if disclosure_control:
-        df_rates = df_rates.applymap(lambda a: np.inf if a == np.inf else
-                                     helpers.round_half_up(a, round_to_dp))
+        df_rates = helpers.round_half_up_values(df_rates, round_to_dp)
 
     # Replace any infinity values (where denominator was 0) with the default
     # not applicable value
@@ -611,10 +1268,6 @@ def create_output_crosstab(df, filter_type, filter_condition, rows, columns,
     helpers.validate_value_with_list("output_type", output_type,
                                      valid_output_types)
 
-    # Filter data as per filter type and condition
-    df_filtered = filter_dataframe(df, filter_type, filter_condition,
-                                   output_type)
-
     # If sort_on is used, need to account for columns only used for sorting
     rows, cols_to_remove = check_for_sort_on(sort_on, rows)
 
@@ -625,68 +1278,64 @@ def create_output_crosstab(df, filter_type, filter_condition, rows, columns,
     else:
         all_variables = rows + [columns]
 
-    # Aggregate the data and create count column. If sum_column is present then
-    # this will use the sum values in that column. Else will add a count of the
+    # Set the aggregation to be used. If sum_column is present then this will
+    # use the sum values in that column. Else will be a count of the
     # count_column
     if sum_column is not None:
-        df_agg = (df_filtered.groupby(all_variables)[sum_column]
-                  .sum()
-                  .reset_index(name='Count'))
+        measure = ("sum", sum_column)
     else:
-        df_agg = (df_filtered.groupby(all_variables)[count_column]
-                  .count()
-                  .reset_index(name='Count'))
+        measure = ("count", count_column)
+
+    # If the output cubes are being planned then only record what is needed
+    # for this output (see start_output_cubes)
+    if _output_cubes is not None and _output_cubes["planning"]:
+        plan_output_cube((filter_type, filter_condition, output_type == "rates"),
+                         all_variables, measure)
+        return None
+
+    # Aggregate the data and create count column, using the output cube for
+    # these filters where available.
+    df_agg = aggregate_from_cube(df, filter_type, filter_condition,
+                                 output_type, all_variables, measure)
+
+    if df_agg is None:
+        # Filter data as per filter type and condition
+        df_filtered = filter_dataframe(df, filter_type, filter_condition,
+                                       output_type)
+
+        if sum_column is not None:
+            df_agg = (df_filtered.groupby(all_variables, observed=True)
+                      [sum_column]
+                      .sum()
+                      .reset_index(name='Count'))
+        else:
+            df_agg = (df_filtered.groupby(all_variables, observed=True)
+                      [count_column]
+                      .count()
+                      .reset_index(name='Count'))
+        # Hold the (aggregated) groupings as values, so that totals and
+        # subgroups can be added
+        df_agg = schema.categories_to_values(df_agg)
 
     # Create a dataframe list which will be looped through for the next steps
     # This is because for rates outputs, the same processing is applied to both the
-    # counts and population data
-    dfs_to_process = [df_agg]
+    # counts and population data. Each is first pivoted into crosstab format.
+    dfs_to_process = [pivot_crosstab(df_agg, rows, columns, row_subgroup,
+                                     column_subgroup)]
 
-    # If population rates are required, then select the required data and add it
-    # to the df list
+    # If population rates are required, then add the population denominators
+    # (pivoted in the same way) to the df list
     if output_type == "rates":
-        df_pop_agg = select_population_data(all_variables, filter_condition)
-        dfs_to_process.append(df_pop_agg)
+        df_pop_pivot = population_denominators(all_variables, filter_condition,
+                                               rows, columns, row_subgroup,
+                                               column_subgroup)
+        dfs_to_process.append(df_pop_pivot)
 
     # Create an empty list that the dfs will be added to once the following common
     # processing steps are complete.
     total_dfs = []
     # For each df run the common processing steps
-    for df in dfs_to_process:
-
-        # Pivot the data into crosstab format
-        df_pivot = pd.pivot_table(df,
-                                  values="Count",
-                                  index=rows,
-                                  columns=columns,
-                                  aggfunc="sum",
-                                  margins=True,
-                                  margins_name="Grand_total").reset_index()
-
-        # If no grand_total column was created (no columns content) then rename
-        # the Count column to Grand_total
-        if "Count" in df_pivot.columns:
-            df_pivot.rename(columns={"Count": "Grand_total"}, inplace=True)
-
-        # Replace null values created during pivoting with count of 0
-        df_pivot = df_pivot.fillna(0)
-
-        # Add any required row or column subgroups to data
-        if row_subgroup is not None:
-            df_pivot = helpers.add_subgroup_rows(df_pivot, rows, row_subgroup)
-
-        if column_subgroup is not None:
-            df_pivot = helpers.add_subgroup_columns(df_pivot, column_subgroup)
-
-        # Check the rows content for the presence of one of the sub regional org
-        # types defined for the project in parameters.py
-        # If present then join to the valid organisation reference data.
-        # This ensures all (and only) current valid organisations are included,
-        # even those with no data.
-        for local_col_name, local_type in param.LOCAL_LEVEL_ORGS.items():
-            if local_col_name in rows:
-                df_pivot = merge_org_ref_data(df_pivot,
-                                              local_col_name, local_type, rows)
+    for df_pivot in dfs_to_process:
 
         # This section ensures column_order it is not empty when called in next step.
         # If no columns were defined then set it as the total count created by
@@ -702,10 +1351,11 @@ def create_output_crosstab(df, filter_type, filter_condition, rows, columns,
         # at this point in order that the counts remain numeric.
         # Grand total is included even if not in the output columns, as where
         # percents are calculated, they are based on rounded totals.
+        # All the count columns are suppressed together in a single operation
+        # (suppression is repeatable, so a column only needs including once).
         if disclosure_control:
-            df_pivot["Grand_total"] = helpers.suppress_column(df_pivot["Grand_total"])
-            for column in column_order:
-                df_pivot[column] = helpers.suppress_column(df_pivot[column])
+            suppress_cols = list(dict.fromkeys(["Grand_total"] + column_order))
+            df_pivot[suppress_cols] = helpers.suppress_values(df_pivot[suppress_cols])
 
         # Apply the count multiplier if applicable
         if (multiplier is not None) & (output_type == "counts"):
@@ -848,6 +1498,11 @@ def create_output_multi_field(df, filter_type, filter_condition, breakdown,
     helpers.validate_value_with_list("output_type", output_type,
                                      valid_output_types)
 
+    # Multi field outputs are not aggregated from the output cubes, so there is
+    # nothing to record if these are being planned (see start_output_cubes)
+    if _output_cubes is not None and _output_cubes["planning"]:
+        return None
+
     # Filter data as per filter type and condition
     df_filtered = filter_dataframe(df, filter_type, filter_condition,
                                    output_type)
@@ -864,8 +1519,13 @@ def create_output_multi_field(df, filter_type, filter_condition, breakdown,
     # Get the measures group needed based on defined measure_type
     measures = param.MEASURES_GROUP[measure_type]
 
-    # Group the data on the breakdown columns, summing up all measure columns
-    df_group = (df_filtered.fillna(0).groupby(breakdown)[measures].sum())
+    # Group the data on the breakdown columns, summing up all measure columns.
+    # The breakdown columns are held as values (rather than categories) so
+    # that nulls can be filled and totals and subgroups added.
+    df_group = (schema.categories_to_values(df_filtered[breakdown + measures]
+                                            .copy())
+                .fillna(0)
+                .groupby(breakdown, observed=True)[measures].sum())
 
     # Depending on the measure_base being Activity or Contacts or EC define
     # how we calculate the total of columns
@@ -874,7 +1534,7 @@ def create_output_multi_field(df, filter_type, filter_condition, breakdown,
         df_group["Grand_total"] = df_group.sum(axis=1)
     elif measure_type in ["Contacts", "DQ"]:
         # Contacts total is the count of all PatientIDs
-        df_count = (df_filtered.groupby(by=breakdown)
+        df_count = (df_filtered.groupby(by=breakdown, observed=True)
                     .agg(Grand_total=("PatientID", "count")))
 
         df_group = df_group.merge(df_count, how="left", on=breakdown)
@@ -900,9 +1560,8 @@ def create_output_multi_field(df, filter_type, filter_condition, breakdown,
     # Apply count suppression and rounding. Suppressed values will be nulls
     # at this point in order that the counts remain numeric.
     if disclosure_control:
-        df_group["Grand_total"] = helpers.suppress_column(df_group["Grand_total"])
-        for column in measures:
-            df_group[column] = helpers.suppress_column(df_group[column])
+        suppress_cols = list(dict.fromkeys(["Grand_total"] + measures))
+        df_group[suppress_cols] = helpers.suppress_values(df_group[suppress_cols])
 
     # Apply the count multiplier if applicable
     if (multiplier is not None) & (output_type == "counts"):
@@ -1,7 +1,7 @@
 import xlwings as xw
-import win32com.client as win32
+import openpyxl
 import PIL
-from PIL import ImageGrab, Image
+from PIL import Image
 import srh_code.parameters as param
 import datetime
 import srh_code.utilities.helpers as helpers
@@ -59,10 +59,41 @@ def define_labels(tag):
     return label
 
 
+def get_row_labels(row_values, labels):
+    """
+    Finds the labels for the tagged cells in a worksheet row (cells holding
+    'tag_' followed by the tag name).
+
+    Parameters
+    ----------
+    row_values : list
+        The cell values of the row, starting from column A.
+    labels : dict(str, str)
+        Holds the label for each tag already defined, so that each is only
+        defined once. Updated with the labels of any new tags.
+    Returns
+    -------
+    row_labels : dict(int, str)
+        The label to be written to each tagged cell, keyed by column number.
+    """
+    row_labels = {}
+    for col_n, value in enumerate(row_values, start=1):
+        check = str(value)
+        if check.startswith("tag_"):
+            tag = check[4:]
+            if tag not in labels:
+                labels[tag] = define_labels(tag)
+            row_labels[col_n] = labels[tag]
+
+    return row_labels
+
+
 def add_labels(filename):
     """
     Adds labels to an output file based on tags read in from cells within a
     specified range (set here as A1:P200). Checks all worksheets in the file.
+    The range of each worksheet is read in a single call and checked for tags
+    in memory, with only the tagged cells written back.
 
     Parameters
     ----------
@@ -78,24 +109,90 @@ def add_labels(filename):
     # Load Excel template
     wb = xw.Book(filename)
 
-    for sheet in wb.sheets:
-        sht = wb.sheets[sheet]
-        sht.select()
-        # Define the cell range to be checked for each of the worksheets
+    # Holds the label for each tag, so that each is only defined once
+    labels = {}
+
+    for sht in wb.sheets:
+        # Define the cell range to be checked for each of the worksheets, and
+        # read all the values in the range
         endrow = sht.range('A200').end('up').last_cell.row+1
         check_range = "A1:P"+str(endrow)
-        cells = sht.range(check_range)
-        # For each cell in the range, check for tags and apply labels
-        for cell in cells:
-            check = str(sht.range(cell).value)
-            if check == "":
-                pass
-            elif check.startswith("tag_"):
-                tag = check[4:]
-                sht.range(cell).value = define_labels(tag)
+        values = sht.range(check_range).options(ndim=2).value
+
+        # For each row in the range, check for tags and find the labels
+        for row_n, row_values in enumerate(values, start=1):
+            row_labels = get_row_labels(row_values, labels)
+
+            # Write the labels for the row, with each run of adjacent tagged
+            # cells written in a single call
+            write_cell_runs(sht, row_n, row_labels)
+
+
+def add_labels_openpyxl(wb):
+    """
+    Adds labels to a workbook opened with openpyxl, based on tags read in from
+    cells within the same range as add_labels. Checks all worksheets in the
+    workbook.
 
+    Parameters
+    ----------
+    wb : openpyxl.Workbook
+    Returns
+    -------
+        None
+    """
+    logging.info("Writing labels to file")
 
-def save_tables(source_file):
+    # Holds the label for each tag, so that each is only defined once
+    labels = {}
+
+    for sht in wb.worksheets:
+        # Check the rows down to the row after the last value in A1:A200 (as
+        # add_labels), limited to the rows in use
+        last_row = min(200, sht.max_row)
+        column_a = next(sht.iter_cols(min_col=1, max_col=1, max_row=last_row,
+                                      values_only=True))
+        rows_in_use = [row_n for row_n, value in enumerate(column_a, start=1)
+                       if value is not None]
+        endrow = min(max(rows_in_use, default=1) + 1, sht.max_row)
+        values = sht.iter_rows(min_row=1, max_row=endrow, max_col=16,
+                               values_only=True)
+
+        for row_n, row_values in enumerate(values, start=1):
+            row_labels = get_row_labels(row_values, labels)
+            for col_n, label in row_labels.items():
+                sht.cell(row_n, col_n).value = label
+
+
+def write_cell_runs(sht, row, cell_values):
+    """
+    Writes values to cells in a worksheet row, writing each run of adjacent
+    cells in a single call.
+
+    Parameters
+    ----------
+    sht : xlwings.Sheet
+        Worksheet to be written to.
+    row : int
+        Row number of the cells.
+    cell_values : dict(int, str)
+        The value to be written to each cell, keyed by column number.
+    Returns
+    -------
+        None
+    """
+    columns = sorted(cell_values)
+    run_start = 0
+    for position, col in enumerate(columns):
+        # Write the run once the next column is not adjacent to this one
+        if position == len(columns) - 1 or columns[position + 1] != col + 1:
+            run = columns[run_start:position + 1]
+            sht.range((row, run[0]), (row, run[-1])).value = [
+                [cell_values[run_col] for run_col in run]]
+            run_start = position + 1
+
+
+def save_tables(source_file, backend=None):
     """
     Save updated table template to the final data tables folder
 
@@ -103,10 +200,20 @@ def save_tables(source_file):
     ----------
     source_file : path
         filepath of the Excel file that contains the tables to be saved.
+    backend : str
+        The Excel backend used to save the tables, "xlwings" or "openpyxl".
+        Defaults to the EXCEL_WRITE_BACKEND set in parameters.py.
     Returns
     -------
         None
     """
+    if backend is None:
+        backend = param.EXCEL_WRITE_BACKEND
+
+    if backend == "openpyxl":
+        save_tables_openpyxl(source_file)
+        return
+
     logging.info("Saving final publication tables")
 
     # Select the master tables file
@@ -136,6 +243,42 @@ def save_tables(source_file):
     xw.apps.active.api.Quit()
 
 
+def save_tables_openpyxl(source_file):
+    """
+    Save updated table template to the final data tables folder using
+    openpyxl (without Excel). See save_tables.
+
+    Parameters
+    ----------
+    source_file : path
+        filepath of the Excel file that contains the tables to be saved.
+    Returns
+    -------
+        None
+    """
+    logging.info("Saving final publication tables")
+
+    wb = openpyxl.load_workbook(source_file)
+
+    # Remove any worksheets that are not published based on the parameter input list
+    for sheet in param.TABLES_REMOVE:
+        if sheet in wb.sheetnames:
+            del wb[sheet]
+
+    # Add the labels to each sheet based on the tags in the master file
+    add_labels_openpyxl(wb)
+
+    # Open the file on the title sheet
+    for sht in wb.worksheets:
+        sht.sheet_view.tabSelected = False
+    wb.active = wb["Contents"]
+    wb.active.sheet_view.tabSelected = True
+
+    # Save the tables to the publication folder, named as per the reporting year
+    save_name = "srh-serv-eng-" + param.FYEAR + "-tab.xlsx"
+    wb.save(param.TAB_DIR / save_name)
+
+
 def resize_image(image, size_factor):
     """
     Resizes a saved image based on a sizing (multiplying) factor
@@ -184,6 +327,11 @@ def save_charts_as_image(source_file,
     -------
         None
     """
+    # Imported here as these are only available on Windows, and the rest of
+    # the module is also used by the headless (Linux) pipeline
+    import win32com.client as win32
+    from PIL import ImageGrab
+
     logging.info("Saving final publication charts")
 
     # Activate the chart master file using win32 (to allow selection of chart objects)
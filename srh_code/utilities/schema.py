@@ -0,0 +1,233 @@
+"""
+Purpose of the script: contains the column data types (schema) of the source
+data, the functions that apply them as the data is imported, and the functions
+used to work with the resulting categorical columns.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Data types of the SRHAD source data columns (as returned by
+# query_asset_reporting.sql). Codes with few distinct values are held as
+# categoricals, and the coded fields and flags as small (nullable) integers,
+# which greatly reduces the memory used compared to the default object and
+# float columns. Columns not listed keep the type read from the database.
+SRHAD_DTYPES = {
+    "Org_code": "category",
+    "Org_name": "category",
+    "Clinic_code": "category",
+    "Clinic_name": "category",
+    "Clinic_LA_code_lower": "category",
+    "Clinic_LA_name_lower": "category",
+    "Clinic_LA_code_upper": "category",
+    "Clinic_LA_name_upper": "category",
+    "Gender": "category",
+    "Age": "Int32",
+    "Ethnicity": "category",
+    "LA_code": "category",
+    "LA_name": "category",
+    "LA_code_lower": "category",
+    "LA_name_lower": "category",
+    "LA_parent_code": "category",
+    "LSOA_code": "category",
+    "GP_code": "category",
+    "InitialContact": "category",
+    "MainContact": "category",
+    "FirstContact": "category",
+    "LocationType": "category",
+    "ConsultationMedium": "category",
+    "ContraceptiveMethodStatus": "Int8",
+    "ContraceptiveMainMethod": "Int8",
+    "ContraceptiveOtherMethod1": "Int8",
+    "ContraceptiveOtherMethod2": "Int8",
+    "EmergencyContraceptionFlag": "Int8",
+    "ContraceptiveMethodPostCoital1": "Int8",
+    "ContraceptiveMethodPostCoital2": "Int8",
+    "SRHCareActivity1": "Int8",
+    "SRHCareActivity2": "Int8",
+    "SRHCareActivity3": "Int8",
+    "SRHCareActivity4": "Int8",
+    "SRHCareActivity5": "Int8",
+    "SRHCareActivity6": "Int8",
+    "SRHCareActivityFLag": "Int8",
+    }
+
+# Columns of the pre-processed SRHAD data that are held as categoricals (see
+# update_srhad_source_data). Each list of columns shares the same categories,
+# so that the columns can be compared with each other directly (e.g. the
+# clinic and residence LA codes used by the cross boundary outputs).
+SRHAD_CATEGORY_GROUPS = [
+    ["Org_code", "Org_code_unedited", "Clinic_code"],
+    ["Org_name"],
+    ["Clinic_name"],
+    ["LA_code", "LA_code_unedited", "LA_code_inc_small",
+     "Clinic_LA_code_upper"],
+    ["LA_name", "LA_name_unedited", "LA_name_inc_small",
+     "Clinic_LA_name_upper"],
+    ["LA_code_lower", "LA_code_lower_unedited", "Clinic_LA_code_lower"],
+    ["LA_name_lower", "LA_name_lower_unedited", "Clinic_LA_name_lower"],
+    ["LA_parent_code"],
+    ["LA_parent_name"],
+    ["LSOA_code"],
+    ["IMD_decile"],
+    ["GP_code"],
+    ["Gender"],
+    ["Ethnicity"],
+    ["Age_group"],
+    ["Age_group_alt"],
+    ["Cross_boundary_lower", "Cross_boundary_upper"],
+    ["Outside_england", "InitialContact", "MainContact", "FirstContact"],
+    ["LocationType"],
+    ["ConsultationMedium"],
+    ["DateofAttendance"],
+    ["ReportingYear"],
+    ]
+
+
+def apply_dtypes(df, dtypes):
+    """
+    Converts the columns of a dataframe to the data types of a schema.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    dtypes : dict
+        Data type of each column (e.g. SRHAD_DTYPES). Columns that are not in
+        the dataframe are ignored.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    dtypes = {column: dtype for column, dtype in dtypes.items()
+              if column in df.columns}
+
+    return df.astype(dtypes)
+
+
+def concat_chunks(chunks):
+    """
+    Concatenates dataframe chunks (e.g. as read from a database) into a single
+    dataframe. The categories of each categorical column are combined across
+    all the chunks first, so that the column stays categorical (pd.concat
+    returns an object column where the categories differ).
+
+    Parameters
+    ----------
+    chunks : list[pandas.DataFrame]
+        Dataframes with the same columns and data types.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals(
+                [chunk[column] for chunk in chunks],
+                sort_categories=True).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def add_categories(df, columns, values):
+    """
+    Adds values to the categories of any categorical columns, so that the
+    values can be assigned to the columns. Columns of other types are
+    unchanged.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list[str]
+        Names of the columns the values will be assigned to.
+    values : list
+        Values to be assigned.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            categories = df[column].cat.categories
+            new_values = (pd.Index(pd.unique(pd.Series(values).dropna()))
+                          .difference(categories))
+            # The categories are kept in sorted order, so that sorting on the
+            # column gives the same order as sorting on its values
+            if len(new_values) > 0:
+                df[column] = df[column].cat.set_categories(
+                    categories.union(new_values))
+
+    return df
+
+
+def categories_to_values(df):
+    """
+    Converts any categorical columns of a dataframe back to columns of their
+    values. Used on aggregated data (which is small) so that the output
+    processing can add new row values such as totals and subgroups.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+
+    return df
+
+
+def apply_shared_categories(df, column_groups):
+    """
+    Converts columns of a dataframe to categoricals, with each group of columns
+    sharing the same (sorted) categories. Columns that are already categorical
+    keep their values, with their categories updated. Groups that include an
+    ordered categorical (e.g. the age groups) are left unchanged, so that the
+    order of their categories is kept.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    column_groups : list[list[str]]
+        Groups of columns that share categories (e.g. SRHAD_CATEGORY_GROUPS).
+        Columns that are not in the dataframe are ignored.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    for column_group in column_groups:
+        columns = [column for column in column_group if column in df.columns]
+        if not columns or any(getattr(df[column].dtype, "ordered", False)
+                              for column in columns):
+            continue
+
+        # Combine the distinct values of all the columns in the group, sorted
+        # (where the values can be) so that sorting on the columns gives the
+        # same order as sorting on their values
+        values = pd.concat([pd.Series(np.asarray(df[column].dropna().unique()))
+                            for column in columns])
+        categories = pd.Index(pd.unique(values))
+        try:
+            categories = categories.sort_values()
+        except TypeError:
+            pass
+
+        for column in columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].cat.set_categories(categories)
+            else:
+                df[column] = pd.Categorical(df[column], categories=categories)
+
+    return df
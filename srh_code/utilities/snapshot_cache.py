@@ -0,0 +1,165 @@
+"""
+Purpose of the script: contains the snapshot cache functions, which store the
+results of the sql imports as Parquet files so that pipeline reruns can read
+them back rather than re-querying the databases.
+"""
+import datetime
+import hashlib
+import json
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+import srh_code.parameters as param
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Name of the file (in the cache folder) that holds the details of each
+# snapshot. The lock prevents lost updates when imports run in several threads.
+MANIFEST_NAME = "manifest.json"
+_manifest_lock = threading.Lock()
+
+
+def snapshot_key(query, server, database, dtypes=None):
+    """
+    Creates the key of a snapshot, as a hash of the (fully substituted) sql
+    query, the server and database it is run against and the data types it is
+    converted to.
+
+    Parameters
+    ----------
+    query : str
+    server : str
+    database : str
+    dtypes : dict
+        Data types the columns are converted to (see df_from_sql).
+
+    Returns
+    -------
+    str
+    """
+    content = json.dumps([query, server, database, dtypes], sort_keys=True,
+                         default=str)
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def read_manifest(cache_dir):
+    """
+    Reads the snapshot manifest of a cache folder.
+
+    Parameters
+    ----------
+    cache_dir : path
+
+    Returns
+    -------
+    dict
+        Details of each snapshot (file name, server, database, row count and
+        the time it was created), by snapshot key.
+    """
+    manifest_file = cache_dir / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+
+    with open(manifest_file, "r") as file:
+        return json.load(file)
+
+
+def read_snapshot(key, cache_dir=None, ttl_hours=None, refresh=None):
+    """
+    Reads a snapshot from the cache, if one exists for the key and is still
+    valid. The Parquet file is read through a memory map.
+
+    Parameters
+    ----------
+    key : str
+        Snapshot key (see snapshot_key).
+    cache_dir : path
+        Defaults to SQL_CACHE_DIR as set in parameters.py.
+    ttl_hours : float
+        Age (in hours) after which a snapshot is no longer used. If None, then
+        snapshots do not expire. Defaults to SQL_CACHE_TTL_HOURS.
+    refresh : bool
+        If True, snapshots are not used (so the data is re-queried and the
+        snapshots replaced). Defaults to SQL_CACHE_REFRESH.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The snapshot data, or None if there is no valid snapshot.
+    """
+    if cache_dir is None:
+        cache_dir = param.SQL_CACHE_DIR
+    if ttl_hours is None:
+        ttl_hours = param.SQL_CACHE_TTL_HOURS
+    if refresh is None:
+        refresh = param.SQL_CACHE_REFRESH
+
+    if refresh:
+        return None
+
+    with _manifest_lock:
+        entry = read_manifest(cache_dir).get(key)
+    if entry is None or not (cache_dir / entry["file"]).exists():
+        return None
+
+    # Check that the snapshot has not expired
+    created = datetime.datetime.fromisoformat(entry["created"])
+    age = datetime.datetime.now() - created
+    if ttl_hours is not None and age > datetime.timedelta(hours=ttl_hours):
+        logger.info(f"Snapshot {entry['file']} has expired")
+        return None
+
+    logger.info(f"Reading snapshot {entry['file']} of {entry['database']} "
+                f"({entry['rows']} rows, created {entry['created']})")
+    table = pq.read_table(cache_dir / entry["file"], memory_map=True)
+
+    return table.to_pandas()
+
+
+def write_snapshot(key, df, server, database, cache_dir=None):
+    """
+    Writes a dataframe to the cache as a Parquet file and records it in the
+    manifest. Where the data can not be stored as Parquet (e.g. mixed type
+    columns), a warning is logged and no snapshot is written.
+
+    Parameters
+    ----------
+    key : str
+        Snapshot key (see snapshot_key).
+    df : pandas.DataFrame
+    server : str
+    database : str
+    cache_dir : path
+        Defaults to SQL_CACHE_DIR as set in parameters.py.
+
+    Returns
+    -------
+    None
+    """
+    if cache_dir is None:
+        cache_dir = param.SQL_CACHE_DIR
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    file_name = key + ".parquet"
+
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False),
+                       cache_dir / file_name)
+    except (pa.ArrowInvalid, pa.ArrowTypeError,
+            pa.ArrowNotImplementedError) as e:
+        logger.warning(f"Snapshot of {database} not written: {e}")
+        return
+
+    with _manifest_lock:
+        manifest = read_manifest(cache_dir)
+        manifest[key] = {"file": file_name,
+                         "server": server,
+                         "database": database,
+                         "rows": len(df),
+                         "created": datetime.datetime.now().isoformat()}
+        with open(cache_dir / MANIFEST_NAME, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    logger.info(f"Written snapshot {file_name} of {database} ({len(df)} rows)")
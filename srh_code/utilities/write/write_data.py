@@ -2,15 +2,16 @@
 Purpose of the script: contains the Excel automation script.
 """
 import pandas as pd
-import xlwings as xw
 import xlsxwriter
 from srh_code.utilities import helpers
-from srh_code.utilities.write import write_format
+from srh_code.utilities.write import write_format, write_openpyxl, write_session
 import srh_code.utilities.processing.processing_publication as processing
+import srh_code.parameters as param
 import logging
+import multiprocessing as mp
 
 
-def write_to_excel_static(df, output_path, sheetname, write_cell,
+def write_to_excel_static(df, wb, sheetname, write_cell,
                           include_row_labels=False, empty_cols=None):
     """
     Write data to an excel template. Assumes the table length remains constant.
@@ -18,8 +19,9 @@ def write_to_excel_static(df, output_path, sheetname, write_cell,
     Parameters
     ----------
     df : pandas.DataFrame
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     write_cell: str
@@ -48,16 +50,14 @@ def write_to_excel_static(df, output_path, sheetname, write_cell,
     if empty_cols is not None:
         df = write_format.insert_empty_columns(df, empty_cols, write_cell)
 
-    # Load the template and select the required table sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # write to the specified cell
     sht.range(write_cell).value = df.values
 
 
-def write_to_excel_variable(df, output_path, sheetname, write_cell,
+def write_to_excel_variable(df, wb, sheetname, write_cell,
                             include_row_labels=False, empty_cols=None):
     """
     Write data to an excel template. Can accommodate dataframes where the
@@ -67,8 +67,9 @@ def write_to_excel_variable(df, output_path, sheetname, write_cell,
     Parameters
     ----------
     df : pandas.DataFrame
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     write_cell: str
@@ -99,10 +100,8 @@ def write_to_excel_variable(df, output_path, sheetname, write_cell,
     if empty_cols is not None:
         df = write_format.insert_empty_columns(df, empty_cols, write_cell)
 
-    # Load the template and select the required table sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # Get Excel row number of write cell
     firstrownum = helpers.excel_cell_to_row_num(write_cell)
@@ -127,7 +126,7 @@ def write_to_excel_variable(df, output_path, sheetname, write_cell,
     sht.range(write_cell).value = df.values
 
 
-def write_to_excel_with_headers(df, output_path, sheetname, write_cell,
+def write_to_excel_with_headers(df, wb, sheetname, write_cell,
                                 header_cell, include_row_labels=False,
                                 empty_cols=None):
     """
@@ -138,8 +137,9 @@ def write_to_excel_with_headers(df, output_path, sheetname, write_cell,
     Parameters
     ----------
     df : pandas.DataFrame
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     write_cell: str
@@ -171,10 +171,8 @@ def write_to_excel_with_headers(df, output_path, sheetname, write_cell,
     if empty_cols is not None:
         df = write_format.insert_empty_columns(df, empty_cols, write_cell)
 
-    # Load the template and select the required table sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # Get first and last Excel column numbers of existing data
     firstcolnum = helpers.excel_cell_to_col_num(write_cell)
@@ -208,7 +206,7 @@ def write_to_excel_with_headers(df, output_path, sheetname, write_cell,
 
     # Apply the table specific re-formatting required for this type of table
     # (due to removal of labels / formats etc. during column deletion}
-    write_format.excel_table_specific_formatting(output_path, sheetname,
+    write_format.excel_table_specific_formatting(wb, sheetname,
                                                  write_cell)
 
 
@@ -239,7 +237,7 @@ def write_csv(df, output_path, output_name, index=True):
     df.to_csv(save_path, index=index)
 
 
-def select_write_type(df, write_type, output_path, output_name,
+def select_write_type(df, write_type, wb, output_name,
                       write_cell, header_cell=None, include_row_labels=False,
                       empty_cols=None):
     """
@@ -251,8 +249,9 @@ def select_write_type(df, write_type, output_path, output_name,
     df :pandas.DataFrame
     write_type: str
         Determines the method of writing the output.
-    output_path: Path
-        Path where output will be written. Full file path if writing to Excel
+    wb: dict
+        Workbook session (see write_session.open_workbook) where output will
+        be written. The session path is the full file path if writing to Excel
         or the folder path if writing to a csv.
     output_name: str
         Name of the worksheet to be written to (for Excel) or to be asssigned
@@ -283,24 +282,195 @@ def select_write_type(df, write_type, output_path, output_name,
                     "excel_with_headers"]
     helpers.validate_value_with_list("write_type", write_type, valid_values)
 
+    # Select the Excel write functions of the workbook session backend
+    if wb["backend"] == "openpyxl":
+        write_static = write_openpyxl.write_to_excel_static
+        write_variable = write_openpyxl.write_to_excel_variable
+        write_with_headers = write_openpyxl.write_to_excel_with_headers
+    else:
+        write_static = write_to_excel_static
+        write_variable = write_to_excel_variable
+        write_with_headers = write_to_excel_with_headers
+
     # Choose the write method based on write_type
     if write_type == "csv":
-        write_csv(df, output_path, output_name)
+        write_csv(df, wb["path"], output_name)
     elif write_type == "excel_variable":
-        write_to_excel_variable(df, output_path, output_name,
-                                write_cell, include_row_labels, empty_cols)
+        write_variable(df, wb, output_name,
+                       write_cell, include_row_labels, empty_cols)
     elif write_type == "excel_with_headers":
-        write_to_excel_with_headers(df, output_path, output_name, write_cell,
-                                    header_cell, include_row_labels, empty_cols)
+        write_with_headers(df, wb, output_name, write_cell,
+                           header_cell, include_row_labels, empty_cols)
     else:
-        write_to_excel_static(df, output_path, output_name,
-                              write_cell, include_row_labels, empty_cols)
+        write_static(df, wb, output_name,
+                     write_cell, include_row_labels, empty_cols)
+
+
+def compute_output(df, output):
+    """
+    Creates the dataframe for a single output, by running the function(s)
+    in the output dictionary item(s) beginning with 'contents'.
+
+    Parameters
+    ----------
+    df :pandas.DataFrame
+    output: dict
+        An item of the output_args list (see write_outputs).
+
+    Returns
+    -------
+    df_output : pandas.DataFrame
+    """
+    name = output["name"]
+
+    # Run the function(s) in the dictionary item(s) beginning with 'contents'.
+    # Where there are multiple functions in the contents for one output,
+    # the returned dataframes are concatenated. For unmatched columns null
+    # values will be created.
+    # Where there are multiple contents keys, the outputs will be concatenated
+    # along columns (same identical length is assumed on contents set up).
+    # List to store the different outputs to join
+    total_dfs = []
+    # Check the output dictionary for keys starting with contents
+    keys = list(output.keys())
+    content_keys = [key for key in keys if key.startswith("contents")]
+    for content_key in content_keys:
+        logging.info(f"Running {content_key} for {name}")
+        df_content = pd.concat([content(df) for content in output[content_key]])
+        total_dfs.append(df_content)
+
+    # Where there was more than one contents key then these are joined
+    # along columns (on index).
+    df_output = pd.concat(total_dfs, axis=1).fillna(0)
+
+    # Perform any final updates to the dataframe for specific outputs
+    df_output = processing.output_specific_updates(df_output, name)
+
+    return df_output
 
 
-def write_outputs(df, output_args, output_path, year):
+# Holds the source dataframe and output_args in each worker process of the
+# compute_outputs process pool (set by init_output_worker).
+_worker_df = None
+_worker_output_args = None
+
+
+def init_output_worker(df, output_args, reference_data, start_caches):
+    """
+    Initialises a worker process of the compute_outputs process pool.
+    Where processes are forked the arguments are inherited from the main
+    process without being copied, otherwise they are passed once per worker.
+
+    Parameters
+    ----------
+    df :pandas.DataFrame
+    output_args: list[dict]
+    reference_data: dict
+        The in-memory reference data of the main process.
+    start_caches: bool
+        If True then the filter cache and output cubes are started in the
+        worker (where they could not be inherited from the main process).
+
+    Returns
+    -------
+    None
+    """
+    global _worker_df, _worker_output_args
+
+    _worker_df = df
+    _worker_output_args = output_args
+
+    if start_caches:
+        processing.set_reference_data(reference_data)
+        processing.start_filter_cache(df)
+        if param.USE_OUTPUT_CUBES:
+            processing.start_output_cubes(df, output_args)
+
+
+def compute_output_worker(position):
+    """
+    Creates the dataframe for the output at the given position of the
+    output_args list in a compute_outputs worker process.
+
+    Parameters
+    ----------
+    position: int
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    return compute_output(_worker_df, _worker_output_args[position])
+
+
+def compute_outputs(df, output_args, processes=None, start_method=None):
+    """
+    Creates the dataframes for all the outputs in output_args. Where more than
+    one process is available the outputs are created concurrently in a process
+    pool. The source dataframe is shared with the workers by forking where
+    available (so it is not copied), otherwise it is passed once to each
+    worker.
+
+    Parameters
+    ----------
+    df :pandas.DataFrame
+    output_args: list[dict]
+        Provides all the required arguments needed to run each output.
+    processes: int
+        Number of worker processes. Defaults to param.OUTPUT_PROCESSES, and
+        where that is None, the number of available cores. Where the workers
+        are not forked, the default is capped at param.SPAWN_OUTPUT_PROCESSES.
+    start_method: str
+        How the worker processes are started, "fork" or "spawn". Defaults to
+        fork where available.
+
+    Returns
+    -------
+    list[pandas.DataFrame]
+        The output dataframes in the same order as output_args.
+    """
+    if start_method is None:
+        if "fork" in mp.get_all_start_methods():
+            start_method = "fork"
+        else:
+            start_method = "spawn"
+    use_fork = start_method == "fork"
+
+    if processes is None:
+        processes = param.OUTPUT_PROCESSES or mp.cpu_count()
+        # Each spawned worker holds its own copy of the source data
+        if not use_fork:
+            processes = min(processes, param.SPAWN_OUTPUT_PROCESSES)
+    processes = min(processes, len(output_args))
+
+    # Run in this process if there is nothing to gain from a pool
+    if processes <= 1:
+        return [compute_output(df, output) for output in output_args]
+
+    logging.info(f"Creating {len(output_args)} outputs in {processes} "
+                 f"{start_method} processes")
+
+    # Forked workers inherit the filter cache and output cubes, so build all
+    # the cubes now for them to share.
+    if use_fork:
+        processing.build_output_cubes(df)
+
+    context = mp.get_context(start_method)
+    initargs = (df, output_args, processing.get_reference_data(), not use_fork)
+    with context.Pool(processes, initializer=init_output_worker,
+                      initargs=initargs) as pool:
+        df_outputs = pool.map(compute_output_worker, range(len(output_args)),
+                              chunksize=1)
+
+    return df_outputs
+
+
+def write_outputs(df, output_args, wb, year):
     """
     Processes and writes the data for each function to the output location
     as defined by parameters taken from the output_args dictionary.
+    All the outputs are created first (see compute_outputs), and then written
+    in the order they appear in output_args.
 
     Parameters
     ----------
@@ -308,8 +478,9 @@ def write_outputs(df, output_args, output_path, year):
     output_args: list[dict]
         Provides all the required arguments needed to run and write each
         output.
-    output_path: Path
-        Path where output will be written. Full file path if writing to Excel
+    wb: dict
+        Workbook session (see write_session.open_workbook) where output will
+        be written. The session path is the full file path if writing to Excel
         or the folder path if writing to a csv.
     year: str
         The current reporting year value that will be used if required by the
@@ -321,8 +492,24 @@ def write_outputs(df, output_args, output_path, year):
     None
 
     """
-    # For each item in the output_args dictionary
-    for output in output_args:
+    # Activate the filter cache so that each filtered subset of the source
+    # data is computed once and shared by all the outputs
+    processing.start_filter_cache(df)
+
+    # Plan the output cubes, so that outputs sharing the same filters are
+    # aggregated from a single group-by of the source data
+    if param.USE_OUTPUT_CUBES:
+        processing.start_output_cubes(df, output_args)
+
+    # Create all the outputs
+    df_outputs = compute_outputs(df, output_args)
+
+    # Log the filter cache and output cube usage and release the stored data
+    processing.end_output_cubes()
+    processing.end_filter_cache()
+
+    # For each item in the output_args dictionary, write the output
+    for output, df_output in zip(output_args, df_outputs):
         # Extract all the required arguments from the output_args dictionary
         # Some arguments are not needed if the write_type is csv
         name = output["name"]
@@ -347,38 +534,20 @@ def write_outputs(df, output_args, output_path, year):
             else:
                 header_cell = None
 
-        # Run the function(s) in the dictionary item(s) beginning with 'contents'.
-        # Where there are multiple functions in the contents for one output,
-        # the returned dataframes are concatenated. For unmatched columns null
-        # values will be created.
-        # Where there are multiple contents keys, the outputs will be concatenated
-        # along columns (same identical length is assumed on contents set up).
-        # List to store the different outputs to join
-        total_dfs = []
-        # Check the output dictionary for keys starting with contents
-        keys = list(output.keys())
-        content_keys = [key for key in keys if key.startswith("contents")]
-        for content_key in content_keys:
-            logging.info(f"Running {content_key} for {name}")
-            df_content = pd.concat([content(df) for content in output[content_key]])
-            total_dfs.append(df_content)
-
-        # Where there was more than one contents key then these are joined
-        # along columns (on index).
-        df_output = pd.concat(total_dfs, axis=1).fillna(0)
-
-        # Perform any final updates to the dataframe for specific outputs
-        df_output = processing.output_specific_updates(df_output, name)
-
         # If a table outout contains fixed length time series data (year_check_cell
         # will be populated) then check if the time series in Excel needs preparing
         # (moving along one year).
         if year_check_cell is not None:
-            write_format.check_latest_year(output_path, name,
-                                           year_check_cell, year,
-                                           years_as_rows)
+            if wb["backend"] == "openpyxl":
+                write_openpyxl.check_latest_year(wb, name,
+                                                 year_check_cell, year,
+                                                 years_as_rows)
+            else:
+                write_format.check_latest_year(wb, name,
+                                               year_check_cell, year,
+                                               years_as_rows)
 
         # Write the output as per the selected write type
-        select_write_type(df_output, write_type, output_path,
+        select_write_type(df_output, write_type, wb,
                           name, write_cell, header_cell,
                           include_row_labels, empty_cols)
@@ -2,13 +2,13 @@
 Purpose of the script: contains the Excel automation script.
 """
 import pandas as pd
-import xlwings as xw
 import xlsxwriter
 from srh_code.utilities import helpers
+from srh_code.utilities.write import write_session
 import logging
 
 
-def check_latest_year(output_path, sheetname,
+def check_latest_year(wb, sheetname,
                       year_check_cell, year,
                       years_as_rows=True):
     '''
@@ -21,8 +21,9 @@ def check_latest_year(output_path, sheetname,
 
     Parameters
     ----------
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     year_check_cell: str
@@ -39,10 +40,8 @@ def check_latest_year(output_path, sheetname,
     -------
     None
     '''
-    # Select the active workbook and sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # Check the year value in the year_check_cell (which should correspond with
     # the latest year that exists in the data table.
@@ -52,16 +51,16 @@ def check_latest_year(output_path, sheetname,
     # then the time series range will be moved back one column or row in Excel.
     if year != latest_year:
         if years_as_rows is True:
-            adjust_timeseries_rows(output_path, sheetname,
+            adjust_timeseries_rows(wb, sheetname,
                                    year_check_cell, year)
         else:
-            adjust_timeseries_columns(output_path, sheetname,
+            adjust_timeseries_columns(wb, sheetname,
                                       year_check_cell, year)
 
     return None
 
 
-def adjust_timeseries_rows(output_path, sheetname, end_year_cell, year,
+def adjust_timeseries_rows(wb, sheetname, end_year_cell, year,
                            ts_length=11, tag_end_col="mark_last_col"):
     '''
     For tables with fixed length time series data in rows, moves the range of
@@ -74,8 +73,9 @@ def adjust_timeseries_rows(output_path, sheetname, end_year_cell, year,
 
     Parameters
     ----------
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     end_year_cell: str
@@ -94,10 +94,8 @@ def adjust_timeseries_rows(output_path, sheetname, end_year_cell, year,
     -------
     None
     '''
-    # Select the active workbook and sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # The time series range start row and range end column of the Excel
     #  range to be moved can be derived based on the year check cell.
@@ -106,35 +104,35 @@ def adjust_timeseries_rows(output_path, sheetname, end_year_cell, year,
     ts_start_col = helpers.excel_cell_to_col_num(end_year_cell)
 
     # Using the markers that should be present in the Excel file, determine
-    # the range end row
+    # the range end column. The cells that may hold the marker (the row below
+    # the time series, up to column 19) are read in a single call.
     ts_end_col = ts_start_col
-    for col in range(ts_start_col, 20):
-        if sht.range(ts_end_row + 1, col).value == tag_end_col:
-            ts_end_col = col
-            break
+    marker_cells = (sht.range((ts_end_row + 1, ts_start_col), (ts_end_row + 1, 19))
+                    .options(ndim=1).value)
+    if tag_end_col in marker_cells:
+        ts_end_col = ts_start_col + marker_cells.index(tag_end_col)
 
     # The start row used for the copy range is moved down one at this step
     # as the first time series row should be excluded from the copy range.
     ts_start_row_adj = ts_start_row + 1
 
-    # Convert column numbers back to column letters for copy and paste step
+    # Convert column numbers back to column letters for the copy step
     ts_start_col = xlsxwriter.utility.xl_col_to_name(ts_start_col - 1)
     ts_end_col = xlsxwriter.utility.xl_col_to_name(ts_end_col - 1)
 
-    # Select the Excel range to copy, and copy it to the clipboard
+    # Select the Excel range to copy and the paste location
     copy_range = (str(ts_start_col)
                   + str(ts_start_row_adj)
                   + ":"
                   + str(ts_end_col)
                   + str(ts_end_row))
 
-    sht.range(copy_range).copy()
-
-    # Select Excel the paste location and paste the copied data
     paste_cell = (str(ts_start_col)
                   + str(ts_start_row))
 
-    sht.range(paste_cell).paste()
+    # Copy the range directly to the paste location (as a copy and paste,
+    # including formats and adjusted formulas) without using the clipboard
+    sht.range(copy_range).copy(destination=sht.range(paste_cell))
 
     # Update the end year label with the current reporting year
     sht.range(end_year_cell).value = year
@@ -142,7 +140,7 @@ def adjust_timeseries_rows(output_path, sheetname, end_year_cell, year,
     return None
 
 
-def adjust_timeseries_columns(output_path, sheetname, end_year_cell, year,
+def adjust_timeseries_columns(wb, sheetname, end_year_cell, year,
                               ts_length=11, tag_end_row="mark_last_row"):
     '''
     For tables with fixed length time series data in columns, moves the range of
@@ -155,8 +153,9 @@ def adjust_timeseries_columns(output_path, sheetname, end_year_cell, year,
 
     Parameters
     ----------
-    output_path : path
-        Filepath of the Excel file that the data will be written to.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        that the data will be written to.
     sheetname : str
         Name of the destination Excel worksheet.
     end_year_cell: str
@@ -175,10 +174,8 @@ def adjust_timeseries_columns(output_path, sheetname, end_year_cell, year,
     -------
     None
     '''
-    # Select the active workbook and sheet
-    wb = xw.Book(output_path)
-    sht = wb.sheets[sheetname]
-    sht.select()
+    # Select the required sheet from the workbook session
+    sht = write_session.get_sheet(wb, sheetname)
 
     # The time series range start row and range end column of the Excel
     # range to be moved can be derived based on the year check cell.
@@ -187,36 +184,36 @@ def adjust_timeseries_columns(output_path, sheetname, end_year_cell, year,
     ts_start_row = helpers.excel_cell_to_row_num(end_year_cell)
 
     # Using the markers that should be present in the Excel file, determine
-    # the range end row
+    # the range end row. The cells that may hold the marker (the column to the
+    # right of the time series, up to row 499) are read in a single call.
     ts_end_row = ts_start_row
-    for row in range(ts_start_row, 500):
-        if sht.range(row, ts_end_col + 1).value == tag_end_row:
-            ts_end_row = row
-            break
+    marker_cells = (sht.range((ts_start_row, ts_end_col + 1), (499, ts_end_col + 1))
+                    .options(ndim=1).value)
+    if tag_end_row in marker_cells:
+        ts_end_row = ts_start_row + marker_cells.index(tag_end_row)
 
     # The start column used for the copy range is moved along one at this step
     # as the first time series column should be excluded from the copy range.
     ts_start_col_adj = ts_start_col + 1
 
-    # Convert column numbers back to column letters for copy and paste step
+    # Convert column numbers back to column letters for the copy step
     ts_start_col = xlsxwriter.utility.xl_col_to_name(ts_start_col - 1)
     ts_start_col_adj = xlsxwriter.utility.xl_col_to_name(ts_start_col_adj - 1)
     ts_end_col = xlsxwriter.utility.xl_col_to_name(ts_end_col - 1)
 
-    # Select the Excel range to copy, and copy it to the clipboard
+    # Select the Excel range to copy and the paste location
     copy_range = (str(ts_start_col_adj)
                   + str(ts_start_row)
                   + ":"
                   + str(ts_end_col)
                   + str(ts_end_row))
 
-    sht.range(copy_range).copy()
-
-    # Select Excel the paste location and paste the copied data
     paste_cell = (str(ts_start_col)
                   + str(ts_start_row))
 
-    sht.range(paste_cell).paste()
+    # Copy the range directly to the paste location (as a copy and paste,
+    # including formats and adjusted formulas) without using the clipboard
+    sht.range(copy_range).copy(destination=sht.range(paste_cell))
 
     # Update the end year label with the current reporting year
     sht.range(end_year_cell).value = year
@@ -259,15 +256,16 @@ def insert_empty_columns(df, empty_cols, write_cell):
     return df
 
 
-def excel_table_specific_formatting(output_path, sheetname, write_cell):
+def excel_table_specific_formatting(wb, sheetname, write_cell):
     """
     Applies table specific Excel formatting required after data has been
     been written using the excel_with_headers function.
 
     Parameters
     ----------
-    output_path : path
-        Filepath of the Excel file to be formatted.
+    wb : dict
+        Workbook session (see write_session.open_workbook) of the Excel file
+        to be formatted.
     sheetname : str
         Name of the Excel worksheet to be formatted.
     write_cell: str
@@ -283,10 +281,8 @@ def excel_table_specific_formatting(output_path, sheetname, write_cell):
     # Apply formatting updates for table 20a and 20b
     if sheetname in ["Table 20a", "Table 20b", "Table 20c"]:
 
-        # Load the template and select the required table sheet
-        wb = xw.Book(output_path)
-        sht = wb.sheets[sheetname]
-        sht.select()
+        # Select the required sheet from the workbook session
+        sht = write_session.get_sheet(wb, sheetname)
 
         # Get first and last Excel column numbers of pasted data
         firstcol = helpers.excel_cell_to_col_num(write_cell)
@@ -0,0 +1,550 @@
+"""
+Purpose of the script: contains the headless (openpyxl) Excel write functions.
+These mirror the xlwings based functions in write_data and write_format, but
+do not require Excel to be installed. They are used for workbook sessions
+with the openpyxl backend (see write_session), so each template is loaded
+once, all the outputs are applied to it in memory, and it is saved once.
+
+Note that openpyxl does not fully retain chart and image formatting when
+saving a workbook, and does not update formulas that refer to cells moved by
+row or column insertion / deletion.
+"""
+from copy import copy
+import numpy as np
+from openpyxl.formula.translate import Translator
+from openpyxl.styles import Side
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+from srh_code.utilities import helpers
+from srh_code.utilities.write import write_format, write_session
+import logging
+
+
+def range_end(sht, row, col, direction):
+    """
+    Finds the last cell of a range in the same way as Excel's End function
+    (Ctrl + arrow key) from a starting cell, moving down or right.
+    Where the starting cell and the next cell contain values, this is the last
+    cell before an empty cell, otherwise it is the next cell with a value.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    row : int
+        Row number of the starting cell.
+    col : int
+        Column number of the starting cell.
+    direction : str
+        "down" or "right"
+
+    Returns
+    -------
+    int
+        Row number (if direction is down) or column number (if direction is
+        right) of the last cell.
+    """
+    if direction == "down":
+        position, limit = row, sht.max_row
+
+        def has_value(pos):
+            return sht.cell(pos, col).value not in (None, "")
+    else:
+        position, limit = col, sht.max_column
+
+        def has_value(pos):
+            return sht.cell(row, pos).value not in (None, "")
+
+    if has_value(position) and has_value(position + 1):
+        # Move to the last cell of the block of cells with values
+        while position < limit and has_value(position + 1):
+            position += 1
+    else:
+        # Move to the next cell with a value (or the end of the used range)
+        position += 1
+        while position < limit and not has_value(position):
+            position += 1
+
+    return position
+
+
+def write_values(sht, row, col, values):
+    """
+    Writes a 2-D array of values to a worksheet, with the top left value in
+    the given cell. Nulls are written as empty cells.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    row : int
+        Row number of the top left cell.
+    col : int
+        Column number of the top left cell.
+    values : np.ndarray
+
+    Returns
+    -------
+    None
+    """
+    for row_n, row_values in enumerate(values, start=row):
+        for col_n, value in enumerate(row_values, start=col):
+            if isinstance(value, (float, np.floating)) and np.isnan(value):
+                value = None
+            sht.cell(row_n, col_n).value = value
+
+
+def shift_rows(sht, idx, amount):
+    """
+    Inserts (positive amount) or deletes (negative amount) rows at a row
+    position, moving the row heights and merged cells below along with the
+    cell content. Inserted rows take the format of the row above.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    idx : int
+        Row number at which rows are inserted or deleted.
+    amount : int
+        Number of rows to insert (if positive) or delete (if negative).
+
+    Returns
+    -------
+    None
+    """
+    if amount == 0:
+        return
+
+    # Remove the row dimensions (heights etc.) and merged cells that will be
+    # moved
+    dims = {row: sht.row_dimensions.pop(row)
+            for row in list(sht.row_dimensions) if row >= idx}
+    merged = [CellRange(str(cell_range)) for cell_range in sht.merged_cells.ranges
+              if cell_range.min_row >= idx]
+    for cell_range in merged:
+        sht.unmerge_cells(cell_range.coord)
+
+    if amount > 0:
+        sht.insert_rows(idx, amount)
+        # Apply the format of the row above to the inserted rows
+        for row in range(idx, idx + amount):
+            for col in range(1, sht.max_column + 1):
+                source = sht.cell(idx - 1, col)
+                if source.has_style:
+                    sht.cell(row, col)._style = copy(source._style)
+    else:
+        sht.delete_rows(idx, -amount)
+
+    # Add back the row dimensions and merged cells in their new positions
+    # (those of any deleted rows are dropped)
+    for row, dim in dims.items():
+        if row + amount >= idx:
+            dim.index = row + amount
+            sht.row_dimensions[row + amount] = dim
+    for cell_range in merged:
+        if cell_range.min_row + amount >= idx:
+            cell_range.shift(row_shift=amount)
+            sht.merge_cells(cell_range.coord)
+
+
+def shift_columns(sht, idx, amount):
+    """
+    Inserts (positive amount) or deletes (negative amount) columns at a column
+    position, moving the column widths and merged cells to the right along with
+    the cell content. Inserted columns take the format of the column to the
+    left.
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    idx : int
+        Column number at which columns are inserted or deleted.
+    amount : int
+        Number of columns to insert (if positive) or delete (if negative).
+
+    Returns
+    -------
+    None
+    """
+    if amount == 0:
+        return
+
+    # Remove the column dimensions (widths etc.) and merged cells that will be
+    # moved
+    dims = {column_index_from_string(letter): sht.column_dimensions.pop(letter)
+            for letter in list(sht.column_dimensions)
+            if column_index_from_string(letter) >= idx}
+    merged = [CellRange(str(cell_range)) for cell_range in sht.merged_cells.ranges
+              if cell_range.min_col >= idx]
+    for cell_range in merged:
+        sht.unmerge_cells(cell_range.coord)
+
+    if amount > 0:
+        sht.insert_cols(idx, amount)
+        # Apply the format of the column to the left to the inserted columns
+        for col in range(idx, idx + amount):
+            for row in range(1, sht.max_row + 1):
+                source = sht.cell(row, idx - 1)
+                if source.has_style:
+                    sht.cell(row, col)._style = copy(source._style)
+    else:
+        sht.delete_cols(idx, -amount)
+
+    # Add back the column dimensions and merged cells in their new positions
+    # (those of any deleted columns are dropped), and apply the width of the
+    # column to the left to any inserted columns
+    for col, dim in dims.items():
+        if col + amount >= idx:
+            dim.index = get_column_letter(col + amount)
+            dim.min = dim.max = col + amount
+            sht.column_dimensions[dim.index] = dim
+    if amount > 0:
+        left_width = sht.column_dimensions[get_column_letter(idx - 1)].width
+        for col in range(idx, idx + amount):
+            sht.column_dimensions[get_column_letter(col)].width = left_width
+    for cell_range in merged:
+        if cell_range.min_col + amount >= idx:
+            cell_range.shift(col_shift=amount)
+            sht.merge_cells(cell_range.coord)
+
+
+def copy_cells(sht, min_row, min_col, max_row, max_col, row_shift, col_shift):
+    """
+    Copies the values and formats of a range of cells to a position shifted
+    up or left by the given number of rows / columns, in the same way as an
+    Excel copy and paste (relative formula references are adjusted).
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    min_row, min_col, max_row, max_col : int
+        The range of cells to be copied.
+    row_shift, col_shift : int
+        Number of rows / columns the range is moved by (zero or negative).
+
+    Returns
+    -------
+    None
+    """
+    # Cells are copied from the top left, so that each cell is read before
+    # it is overwritten
+    for row in range(min_row, max_row + 1):
+        for col in range(min_col, max_col + 1):
+            source = sht.cell(row, col)
+            target = sht.cell(row + row_shift, col + col_shift)
+            value = source.value
+            if isinstance(value, str) and value.startswith("="):
+                value = Translator(value, origin=source.coordinate).translate_formula(
+                    target.coordinate)
+            target.value = value
+            target._style = copy(source._style)
+
+
+def prepare_output(df, write_cell, include_row_labels, empty_cols):
+    """
+    Prepares a dataframe for writing, adding the row labels and empty columns
+    where required.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    write_cell: str
+        Cell location where the data will be written (top left of data).
+    include_row_labels: bool
+        Determines if the row labels will be written.
+    empty_cols: list[str]
+        A list of letters representing any empty (section seperator) excel
+        columns in the worksheet.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    # If row labels are required then reset the index so that they are included
+    # when writing values (assumes index contains row labels)
+    if include_row_labels:
+        df.reset_index(inplace=True)
+
+    # Add empty columns where present in target Excel worksheet
+    if empty_cols is not None:
+        df = write_format.insert_empty_columns(df, empty_cols, write_cell)
+
+    return df
+
+
+def write_to_excel_static(df, wb, sheetname, write_cell,
+                          include_row_labels=False, empty_cols=None):
+    """
+    Write data to an excel template. Assumes the table length remains constant.
+    See write_data.write_to_excel_static for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    logging.info("Writing data to specified output file")
+
+    df = prepare_output(df, write_cell, include_row_labels, empty_cols)
+
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # write to the specified cell
+    write_values(sht, helpers.excel_cell_to_row_num(write_cell),
+                 helpers.excel_cell_to_col_num(write_cell), df.values)
+
+
+def write_to_excel_variable(df, wb, sheetname, write_cell,
+                            include_row_labels=False, empty_cols=None):
+    """
+    Write data to an excel template. Can accommodate dataframes where the
+    number of rows may change e.g. LA data where the number of LAs may change
+    each year.
+    See write_data.write_to_excel_variable for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    logging.info("Writing data to specified output file")
+
+    df = prepare_output(df, write_cell, include_row_labels, empty_cols)
+
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # Get Excel row and column number of write cell
+    firstrownum = helpers.excel_cell_to_row_num(write_cell)
+    firstcolnum = helpers.excel_cell_to_col_num(write_cell)
+
+    # Get Excel row number of last row of existing data
+    lastrownum_current = range_end(sht, firstrownum, firstcolnum, "down")
+
+    # Add or remove rows at the end of the existing data so that the number
+    # of rows matches the dataframe (this leaves the same rows as deleting
+    # the existing rows and inserting a new set).
+    current_rowcount = lastrownum_current - firstrownum + 1
+    if len(df) > current_rowcount:
+        shift_rows(sht, lastrownum_current + 1, len(df) - current_rowcount)
+    elif len(df) < current_rowcount:
+        shift_rows(sht, firstrownum + len(df), len(df) - current_rowcount)
+
+    # Write dataframe to the Excel sheet starting at the write_cell reference
+    write_values(sht, firstrownum, firstcolnum, df.values)
+
+
+def write_to_excel_with_headers(df, wb, sheetname, write_cell,
+                                header_cell, include_row_labels=False,
+                                empty_cols=None):
+    """
+    Write data to an excel template including dataframe column headers, where
+    the number of columns is variable.
+    Assumes the table length remains constant.
+    See write_data.write_to_excel_with_headers for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    logging.info("Writing data to specified output file")
+
+    df = prepare_output(df, write_cell, include_row_labels, empty_cols)
+
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # Get first and last Excel column numbers of existing data
+    firstrownum = helpers.excel_cell_to_row_num(write_cell)
+    firstcolnum = helpers.excel_cell_to_col_num(write_cell)
+    lastcolnum = range_end(sht, firstrownum, firstcolnum, "right")
+
+    # Add or remove columns at the end of the existing data so that the number
+    # of columns matches the dataframe (this leaves the same columns as
+    # deleting the existing columns and inserting a new set).
+    current_colcount = lastcolnum - firstcolnum + 1
+    df_colcount = len(df.columns)
+    if df_colcount > current_colcount:
+        shift_columns(sht, lastcolnum + 1, df_colcount - current_colcount)
+    elif df_colcount < current_colcount:
+        shift_columns(sht, firstcolnum + df_colcount,
+                      df_colcount - current_colcount)
+
+    # Write the headers into the header write cell
+    write_values(sht, helpers.excel_cell_to_row_num(header_cell),
+                 helpers.excel_cell_to_col_num(header_cell),
+                 [df.columns.values])
+
+    # Write the dataframe values into the write cell
+    write_values(sht, firstrownum, firstcolnum, df.values)
+
+    # Apply the table specific re-formatting required for this type of table
+    excel_table_specific_formatting(wb, sheetname, write_cell)
+
+
+def check_latest_year(wb, sheetname, year_check_cell, year,
+                      years_as_rows=True):
+    """
+    For tables with fixed length time series data, checks if the time series
+    needs moving along one year, and if so moves it.
+    See write_format.check_latest_year for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # Check the year value in the year_check_cell (which should correspond with
+    # the latest year that exists in the data table.
+    latest_year = sht[year_check_cell].value
+
+    # If the latest year in the table does not match the latest reporting year,
+    # then the time series range will be moved back one column or row.
+    if year != latest_year:
+        if years_as_rows is True:
+            adjust_timeseries_rows(wb, sheetname,
+                                   year_check_cell, year)
+        else:
+            adjust_timeseries_columns(wb, sheetname,
+                                      year_check_cell, year)
+
+
+def adjust_timeseries_rows(wb, sheetname, end_year_cell, year,
+                           ts_length=11, tag_end_col="mark_last_col"):
+    """
+    For tables with fixed length time series data in rows, moves the range of
+    cell content up one row (overwriting data in the topmost row).
+    See write_format.adjust_timeseries_rows for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # The time series range start row and range start column can be derived
+    # based on the year check cell.
+    ts_end_row = helpers.excel_cell_to_row_num(end_year_cell)
+    ts_start_row = ts_end_row - ts_length + 1
+    ts_start_col = helpers.excel_cell_to_col_num(end_year_cell)
+
+    # Using the markers that should be present in the Excel file, determine
+    # the range end column
+    ts_end_col = ts_start_col
+    for col in range(ts_start_col, 20):
+        if sht.cell(ts_end_row + 1, col).value == tag_end_col:
+            ts_end_col = col
+            break
+
+    # Copy the range (excluding the first time series row) up one row
+    copy_cells(sht, ts_start_row + 1, ts_start_col, ts_end_row, ts_end_col,
+               -1, 0)
+
+    # Update the end year label with the current reporting year
+    sht[end_year_cell].value = year
+
+
+def adjust_timeseries_columns(wb, sheetname, end_year_cell, year,
+                              ts_length=11, tag_end_row="mark_last_row"):
+    """
+    For tables with fixed length time series data in columns, moves the range
+    of cell content one column left (overwriting data in the leftmost column).
+    See write_format.adjust_timeseries_columns for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    sht = write_session.get_sheet(wb, sheetname)
+
+    # The time series range start column and range start row can be derived
+    # based on the year check cell.
+    ts_end_col = helpers.excel_cell_to_col_num(end_year_cell)
+    ts_start_col = ts_end_col - ts_length + 1
+    ts_start_row = helpers.excel_cell_to_row_num(end_year_cell)
+
+    # Using the markers that should be present in the Excel file, determine
+    # the range end row
+    ts_end_row = ts_start_row
+    for row in range(ts_start_row, 500):
+        if sht.cell(row, ts_end_col + 1).value == tag_end_row:
+            ts_end_row = row
+            break
+
+    # Copy the range (excluding the first time series column) left one column
+    copy_cells(sht, ts_start_row, ts_start_col + 1, ts_end_row, ts_end_col,
+               0, -1)
+
+    # Update the end year label with the current reporting year
+    sht[end_year_cell].value = year
+
+
+def set_edge_border(sht, min_row, min_col, max_row, max_col, edge):
+    """
+    Applies a thin continuous border to the top or bottom edge of a range of
+    cells (as Excel's Borders(8) / Borders(9) with a weight of 2).
+
+    Parameters
+    ----------
+    sht : openpyxl.worksheet.worksheet.Worksheet
+    min_row, min_col, max_row, max_col : int
+        The range of cells.
+    edge : str
+        "top" or "bottom"
+
+    Returns
+    -------
+    None
+    """
+    row = min_row if edge == "top" else max_row
+    for col in range(min_col, max_col + 1):
+        cell = sht.cell(row, col)
+        border = copy(cell.border)
+        setattr(border, edge, Side(style="thin"))
+        cell.border = border
+
+
+def excel_table_specific_formatting(wb, sheetname, write_cell):
+    """
+    Applies table specific Excel formatting required after data has been
+    been written using the excel_with_headers function.
+    See write_format.excel_table_specific_formatting for the parameters.
+
+    Returns
+    -------
+    None
+    """
+    logging.info("Checking for and applying any required Excel formatting updates")
+
+    # Apply formatting updates for table 20a and 20b
+    if sheetname in ["Table 20a", "Table 20b", "Table 20c"]:
+
+        sht = write_session.get_sheet(wb, sheetname)
+
+        # Get first and last Excel column numbers of written data
+        firstrow = helpers.excel_cell_to_row_num(write_cell)
+        firstcol = helpers.excel_cell_to_col_num(write_cell)
+        lastcol = range_end(sht, firstrow, firstcol, "right")
+        # Get the row number for the table end (cell below last row of data)
+        lastrow = range_end(sht, firstrow, firstcol, "down") + 1
+
+        # Apply the top row borders
+        set_edge_border(sht, 5, firstcol, 5, lastcol, "top")
+        set_edge_border(sht, 5, firstcol, 5, lastcol, "bottom")
+
+        # Apply the header border
+        set_edge_border(sht, 5, firstcol, 7, lastcol, "top")
+        set_edge_border(sht, 5, firstcol, 7, lastcol, "bottom")
+
+        # Apply the bottom border
+        set_edge_border(sht, lastrow, firstcol, lastrow, lastcol, "bottom")
+
+        # Apply the header label
+        sht.cell(5, firstcol).value = "Contacts by Local Authority of patient residence (thousands)"
+
+        if sheetname in ["Table 20a", "Table 20b"]:
+            # Apply the numbers / percents label
+            sht.cell(4, lastcol - 2).value = "Thousands /"
+            sht.cell(4, lastcol).value = "percentages"
+            font = copy(sht.cell(4, lastcol).font)
+            font.italic = True
+            sht.cell(4, lastcol).font = font
+
+        if sheetname == "Table 20c":
+            # Apply the numbers label
+            sht.cell(4, lastcol).value = "Thousands"
@@ -0,0 +1,121 @@
+"""
+Purpose of the script: contains the workbook session functions, which allow
+an Excel template to be opened once, written to by all the write and format
+functions, and saved once.
+"""
+import openpyxl
+import xlwings as xw
+import srh_code.parameters as param
+import logging
+
+
+def open_workbook(output_path, backend=None):
+    """
+    Creates a workbook session for an Excel file. The file itself is opened
+    when first needed by a write or format function, so a session can also be
+    used for outputs written to csv files (where output_path is the folder
+    the files will be written to).
+
+    Parameters
+    ----------
+    output_path : path
+        Filepath of the Excel file (or the folder path for csv outputs).
+    backend : str
+        The Excel write backend, "xlwings" or "openpyxl". Defaults to the
+        EXCEL_WRITE_BACKEND set in parameters.py.
+
+    Returns
+    -------
+    wb : dict
+        The workbook session, holding the backend, file path, workbook (once
+        opened) and the handles of the worksheets used.
+    """
+    if backend is None:
+        backend = param.EXCEL_WRITE_BACKEND
+
+    return {"backend": backend,
+            "path": output_path,
+            "book": None,
+            "sheets": {}}
+
+
+def get_book(wb):
+    """
+    Returns the workbook of a workbook session, opening it if this has not
+    already been done.
+
+    Parameters
+    ----------
+    wb : dict
+        The workbook session (see open_workbook).
+
+    Returns
+    -------
+    xlwings.Book or openpyxl.Workbook
+    """
+    if wb["book"] is None:
+        logging.info(f"Opening workbook {wb['path']}")
+        if wb["backend"] == "openpyxl":
+            wb["book"] = openpyxl.load_workbook(wb["path"])
+        else:
+            wb["book"] = xw.Book(wb["path"])
+
+    return wb["book"]
+
+
+def get_sheet(wb, sheetname):
+    """
+    Returns a worksheet of a workbook session. The worksheet handle is stored
+    in the session, so each worksheet is only looked up (and selected, for
+    xlwings) once.
+
+    Parameters
+    ----------
+    wb : dict
+        The workbook session (see open_workbook).
+    sheetname : str
+        Name of the Excel worksheet.
+
+    Returns
+    -------
+    xlwings.Sheet or openpyxl.worksheet.worksheet.Worksheet
+    """
+    if sheetname not in wb["sheets"]:
+        book = get_book(wb)
+        if wb["backend"] == "openpyxl":
+            sht = book[sheetname]
+        else:
+            sht = book.sheets[sheetname]
+            sht.select()
+        wb["sheets"][sheetname] = sht
+
+    return wb["sheets"][sheetname]
+
+
+def save_workbook(wb):
+    """
+    Saves the workbook of a workbook session (if it was opened) and closes
+    it. For xlwings, Excel is then closed.
+
+    Parameters
+    ----------
+    wb : dict
+        The workbook session (see open_workbook).
+
+    Returns
+    -------
+    None
+    """
+    if wb["book"] is None:
+        return
+
+    logging.info(f"Saving workbook {wb['path']}")
+
+    if wb["backend"] == "openpyxl":
+        wb["book"].save(wb["path"])
+    else:
+        wb["book"].save()
+        xw.apps.active.api.Quit()
+
+    wb["book"] = None
+    wb["sheets"] = {}
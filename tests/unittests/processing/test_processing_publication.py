@@ -1,7 +1,9 @@
 import pandas as pd
+import pytest
 import numpy as np
 import srh_code.utilities.processing.processing_publication as processing
 from srh_code.utilities import helpers
+import srh_code.parameters as param
 
 
 def test_check_for_sort_on():
@@ -161,6 +163,42 @@ def test_df_counts_to_percents_columns():
                                   check_exact=False, rtol=1e-1)
 
 
+def test_df_counts_to_percents_row_order():
+    """
+    Tests the df_counts_to_percents function keeps the order of the rows,
+    with zero and low denominator rows marked as not applicable and not shown,
+    and null (suppressed) denominators remaining nulls.
+    """
+
+    input_df = pd.DataFrame(
+        {
+            "Age_group": ["16-17", "18-19", "20-24", "25-34", "Grand_total"],
+            "LARC": [0, 200, 5, np.nan, 1500],
+            "User_dependent": [0, 300, 10, 5, 3000],
+            "Grand_total": [0, 500, 15, np.nan, 4500],
+            }
+        )
+
+    expected = pd.DataFrame(
+        {
+            "Age_group": ["16-17", "18-19", "20-24", "25-34", "Grand_total"],
+            "LARC": ["z", 40.0, "#", np.nan, 100 / 3],
+            "User_dependent": ["z", 60.0, "#", np.nan, 200 / 3],
+            "Grand_total": ["z", 100.0, "#", np.nan, 100.0],
+            }
+        )
+
+    actual = processing.df_counts_to_percents(
+        input_df,
+        rows=["Age_group"],
+        percent_across_columns=True,
+        disclosure_control=False,
+        denominator="Grand_total",
+        )
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 def test_select_org_ref_data():
     """
     Tests the select_org_ref_data function, which selects content from the
@@ -207,6 +245,53 @@ def test_select_org_ref_data():
                                   expected.reset_index(drop=True))
 
 
+@pytest.mark.parametrize(
+    "rows, columns, row_subgroup, column_subgroup",
+    [
+        (["Age_group"], None, None, None),
+        (["Gender", "Age_group"], None,
+         {"Age_group": {"16-19": ["16-17", "18-19"]}}, None),
+        (["Age_group"], "ContraceptiveMainMethod",
+         {"Age_group": {"16-19": ["16-17", "18-19"]}}, None),
+        (["ContraceptiveMainMethod"], "Age_group", None,
+         {"16-19": ["16-17", "18-19"]}),
+    ])
+def test_crosstab_counts(rows, columns, row_subgroup, column_subgroup):
+    """
+    Tests the crosstab_counts function gives the same crosstab as pivoting
+    the data with pd.pivot_table (with margins) and adding the subgroups with
+    helpers.add_subgroup_rows and helpers.add_subgroup_columns.
+    """
+    input_df = pd.DataFrame(
+        {
+            "Gender": ["1", "2", "2", "2", "1", "2"],
+            "Age_group": ["16-17", "16-17", "18-19", "20-24", "18-19",
+                          "18-19"],
+            "ContraceptiveMainMethod": [1, 1, 2, 99, 2, 1],
+            "Count": [5, 10, 20, 30, 40, 50],
+            }
+        )
+
+    expected = pd.pivot_table(input_df,
+                              values="Count",
+                              index=rows,
+                              columns=columns,
+                              aggfunc="sum",
+                              margins=True,
+                              margins_name="Grand_total",
+                              observed=True).reset_index()
+    expected = expected.rename(columns={"Count": "Grand_total"}).fillna(0)
+    if row_subgroup is not None:
+        expected = helpers.add_subgroup_rows(expected, rows, row_subgroup)
+    if column_subgroup is not None:
+        expected = helpers.add_subgroup_columns(expected, column_subgroup)
+
+    actual = processing.crosstab_counts(input_df, rows, columns,
+                                        row_subgroup, column_subgroup)
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 def test_df_apply_rates():
     """Tests the df_apply_rates function, which creates a new dataframe containing
     calculations from 2 dataframes holding the numerator and denominator counts
@@ -246,3 +331,171 @@ def test_df_apply_rates():
         )
 
     pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_filter_dataframe_cached():
+    """
+    Tests that the filter cache returns the same subset as an uncached
+    filter_dataframe call, and reuses stored subsets for repeated filters.
+    """
+    input_df = pd.DataFrame(
+        {
+            "FirstContact": ["Y", "N", "Y", "Y", "N", "Y"],
+            "Gender": ["2", "2", "1", "2", "1", "2"],
+            "PatientID": [1, 2, 3, 4, 5, 6],
+            }
+        )
+
+    expected = processing.filter_dataframe(input_df, "persons_first_contact",
+                                           "(Gender == '2')", "counts")
+
+    processing.start_filter_cache(input_df)
+    actual_first = processing.filter_dataframe(input_df, "persons_first_contact",
+                                               "(Gender == '2')", "counts")
+    actual_repeat = processing.filter_dataframe(input_df, "persons_first_contact",
+                                                "(Gender == '2')", "percents")
+    hits = processing._filter_cache["hits"]
+    misses = processing._filter_cache["misses"]
+    processing.end_filter_cache()
+
+    assert (hits, misses) == (1, 1)
+    pd.testing.assert_frame_equal(actual_first, expected)
+    pd.testing.assert_frame_equal(actual_repeat, expected)
+
+
+def test_select_population_data_in_memory():
+    """
+    Tests the select_population_data function using the in-memory reference
+    data loaded by load_reference_data.
+    """
+    input_df_pop = pd.DataFrame(
+        {
+            "Org_code": ["E06000001", "E06000001", "E10000001", "E12000001",
+                         "E92000001"],
+            "Org_name": ["LA1", "LA1", "LA2", "REG1", "ENG"],
+            "Parent_code": ["E12000001", "E12000001", "E12000002",
+                            "E92000001", None],
+            "Parent_name": ["REG1", "REG1", "REG2", "ENG", None],
+            "Gender": ["1", "2", "2", "2", "2"],
+            "Org_type": ["LA", "LA", "LA", "LA_parent", "National"],
+            "Count": [100, 200, 300, 500, 1000],
+            }
+        )
+    input_df_org_ref = pd.DataFrame(
+        {
+            "Org_code": ["E06000001", "E10000001"],
+            "Org_type": ["LA", "LA"],
+            "Org_level": ["Local", "Local"],
+            }
+        )
+
+    expected = pd.DataFrame(
+        {
+            "LA_code": ["E06000001", "E10000001"],
+            "Count": [200, 300],
+            }
+        )
+
+    processing.load_reference_data(input_df_pop, input_df_org_ref)
+    actual = processing.select_population_data(columns=["LA_code"],
+                                               filter_condition="(Gender == '2')")
+    actual_repeat = processing.select_population_data(columns=["LA_code"],
+                                                      filter_condition="(Gender == '2')")
+    processing.clear_reference_data()
+
+    pd.testing.assert_frame_equal(actual, expected)
+    pd.testing.assert_frame_equal(actual_repeat, expected)
+
+
+def test_population_denominators():
+    """
+    Tests the population_denominators function, which pivots the population
+    data for a rates output into crosstab format, and stores it for reuse by
+    later outputs.
+    """
+    input_df_pop = pd.DataFrame(
+        {
+            "Org_code": ["E92000001", "E92000001", "E92000001"],
+            "Org_name": ["ENG", "ENG", "ENG"],
+            "Gender": ["1", "2", "2"],
+            "Age_group": ["16-17", "16-17", "18-19"],
+            "Org_type": ["National", "National", "National"],
+            "Count": [900, 1000, 1200],
+            }
+        )
+    input_df_org_ref = pd.DataFrame(
+        {
+            "Org_code": ["E06000001"],
+            "Org_type": ["LA"],
+            "Org_level": ["Local"],
+            }
+        )
+
+    expected = pd.DataFrame(
+        {
+            "Age_group": ["16-17", "18-19", "Grand_total"],
+            "Grand_total": [1000, 1200, 2200],
+            }
+        )
+
+    processing.load_reference_data(input_df_pop, input_df_org_ref)
+    actual = processing.population_denominators(
+        all_variables=["Age_group"], filter_condition="(Gender == '2')",
+        rows=["Age_group"], columns=None, row_subgroup=None,
+        column_subgroup=None)
+    # Updates to the returned denominators do not change the stored version
+    actual["Grand_total"] = 0
+    actual_repeat = processing.population_denominators(
+        all_variables=["Age_group"], filter_condition="(Gender == '2')",
+        rows=["Age_group"], columns=None, row_subgroup=None,
+        column_subgroup=None)
+    processing.clear_reference_data()
+
+    pd.testing.assert_frame_equal(actual_repeat, expected, check_dtype=False)
+
+
+def test_create_output_crosstab_from_cube():
+    """
+    Tests that outputs rolled up from an output cube are the same as outputs
+    aggregated directly from the filtered data, including records with null
+    values in variables not used by the output.
+    """
+    input_df = pd.DataFrame(
+        {
+            "ReportingYear": ["2021-22", "2021-22", "2021-22", "2020-21",
+                              "2020-21", "2021-22", "2020-21"],
+            "Gender": ["1", "2", "2", "2", "1", None, "2"],
+            "Age_group": ["<16", "16-17", None, "<16", "16-17", "<16", "<16"],
+            "PatientID": [1, 2, 3, 4, None, 6, 7],
+            }
+        )
+
+    def output_year_gender(df):
+        return processing.create_output_crosstab(
+            df, None, None, ["ReportingYear"], "Gender", None, None, None,
+            None, None, None, True, None, "counts", False)
+
+    def output_age(df):
+        return processing.create_output_crosstab(
+            df, None, None, ["Age_group"], None, None, None, None,
+            None, None, None, True, None, "counts", False)
+
+    expected = [output_year_gender(input_df), output_age(input_df)]
+
+    output_args = [{"name": "output_1", "contents": [output_year_gender]},
+                   {"name": "output_2", "contents": [output_age]}]
+
+    # Allow the cube to be used regardless of its size relative to the data
+    max_ratio = param.OUTPUT_CUBE_MAX_RATIO
+    param.OUTPUT_CUBE_MAX_RATIO = 1
+    try:
+        processing.start_output_cubes(input_df, output_args)
+        actual = [output_year_gender(input_df), output_age(input_df)]
+        hits = processing._output_cubes["hits"]
+        processing.end_output_cubes()
+    finally:
+        param.OUTPUT_CUBE_MAX_RATIO = max_ratio
+
+    assert hits == 2
+    for actual_output, expected_output in zip(actual, expected):
+        pd.testing.assert_frame_equal(actual_output, expected_output)
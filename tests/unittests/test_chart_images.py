@@ -0,0 +1,139 @@
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.chart import BarChart, Reference
+from openpyxl.drawing.spreadsheet_drawing import TwoCellAnchor, AnchorMarker
+from srh_code.utilities import chart_images
+from srh_code.utilities.write import write_openpyxl, write_session
+
+
+def create_chart_template(output_path, male_count):
+    """
+    Creates a chart template with a single stacked bar chart.
+    """
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = "Chart 1"
+    sht.append(["Year", "Female", "Male"])
+    sht.append(["2020-21", 10, male_count])
+    sht.append(["2021-22", 12, "*"])
+
+    chart = BarChart()
+    chart.title = "Contacts"
+    chart.grouping = "stacked"
+    chart.add_data(Reference(sht, min_col=2, min_row=1, max_col=3, max_row=3),
+                   titles_from_data=True)
+    chart.set_categories(Reference(sht, min_col=1, min_row=2, max_row=3))
+    sht.add_chart(chart, "E2")
+    template.save(output_path)
+
+
+def test_read_chart_definitions(tmp_path):
+    """
+    Tests the read_chart_definitions function reads the chart type, title and
+    series data from the template.
+    """
+    source_file = tmp_path / "charts.xlsx"
+    create_chart_template(source_file, 5)
+
+    actual = chart_images.read_chart_definitions(source_file)
+
+    assert len(actual) == 1
+    assert actual[0]["name"] == "Chart 1_1"
+    assert actual[0]["title"] == "Contacts"
+    plot = actual[0]["plots"][0]
+    assert (plot["type"], plot["grouping"]) == ("barChart", "stacked")
+    assert [series["name"] for series in plot["series"]] == ["Female", "Male"]
+    assert plot["series"][0]["categories"] == ["2020-21", "2021-22"]
+    assert plot["series"][1]["values"] == [5, "*"]
+
+
+def test_read_chart_definitions_size(tmp_path):
+    """
+    Tests the read_chart_definitions function reads the size of charts that
+    are not the default size, for charts with one and two cell anchors.
+    """
+    source_file = tmp_path / "charts.xlsx"
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = "Chart 1"
+    sht.append(["Year", "Count"])
+    sht.append(["2021-22", 10])
+    sht.column_dimensions["C"].width = 20
+    sht.row_dimensions[3].height = 30
+
+    data = Reference(sht, min_col=2, min_row=1, max_row=2)
+    one_cell_chart = BarChart()
+    one_cell_chart.add_data(data, titles_from_data=True)
+    one_cell_chart.width = 30
+    one_cell_chart.height = 20
+    sht.add_chart(one_cell_chart, "E2")
+    # Chart covering columns B to D (64, 140 and 64 pixels) and rows 2 to 11
+    # (20 pixels, other than row 3 at 40 pixels), ending 0.5 cm into column E
+    two_cell_chart = BarChart()
+    two_cell_chart.add_data(data, titles_from_data=True)
+    two_cell_chart.anchor = TwoCellAnchor(
+        _from=AnchorMarker(col=1, row=1),
+        to=AnchorMarker(col=4, colOff=180000, row=11))
+    sht.add_chart(two_cell_chart)
+    template.save(source_file)
+
+    actual = [(definition["width"], definition["height"]) for definition
+              in chart_images.read_chart_definitions(source_file)]
+
+    expected = [(30, 20),
+                (round((268 * 9525 + 180000) / 360000, 4),
+                 round(220 * 9525 / 360000, 4))]
+
+    assert actual == expected
+
+
+def test_read_chart_definitions_uncalculated_formulas(tmp_path):
+    """
+    Tests the read_chart_definitions function raises an error where a chart
+    is fed by formulas that have no calculated value, as when the template
+    was last saved by the openpyxl write backend.
+    """
+    source_file = tmp_path / "charts.xlsx"
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = "Chart 1"
+    for row in range(1, 6):
+        sht.cell(row, 3).value = f"=B{row}*10"
+
+    chart = BarChart()
+    chart.add_data(Reference(sht, min_col=3, min_row=1, max_row=5))
+    sht.add_chart(chart, "E2")
+    template.save(source_file)
+
+    input_df = pd.DataFrame({"Count": [1, 2, 3, 4, 5]})
+    wb = write_session.open_workbook(source_file, "openpyxl")
+    write_openpyxl.write_to_excel_static(input_df, wb, "Chart 1", "B1")
+    write_session.save_workbook(wb)
+
+    with pytest.raises(ValueError, match="have not been calculated"):
+        chart_images.read_chart_definitions(source_file)
+
+
+def test_save_charts_as_image(tmp_path):
+    """
+    Tests the save_charts_as_image function saves an image for each chart,
+    and only re-renders charts where the data has changed.
+    """
+    source_file = tmp_path / "charts.xlsx"
+    create_chart_template(source_file, 5)
+    image_file = tmp_path / "Chart 1_1.png"
+
+    chart_images.save_charts_as_image(source_file, tmp_path, processes=1)
+    assert image_file.exists()
+
+    # An unchanged chart is not rendered again
+    image_file.unlink()
+    image_file.touch()
+    chart_images.save_charts_as_image(source_file, tmp_path, processes=1)
+    assert image_file.stat().st_size == 0
+
+    # A chart with changed data is rendered again
+    create_chart_template(source_file, 6)
+    chart_images.save_charts_as_image(source_file, tmp_path, processes=1)
+    assert image_file.stat().st_size > 0
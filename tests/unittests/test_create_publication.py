@@ -0,0 +1,65 @@
+import sys
+import importlib
+import pytest
+import openpyxl
+import srh_code.parameters as param
+
+
+@pytest.fixture
+def headless_create_publication(monkeypatch):
+    """
+    Imports create_publication with the headless backends selected and with
+    the Windows only modules unavailable (as on a Linux batch node).
+    """
+    monkeypatch.setattr(param, "EXCEL_WRITE_BACKEND", "openpyxl")
+    monkeypatch.setattr(param, "CHART_IMAGE_BACKEND", "matplotlib")
+    for module in ["win32com", "win32com.client"]:
+        monkeypatch.setitem(sys.modules, module, None)
+    for module in ["srh_code.create_publication",
+                   "srh_code.utilities.publication_files"]:
+        monkeypatch.delitem(sys.modules, module, raising=False)
+
+    return importlib.import_module("srh_code.create_publication")
+
+
+def test_import_create_publication_headless(headless_create_publication):
+    """
+    Tests create_publication can be imported when the Windows only modules
+    used to save the chart images through Excel are not installed.
+    """
+    assert hasattr(headless_create_publication, "main")
+
+
+def test_main_saves_charts_headless(headless_create_publication, monkeypatch,
+                                    tmp_path):
+    """
+    Tests the main function saves the publication tables with openpyxl and
+    the chart images with matplotlib (rather than through Excel) when the
+    headless backends are selected, without the Windows only modules.
+    """
+    create_publication = headless_create_publication
+    for run_flag in ["RUN_TABLES_SRHAD", "RUN_TABLES_PRESCRIBING",
+                     "RUN_TABLES_AHAS", "RUN_CHARTS_SRHAD",
+                     "RUN_CHARTS_PRESCRIBING", "RUN_CHARTS_AHAS",
+                     "RUN_MAPS_SRHAD"]:
+        monkeypatch.setattr(param, run_flag, False)
+    monkeypatch.setattr(param, "RUN_PUBLICATION_OUTPUTS", True)
+    monkeypatch.setattr(param, "CHART_TEMPLATE", tmp_path / "charts.xlsx")
+    monkeypatch.setattr(param, "TABLE_TEMPLATE", tmp_path / "tables.xlsx")
+    monkeypatch.setattr(param, "TAB_DIR", tmp_path)
+    tables_template = openpyxl.Workbook()
+    tables_template.active.title = "Contents"
+    tables_template.save(tmp_path / "tables.xlsx")
+    # Run in a temporary folder, as main creates the cached dataframes folder
+    # in the working directory
+    monkeypatch.chdir(tmp_path)
+
+    saved = []
+    monkeypatch.setattr(create_publication.chart_images,
+                        "save_charts_as_image",
+                        lambda source_file: saved.append(source_file))
+
+    create_publication.main()
+
+    assert saved == [tmp_path / "charts.xlsx"]
+    assert (tmp_path / f"srh-serv-eng-{param.FYEAR}-tab.xlsx").exists()
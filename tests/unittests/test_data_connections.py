@@ -0,0 +1,94 @@
+import sqlalchemy as sa
+import pandas as pd
+import srh_code.parameters as param
+from srh_code.utilities import data_connections as dbc
+from srh_code.utilities import snapshot_cache
+
+
+def test_df_from_sql():
+    """
+    Tests the df_from_sql function returns the query results, using a local
+    SQLite engine registered in place of the mssql server, and that the engine
+    is shared by queries to the same database until the engines are disposed.
+    """
+    engine = sa.create_engine("sqlite://")
+    pd.DataFrame({"Org_Code": ["A", "B", "C"],
+                  "Count": [1, 2, 3]}).to_sql("srhad", engine, index=False)
+    dbc.register_engine("server", "database", engine)
+
+    try:
+        actual = dbc.df_from_sql("SELECT * FROM srhad WHERE Count > 1",
+                                 "server", "database")
+        assert dbc.get_engine("server", "database") is engine
+    finally:
+        dbc.dispose_engines()
+
+    expected = pd.DataFrame({"Org_Code": ["B", "C"],
+                             "Count": [2, 3]})
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert ("server", "database") not in dbc._engines
+
+
+def test_df_from_sql_chunked():
+    """
+    Tests the df_from_sql function applies the data types to each chunk when
+    the results are streamed in chunks, with categorical columns kept as
+    categoricals (with all categories) once the chunks are combined.
+    """
+    engine = sa.create_engine("sqlite://")
+    pd.DataFrame({"Org_code": ["A", "B", "C", "A", "D"],
+                  "Flag": [1, None, 0, 1, 1]}).to_sql("srhad", engine,
+                                                      index=False)
+    dbc.register_engine("server", "database", engine)
+
+    try:
+        actual = dbc.df_from_sql("SELECT * FROM srhad", "server", "database",
+                                 chunksize=2,
+                                 dtypes={"Org_code": "category",
+                                         "Flag": "Int8"})
+    finally:
+        dbc.dispose_engines()
+
+    expected = pd.DataFrame(
+        {"Org_code": pd.Categorical(["A", "B", "C", "A", "D"]),
+         "Flag": pd.array([1, None, 0, 1, 1], dtype="Int8")})
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_df_from_sql_snapshot(tmp_path, monkeypatch):
+    """
+    Tests the df_from_sql function reads the query results back from the
+    snapshot cache when the query is rerun, and re-queries the database when
+    the snapshots are set to be refreshed.
+    """
+    monkeypatch.setattr(param, "USE_SQL_CACHE", True)
+    monkeypatch.setattr(param, "SQL_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(param, "SQL_CACHE_REFRESH", False)
+
+    engine = sa.create_engine("sqlite://")
+    pd.DataFrame({"Org_code": ["A", "B"]}).to_sql("srhad", engine,
+                                                  index=False)
+    dbc.register_engine("server", "database", engine)
+    query = "SELECT * FROM srhad"
+    dtypes = {"Org_code": "category"}
+
+    try:
+        first = dbc.df_from_sql(query, "server", "database", dtypes=dtypes)
+        # Change the source data, so any re-query would return a new row
+        pd.DataFrame({"Org_code": ["C"]}).to_sql("srhad", engine,
+                                                 index=False,
+                                                 if_exists="append")
+        cached = dbc.df_from_sql(query, "server", "database", dtypes=dtypes)
+        monkeypatch.setattr(param, "SQL_CACHE_REFRESH", True)
+        refreshed = dbc.df_from_sql(query, "server", "database",
+                                    dtypes=dtypes)
+    finally:
+        dbc.dispose_engines()
+
+    pd.testing.assert_frame_equal(cached, first)
+    assert list(refreshed["Org_code"]) == ["A", "B", "C"]
+
+    manifest = snapshot_cache.read_manifest(tmp_path)
+    assert [entry["rows"] for entry in manifest.values()] == [3]
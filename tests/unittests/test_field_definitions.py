@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from srh_code.utilities import field_definitions
+from srh_code.utilities import field_definitions, helpers
 
 
 def test_contraceptive_care_flags():
@@ -237,6 +237,25 @@ def test_dq_duplicate_flag():
     pd.testing.assert_frame_equal(actual_df, expected_df, check_dtype=False)
 
 
+def test_dq_duplicate_flag_hash_collision(monkeypatch):
+    """
+    Tests the dq_duplicate_flag function only flags records that are
+    duplicates where different records have the same hash.
+    """
+    input_df = pd.DataFrame({"RowNum": [1, 2, 3, 4],
+                             "Org_code": ["A", "B", "A", "B"],
+                             "FirstContact": ["N", "Y", "Y", "N"],
+                             "MainContact": ["Y", "N", "Y", "N"]})
+
+    # Set every record to the same hash
+    monkeypatch.setattr(helpers, "hash_rows",
+                        lambda df, columns: np.zeros(len(df), dtype="uint64"))
+
+    actual_df = field_definitions.dq_duplicate_flag(input_df)
+
+    assert list(actual_df["Duplicate"]) == [0, 0, 1, 1]
+
+
 def test_dq_extreme_age_flag():
     """
     Tests the dq_extreme_age_flag function, which flags duplicate records
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import pytest
 from datetime import datetime
 import srh_code.utilities.helpers as helpers
 
@@ -128,6 +129,47 @@ def test_excel_col_to_df_col():
     assert actual == expected, f"When checking excel_col_to_df_col expected to find {expected} but found {actual}"
 
 
+def test_upper_case_columns():
+    """
+    Tests the upper_case_columns function, which converts string columns to
+    upper case, including categorical columns whose categories would be
+    combined.
+    """
+    input_df = pd.DataFrame({"Name": ["Brook", "Clinic", None],
+                             "Category": pd.Categorical(["a", "b", "a"]),
+                             "Combined": pd.Categorical(["x", "X", "y"])})
+
+    actual = helpers.upper_case_columns(input_df,
+                                        ["Name", "Category", "Combined"])
+
+    assert actual["Name"].tolist() == ["BROOK", "CLINIC", None]
+    assert actual["Category"].cat.categories.tolist() == ["A", "B"]
+    assert actual["Category"].tolist() == ["A", "B", "A"]
+    assert actual["Combined"].tolist() == ["X", "X", "Y"]
+
+
+def test_run_steps():
+    """
+    Tests the run_steps function, which applies a list of processing steps to
+    a dataframe in turn.
+    """
+    input_df = pd.DataFrame({"Code": pd.Categorical(["a", "b", None])})
+
+    steps = [("Copying the codes", helpers.copy_columns,
+              {"columns": ["Code"], "suffix": "_unedited"}),
+             ("Upper casing the codes", helpers.upper_case_columns,
+              {"columns": ["Code"]}),
+             ("Filling the nulls", helpers.fill_null_values,
+              {"column": "Code_unedited", "value": "a"})]
+
+    expected = pd.DataFrame({"Code": pd.Categorical(["A", "B", None]),
+                             "Code_unedited": pd.Categorical(["a", "b", "a"])})
+
+    actual = helpers.run_steps(input_df, steps)
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 def test_add_percent_or_rate():
     """
     Tests the add_percent_or_rate function, which adds a calculated percentage
@@ -308,8 +350,10 @@ def test_group_numeric_values():
     expected = pd.DataFrame(
         {
             "STARTAGE": [15, 16, 25, 35, 45, 55, 65, 75, 150],
-            "Age_groups": ["<16", "16-24", "25-34", "35-44", "45-54",
-                           "55-64", "65-74", "75+", 'unknown'],
+            "Age_groups": pd.Categorical(
+                ["<16", "16-24", "25-34", "35-44", "45-54", "55-64", "65-74",
+                 "75+", 'unknown'],
+                categories=list(age_groups) + ["unknown"], ordered=True),
             }
         )
 
@@ -327,6 +371,76 @@ def test_group_numeric_values():
     pd.testing.assert_frame_equal(actual, expected)
 
 
+def test_group_numeric_values_default_category():
+    """Tests the group_numeric_value function includes the default value in
+    the categories where no values are set to it, so that data grouped with
+    the same definition keeps the categorical type when concatenated.
+    """
+    group_info = {"<20": {1: 19}, "20-24": {20: 24}}
+    df_known = helpers.group_numeric_values(pd.DataFrame({"Age": [1, 20]}),
+                                            "Age", "Age_group", group_info,
+                                            "unrecorded")
+    df_unknown = helpers.group_numeric_values(
+        pd.DataFrame({"Age": [np.nan, 20]}), "Age", "Age_group", group_info,
+        "unrecorded")
+
+    actual = pd.concat([df_known, df_unknown])["Age_group"]
+
+    expected = pd.Series(pd.Categorical(["<20", "20-24", "unrecorded", "20-24"],
+                                        categories=["<20", "20-24",
+                                                    "unrecorded"],
+                                        ordered=True),
+                         index=[0, 1, 0, 1], name="Age_group")
+
+    pd.testing.assert_series_equal(actual, expected)
+
+
+def test_group_numeric_values_overlap():
+    """Tests the group_numeric_value function raises an error where the group
+    ranges overlap or have gaps between them, and that values outside all the
+    ranges (and nulls) are set to the default value.
+    """
+    input_df = pd.DataFrame({"Age": [np.nan, 1, 20, 25]})
+
+    with pytest.raises(ValueError):
+        helpers.group_numeric_values(input_df, "Age", "Age_group",
+                                     {"<20": {1: 20}, "20-24": {20: 24}},
+                                     "unrecorded")
+
+    with pytest.raises(ValueError):
+        helpers.group_numeric_values(input_df, "Age", "Age_group",
+                                     {"<20": {1: 18}, "20-24": {20: 24}},
+                                     "unrecorded")
+
+    actual = helpers.group_numeric_values(input_df, "Age", "Age_group",
+                                          {"20-24": {20: 24}, "<20": {1: 19}},
+                                          "unrecorded")
+
+    expected = pd.Categorical(["unrecorded", "<20", "20-24", "unrecorded"],
+                              categories=["20-24", "<20", "unrecorded"],
+                              ordered=True)
+
+    pd.testing.assert_series_equal(actual["Age_group"],
+                                   pd.Series(expected, name="Age_group"))
+
+
+def test_count_code_groups():
+    """
+    Tests the count_code_groups function, which counts the number of columns
+    holding a code in each code group for each record (ignoring nulls and
+    codes not in any group).
+    """
+    input_df = pd.DataFrame({"Code1": [1, 3, np.nan, 99],
+                             "Code2": [2, 3, 2.5, np.nan]})
+
+    actual = helpers.count_code_groups(input_df, ["Code1", "Code2"],
+                                       {"A": [1, 2], "B": [3]})
+
+    expected = np.array([[2, 0], [0, 2], [0, 0], [0, 0]])
+
+    np.testing.assert_array_equal(actual, expected)
+
+
 def test_add_organisation_type():
     """
     Tests the add_organisation_type function
@@ -477,6 +591,38 @@ def test_suppress_column():
     pd.testing.assert_series_equal(actual, expected)
 
 
+def test_suppress_values():
+    """
+    Tests the suppress_values function gives the same results as applying
+    the original element by element suppression and rounding to each column
+    """
+    rng = np.random.default_rng(2023)
+    input_df = pd.DataFrame(
+        {
+            "Grand_total": rng.integers(0, 1000, 500),
+            "Female": rng.integers(0, 30, 500).astype(float),
+            "Male": rng.integers(10, 200, 500),
+            }
+        )
+    input_df.loc[::7, "Female"] = np.nan
+
+    def suppress_reference(column):
+        # Original suppression logic (applies Python's round to each value)
+        suppression = column.copy(deep=True)
+        should_suppress = column.between(1, 7, inclusive="both")
+        should_round = column > 7
+        suppression.loc[should_suppress] = np.nan
+        suppression.loc[should_round] = (
+            suppression[should_round].apply(lambda p: 5 * round(p/5)))
+        return suppression
+
+    actual = helpers.suppress_values(input_df)
+
+    expected = input_df.apply(suppress_reference)
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 def test_round_half_up():
     """
     Tests the round_half_up function, using various example of postive and
@@ -496,3 +642,58 @@ def test_round_half_up():
     assert helpers.round_half_up(2.5, 0) == 3
     assert helpers.round_half_up(3.5, 0) == 4
     assert helpers.round_half_up(0.5, 1) == 0.5
+
+
+def test_round_half_up_values():
+    """
+    Tests the round_half_up_values function gives exactly the same results as
+    round_half_up, for every percentage that can be made from counts with a
+    denominator up to 400, every value to 3 decimal places between 0 and 10,
+    and the half way points of these, all as positive and negative values.
+    """
+    percents = np.concatenate([np.arange(0, denom + 1) / denom * 100
+                               for denom in range(1, 401)])
+    values = np.concatenate([percents,
+                             np.arange(0, 10001) / 1000,
+                             np.arange(0, 10001) / 1000 + 0.0005,
+                             np.arange(0, 2001) / 2])
+    values = np.concatenate([values, -values])
+
+    for decimals in [0, 1, 2]:
+        actual = helpers.round_half_up_values(values, decimals)
+        expected = np.array([helpers.round_half_up(value, decimals)
+                             for value in values.tolist()])
+
+        np.testing.assert_array_equal(actual, expected)
+
+    # Check nulls and infinite values are unchanged and the dataframe
+    # structure is retained
+    input_df = pd.DataFrame({"A": [2.675, np.nan, 0.5],
+                             "B": [np.inf, -1.005, 12.25]},
+                            index=["x", "y", "z"])
+
+    actual = helpers.round_half_up_values(input_df, 2)
+
+    expected = pd.DataFrame({"A": [2.68, np.nan, 0.5],
+                             "B": [np.inf, -1.01, 12.25]},
+                            index=["x", "y", "z"])
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_hash_rows():
+    """
+    Tests records with the same values have the same hash and records with
+    different values (including nulls)
+    have different hashes.
+    """
+    df = pd.DataFrame({"Code": pd.Categorical(["A", "A", "B", "A", None]),
+                       "Age": pd.array([20, 20, 20, None, None],
+                                       dtype="Int32"),
+                       "ID": ["x", "x", "x", "x", "y"]})
+
+    hashes = helpers.hash_rows(df, ["Code", "Age", "ID"])
+
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[1]
+    assert len(set(hashes[1:])) == 4
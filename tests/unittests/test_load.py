@@ -0,0 +1,40 @@
+import threading
+import pytest
+from srh_code.utilities import load
+
+
+def test_run_import_tasks():
+    """
+    Tests the run_import_tasks function runs the independent tasks at the same
+    time, and passes the results of the tasks a step depends on to the step.
+    """
+    # Each import waits until both imports have started, so the tasks only
+    # complete if they are run concurrently
+    barrier = threading.Barrier(2, timeout=10)
+
+    def import_a():
+        barrier.wait()
+        return 2
+
+    def import_b():
+        barrier.wait()
+        return 3
+
+    tasks = {"total": (lambda a, b: a * 10 + b, ["a", "b"]),
+             "a": (import_a, []),
+             "b": (import_b, [])}
+
+    actual = load.run_import_tasks(tasks, max_workers=2)
+
+    assert actual == {"a": 2, "b": 3, "total": 23}
+
+
+def test_run_import_tasks_missing_dependency():
+    """
+    Tests the run_import_tasks function raises an error where a task depends on
+    a task that is not set to run.
+    """
+    tasks = {"total": (lambda a: a, ["a"])}
+
+    with pytest.raises(ValueError):
+        load.run_import_tasks(tasks, max_workers=2)
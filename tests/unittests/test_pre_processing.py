@@ -3,80 +3,95 @@ import numpy as np
 from srh_code.utilities import pre_processing
 
 
-def test_update_non_english_las():
+def test_create_la_mapping():
     """
-    Tests the update_non_english_las function, which updates non-English UK
-    LA codes to country level (e.g. Aberdeen to Scotland) for reporting purposes.
+    Tests the create_la_mapping function, which maps non-English UK LA codes
+    to country level (e.g. Aberdeen to Scotland) and non UK LA codes to the
+    outside UK default, leaving out English and unknown LA codes.
     """
-    input_df = pd.DataFrame(
-        {"LA_code_lower": ["E09000001", "E07000028", "S12000033", "W06000022",
-                           "N09000009", "X99999999"],
-         "LA_name_lower": ["City of London", "Carlisle", "Aberdeen City",
-                           "Newport", "Mid Ulster", "Unknown"],
-         "LA_code": ["E09000001", "E10000006", "S12000033", "W06000022",
-                     "N09000009", "X99999999"],
-         "LA_name": ["City of London", "Cumbria", "Aberdeen City", "Newport",
-                     "Mid Ulster", "Unknown"],
-         "LA_parent_code": ["E12000006", "E12000006", "S12000002", "W12000002",
-                            "N12000009", "X99999999"]}
-        )
+    input_series = pd.Series(["E09000001", "S12000033", "W06000022",
+                              "N09000009", "M99999999", "L99999999",
+                              "X99999998", "X99999999", "S12000033", None])
 
     expected = pd.DataFrame(
-        {"LA_code_lower": ["E09000001", "E07000028", "S99999999", "W99999999",
-                           "N99999999", "X99999999"],
-         "LA_name_lower": ["City of London", "Carlisle", "Scotland",
-                           "Wales", "Northern Ireland", "Unknown"],
-         "LA_code": ["E09000001", "E10000006", "S99999999", "W99999999",
-                     "N99999999", "X99999999"],
-         "LA_name": ["City of London", "Cumbria", "Scotland", "Wales",
-                     "Northern Ireland", "Unknown"],
-         "LA_parent_code": ["E12000006", "E12000006", "S99999999", "W99999999",
-                            "N99999999", "X99999999"]}
-        )
+        {"Rule": ["Non-English UK LA"] * 3 + ["Non-UK LA"] * 3,
+         "To_code": ["S99999999", "W99999999", "N99999999", "X99999998",
+                     "X99999998", "X99999998"],
+         "To_name": ["Scotland", "Wales", "Northern Ireland",
+                     "Outside the United Kingdom",
+                     "Outside the United Kingdom",
+                     "Outside the United Kingdom"]},
+        index=pd.Index(["S12000033", "W06000022", "N09000009", "M99999999",
+                        "L99999999", "X99999998"], name="From_code"),
+        dtype=object)
 
-    actual = pre_processing.update_non_english_las(input_df)
+    actual = pre_processing.create_la_mapping(input_series)
 
     pd.testing.assert_frame_equal(actual, expected)
 
 
-def test_update_non_uk_las():
+def test_normalise_las_country_las():
     """
-    Tests the update_non_uk_las function, which updates non UK LA codes and
-    names to the defaults for reporting purposes.
+    Tests the normalise_las function updates non-English UK LAs to country
+    level and non UK LAs to the outside UK default, across the lower and upper
+    tier LA codes and names and the parent code.
     """
+    no_small_las = {"From_code": [], "To_code": [], "From_name": [],
+                    "To_name": []}
     input_df = pd.DataFrame(
-        {"LA_code_lower": ["E07000028", "M99999999", "L99999999", "X99999998",
-                           "X99999999"],
-         "LA_name_lower": ["Carlisle", "Isle of Man", "Channel Islands",
-                           "Not applicable (outside United Kingdom)", "Not known"],
-         "LA_code": ["E10000006", "M99999999", "L99999999", "X99999998",
-                     "X99999999"],
-         "LA_name": ["Cumbria", "Isle of Man", "Channel Islands",
-                     "Not applicable (outside United Kingdom)", "Not known"],
-         "LA_parent_code": ["E12000006", "M99999999", "L99999999", "X99999998",
-                            "X99999999"]}
+        {"LA_code_lower": ["E07000028", "S12000033", "W06000022",
+                           "N09000009", "M99999999", "X99999999"],
+         "LA_name_lower": ["Carlisle", "Aberdeen City", "Newport",
+                           "Mid Ulster", "Isle of Man", "Not known"],
+         "LA_code": ["E10000006", "S12000033", "W06000022", "N09000009",
+                     "M99999999", "X99999999"],
+         "LA_name": ["Cumbria", "Aberdeen City", "Newport", "Mid Ulster",
+                     "Isle of Man", "Not known"],
+         "LA_parent_code": ["E12000002", "S12000002", "W12000002",
+                            "N12000009", "M99999999", "X99999999"]}
         )
 
     expected = pd.DataFrame(
-        {"LA_code_lower": ["E07000028", "X99999998", "X99999998", "X99999998",
-                           "X99999999"],
-         "LA_name_lower": ["Carlisle", "Outside the United Kingdom",
-                           "Outside the United Kingdom",
-                           "Outside the United Kingdom", "Not known"],
-         "LA_code": ["E10000006", "X99999998", "X99999998", "X99999998",
-                     "X99999999"],
-         "LA_name": ["Cumbria", "Outside the United Kingdom",
-                     "Outside the United Kingdom",
+        {"LA_code_lower": ["E07000028", "S99999999", "W99999999",
+                           "N99999999", "X99999998", "X99999999"],
+         "LA_name_lower": ["Carlisle", "Scotland", "Wales",
+                           "Northern Ireland", "Outside the United Kingdom",
+                           "Not known"],
+         "LA_code": ["E10000006", "S99999999", "W99999999", "N99999999",
+                     "X99999998", "X99999999"],
+         "LA_name": ["Cumbria", "Scotland", "Wales", "Northern Ireland",
                      "Outside the United Kingdom", "Not known"],
-         "LA_parent_code": ["E12000006", "X99999998", "X99999998", "X99999998",
-                            "X99999999"]}
+         "LA_parent_code": ["E12000002", "S99999999", "W99999999",
+                            "N99999999", "X99999998", "X99999999"]}
         )
+    expected["LA_code_inc_small"] = expected["LA_code"]
+    expected["LA_name_inc_small"] = expected["LA_name"]
 
-    actual = pre_processing.update_non_uk_las(input_df)
+    actual, _ = pre_processing.normalise_las(input_df, no_small_las)
 
     pd.testing.assert_frame_equal(actual, expected)
 
 
+def test_normalise_las_small_la_names():
+    """
+    Tests the normalise_las function updates the small LA codes and names
+    independently, so that a name is updated where the code is not a small
+    LA code and vice versa.
+    """
+    input_df = pd.DataFrame(
+        {"LA_code_lower": ["E09000001", "E09000012"],
+         "LA_name_lower": ["City of London", "Hackney"],
+         "LA_code": ["E09000001", "E09000012"],
+         "LA_name": ["Not known", "City of London"],
+         "LA_parent_code": ["E12000007", "E12000007"]}
+        )
+
+    actual, _ = pre_processing.normalise_las(input_df)
+
+    assert list(actual["LA_code"]) == ["E09000012", "E09000012"]
+    assert list(actual["LA_name"]) == ["Not known", "Hackney"]
+
+
 def test_update_small_las():
     """
     Tests the update_small_las function, which updates small LA details to
@@ -115,6 +130,87 @@ def test_update_small_las():
     pd.testing.assert_frame_equal(actual, expected)
 
 
+def test_normalise_las():
+    """
+    Tests the normalise_las function, which updates non-English UK, non UK and
+    small LAs to the LAs they are reported under, and records the rule applied
+    to each LA code in an audit table.
+    """
+    input_df = pd.DataFrame(
+        {"LA_code_lower": ["E09000001", "E07000028", "S12000033", "M99999999",
+                           "S12000033"],
+         "LA_name_lower": ["City of London", "Carlisle", "Aberdeen City",
+                           "Isle of Man", "Aberdeen City"],
+         "LA_code": ["E09000001", "E10000006", "S12000033", "M99999999",
+                     "S12000033"],
+         "LA_name": ["City of London", "Cumbria", "Aberdeen City",
+                     "Isle of Man", "Aberdeen City"],
+         "LA_parent_code": ["E12000007", "E12000002", "S12000002",
+                            "M99999999", "S12000002"]}
+        )
+    input_df["LA_code_lower"] = input_df["LA_code_lower"].astype("category")
+
+    expected = pd.DataFrame(
+        {"LA_code_lower": ["E09000001", "E07000028", "S99999999", "X99999998",
+                           "S99999999"],
+         "LA_name_lower": ["City of London", "Carlisle", "Scotland",
+                           "Outside the United Kingdom", "Scotland"],
+         "LA_code": ["E09000012", "E10000006", "S99999999", "X99999998",
+                     "S99999999"],
+         "LA_name": ["Hackney", "Cumbria", "Scotland",
+                     "Outside the United Kingdom", "Scotland"],
+         "LA_parent_code": ["E12000007", "E12000002", "S99999999",
+                            "X99999998", "S99999999"],
+         "LA_code_inc_small": ["E09000001", "E10000006", "S99999999",
+                               "X99999998", "S99999999"],
+         "LA_name_inc_small": ["City of London", "Cumbria", "Scotland",
+                               "Outside the United Kingdom", "Scotland"]}
+        )
+
+    expected_audit = pd.DataFrame(
+        {"From_code": ["S12000033", "M99999999", "E09000001"],
+         "Rule": ["Non-English UK LA", "Non-UK LA", "Small LA"],
+         "To_code": ["S99999999", "X99999998", "E09000012"],
+         "To_name": ["Scotland", "Outside the United Kingdom", "Hackney"],
+         "Records": [2, 1, 1]}
+        )
+
+    actual, actual_audit = pre_processing.normalise_las(input_df)
+    actual["LA_code_lower"] = actual["LA_code_lower"].astype(object)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    pd.testing.assert_frame_equal(actual_audit, expected_audit,
+                                  check_dtype=False)
+
+
+def test_update_old_to_new_lsoa():
+    """
+    Tests the update_old_to_new_lsoa function, which updates old LSOA codes to
+    their new equivalents and adds the IMD reference data of the new codes.
+    """
+    df_lsoa_ref = pd.DataFrame({"LSOA_code_old": ["E01990001", "E01990002"],
+                                "LSOA_code_new": ["E01000001", None]})
+
+    df_imd_ref = pd.DataFrame({"Org_code": ["E01000001", "E01000002"],
+                               "IMD_decile": ["1", "2"]})
+
+    input_df = pd.DataFrame(
+        {"LSOA_code": ["E01990001", "E01000002", "E01990002", None,
+                       "X99999999", "E01000001"]}
+        )
+
+    expected = pd.DataFrame(
+        {"LSOA_code": ["E01000001", "E01000002", "E01990002", None,
+                       "X99999999", "E01000001"],
+         "IMD_decile": ["1", "2", np.nan, np.nan, np.nan, "1"]}
+        )
+
+    actual = pre_processing.update_old_to_new_lsoa(input_df, df_lsoa_ref,
+                                                   df_imd_ref=df_imd_ref)
+
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 def test_map_org_code_to_name():
     """
     Tests the map_org_code_to_name function, which adds organisation names to
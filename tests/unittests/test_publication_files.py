@@ -0,0 +1,143 @@
+import openpyxl
+import srh_code.parameters as param
+from srh_code.utilities import publication_files
+
+
+def test_save_tables_openpyxl(tmp_path, monkeypatch):
+    """
+    Tests the save_tables function with the openpyxl backend saves the tables
+    to the publication folder, removing the unpublished worksheets, replacing
+    the tags with labels and opening on the contents sheet.
+    """
+    monkeypatch.setattr(param, "TAB_DIR", tmp_path)
+    monkeypatch.setattr(param, "FYEAR", "2021-22")
+    monkeypatch.setattr(param, "TABLES_REMOVE", ["Crosschecks"])
+    source_file = tmp_path / "tables.xlsx"
+    template = openpyxl.Workbook()
+    template.active.title = "Contents"
+    sht = template.create_sheet("Table 1")
+    sht["A1"] = "Table 1"
+    sht["A2"] = "tag_subtitle_year"
+    sht["C3"] = "tag_subtitle_year"
+    sht["A4"] = "Notes"
+    template.create_sheet("Crosschecks")
+    template.active = 1
+    template.save(source_file)
+
+    publication_files.save_tables(source_file, "openpyxl")
+
+    wb = openpyxl.load_workbook(tmp_path / "srh-serv-eng-2021-22-tab.xlsx")
+    assert wb.sheetnames == ["Contents", "Table 1"]
+    assert wb.active.title == "Contents"
+    assert wb["Table 1"]["A2"].value == "England, 2021-22"
+    assert wb["Table 1"]["C3"].value == "England, 2021-22"
+    assert wb["Table 1"]["A4"].value == "Notes"
+    # The master file is left unchanged
+    assert openpyxl.load_workbook(source_file)["Table 1"]["A2"].value == \
+        "tag_subtitle_year"
+
+
+class FakeRange:
+    """
+    Stands in for an xlwings range, reading from and recording writes to a
+    FakeSheet.
+    """
+    def __init__(self, sheet, cells):
+        self.sheet = sheet
+        self.cells = cells
+
+    def end(self, direction):
+        # Only used to find the last row with a value in column A
+        last_row = max([row for row, values in enumerate(self.sheet.values,
+                                                         start=1)
+                        if values[0] is not None], default=1)
+        return FakeRange(self.sheet, ((last_row, 1),))
+
+    @property
+    def last_cell(self):
+        return self
+
+    @property
+    def row(self):
+        return self.cells[0][0]
+
+    def options(self, ndim):
+        return self
+
+    @property
+    def value(self):
+        # Only used to read the A1:P<n> check range
+        last_row = int(self.cells[0].split(":P")[1])
+        return [row + [None] * (16 - len(row))
+                for row in self.sheet.values[:last_row]]
+
+    @value.setter
+    def value(self, value):
+        self.sheet.writes.append((self.cells, value))
+
+
+class FakeSheet:
+    """
+    Stands in for an xlwings sheet, holding the cell values of each row and
+    recording each range that is written to.
+    """
+    def __init__(self, values=None):
+        self.values = values or []
+        self.writes = []
+
+    def range(self, *cells):
+        return FakeRange(self, cells)
+
+
+def test_write_cell_runs():
+    """
+    Tests the write_cell_runs function writes each run of adjacent cells in a
+    row in a single call, including runs of a single cell.
+    """
+    sht = FakeSheet()
+
+    publication_files.write_cell_runs(sht, 3, {5: "e", 1: "a", 2: "b",
+                                               3: "c", 8: "h"})
+
+    assert sht.writes == [(((3, 1), (3, 3)), [["a", "b", "c"]]),
+                          (((3, 5), (3, 5)), [["e"]]),
+                          (((3, 8), (3, 8)), [["h"]])]
+
+
+def test_write_cell_runs_empty_row():
+    """
+    Tests the write_cell_runs function writes nothing where a row has no
+    values to be written.
+    """
+    sht = FakeSheet()
+
+    publication_files.write_cell_runs(sht, 1, {})
+
+    assert sht.writes == []
+
+
+def test_add_labels(monkeypatch):
+    """
+    Tests the add_labels function replaces the tags in each worksheet with
+    their labels, defining the label of each tag once.
+    """
+    sheets = [FakeSheet([["Table 1"], ["tag_subtitle_year", None, "x"]]),
+              FakeSheet([["Table 2"], [None, "tag_subtitle_year",
+                                       "tag_copyright_nhse"]])]
+    monkeypatch.setattr(publication_files.xw, "Book",
+                        lambda filename: type("Book", (), {"sheets": sheets}))
+    defined = []
+
+    def define_labels(tag):
+        defined.append(tag)
+        return "label_" + tag
+
+    monkeypatch.setattr(publication_files, "define_labels", define_labels)
+
+    publication_files.add_labels("tables.xlsx")
+
+    assert defined == ["subtitle_year", "copyright_nhse"]
+    assert sheets[0].writes == [(((2, 1), (2, 1)), [["label_subtitle_year"]])]
+    assert sheets[1].writes == [(((2, 2), (2, 3)),
+                                 [["label_subtitle_year",
+                                   "label_copyright_nhse"]])]
@@ -0,0 +1,31 @@
+import pandas as pd
+from srh_code.utilities import schema
+
+
+def test_apply_shared_categories():
+    """
+    Tests the apply_shared_categories function converts each group of columns
+    to categoricals with the same sorted categories, keeping the values (and
+    nulls) unchanged.
+    """
+    input_df = pd.DataFrame(
+        {"LA_code": pd.Categorical(["E2", "E1", None]),
+         "Clinic_LA_code_upper": ["E3", "E1", "E1"],
+         "Age_group": ["20-24", "<16", "20-24"]})
+
+    actual = schema.apply_shared_categories(
+        input_df, [["LA_code", "Clinic_LA_code_upper", "Not_a_column"],
+                   ["Age_group"]])
+
+    la_categories = pd.Index(["E1", "E2", "E3"])
+    expected = pd.DataFrame(
+        {"LA_code": pd.Categorical(["E2", "E1", None],
+                                   categories=la_categories),
+         "Clinic_LA_code_upper": pd.Categorical(["E3", "E1", "E1"],
+                                                categories=la_categories),
+         "Age_group": pd.Categorical(["20-24", "<16", "20-24"])})
+
+    pd.testing.assert_frame_equal(actual, expected)
+    # Columns sharing categories can be compared directly
+    assert list(actual["LA_code"] == actual["Clinic_LA_code_upper"]) == \
+        [False, True, False]
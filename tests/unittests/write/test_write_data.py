@@ -0,0 +1,93 @@
+import multiprocessing as mp
+import pandas as pd
+import pytest
+import srh_code.utilities.processing.processing_publication as processing
+from srh_code.utilities.write import write_data
+
+
+def create_source_data():
+    """
+    Creates a source dataframe with a record for each combination of year,
+    gender and age group, for a range of patients.
+    """
+    years = ["2020-21", "2021-22"]
+    genders = ["1", "2"]
+    age_groups = ["<16", "16-17", "18-19", "20-24"]
+    records = []
+    for patient in range(60):
+        records.append({"ReportingYear": years[patient % 2],
+                        "Gender": genders[patient % 3 % 2],
+                        "Age_group": age_groups[patient % 4],
+                        "PatientID": patient % 45})
+
+    return pd.DataFrame(records)
+
+
+# The output contents are defined at module level so that they can be passed
+# to spawned worker processes
+def output_year_gender(df):
+    return processing.create_output_crosstab(
+        df, None, None, ["ReportingYear"], "Gender", None, None, None,
+        None, None, None, True, None, "counts", False)
+
+
+def output_age_year_females(df):
+    return processing.create_output_crosstab(
+        df, None, "(Gender == '2')", ["Age_group"], "ReportingYear", None,
+        None, None, None, None, None, True, None, "counts", False)
+
+
+def output_age_year_females_percent(df):
+    return processing.create_output_crosstab(
+        df, None, "(Gender == '2')", ["Age_group"], "ReportingYear", None,
+        None, None, None, None, None, True, None, "percents", False)
+
+
+def output_gender_age_percent(df):
+    return processing.create_output_crosstab(
+        df, None, None, ["Gender"], "Age_group", None, None, None,
+        None, None, None, True, None, "percents", True)
+
+
+OUTPUT_ARGS = [
+    {"name": "output_1", "contents": [output_year_gender]},
+    {"name": "output_2", "contents": [output_age_year_females,
+                                      output_age_year_females_percent]},
+    {"name": "output_3", "contents": [output_gender_age_percent]},
+    {"name": "output_4", "contents": [output_age_year_females_percent]},
+    ]
+
+
+def compute_outputs(df, processes, start_method=None):
+    """
+    Creates the outputs with the filter cache and output cubes started, as
+    in write_outputs.
+    """
+    processing.start_filter_cache(df)
+    processing.start_output_cubes(df, OUTPUT_ARGS)
+    try:
+        return write_data.compute_outputs(df, OUTPUT_ARGS, processes,
+                                          start_method)
+    finally:
+        processing.end_output_cubes()
+        processing.end_filter_cache()
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_compute_outputs_parallel(start_method):
+    """
+    Tests the compute_outputs function creates the same outputs, in the same
+    order, when the outputs are created in forked or spawned worker processes
+    as when they are created one at a time.
+    """
+    if start_method not in mp.get_all_start_methods():
+        pytest.skip(f"{start_method} is not available")
+
+    input_df = create_source_data()
+
+    expected = compute_outputs(input_df, 1)
+    actual = compute_outputs(input_df, 2, start_method)
+
+    assert len(actual) == len(OUTPUT_ARGS)
+    for actual_output, expected_output in zip(actual, expected):
+        pd.testing.assert_frame_equal(actual_output, expected_output)
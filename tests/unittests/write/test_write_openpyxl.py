@@ -0,0 +1,157 @@
+import pytest
+import openpyxl
+import pandas as pd
+import numpy as np
+from srh_code.utilities.write import write_openpyxl, write_session
+
+
+def test_write_to_excel_variable(tmp_path):
+    """
+    Tests the write_to_excel_variable function adds rows to the existing data
+    where the dataframe has more rows, moving the content below it down.
+    """
+    output_path = tmp_path / "template.xlsx"
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = "Table 1"
+    for row in [3, 4]:
+        sht.cell(row, 1).value = "LA" + str(row)
+        sht.cell(row, 2).value = row
+    sht["A6"] = "Notes"
+    template.save(output_path)
+
+    input_df = pd.DataFrame({"Count": [10, np.nan, 30]},
+                            index=pd.Index(["LA1", "LA2", "LA3"], name="LA"))
+
+    wb = write_session.open_workbook(output_path, "openpyxl")
+    write_openpyxl.write_to_excel_variable(input_df, wb, "Table 1", "A3",
+                                           include_row_labels=True)
+    write_session.save_workbook(wb)
+
+    sht = openpyxl.load_workbook(output_path)["Table 1"]
+    actual = [row for row in sht.iter_rows(min_row=3, max_row=7, max_col=2,
+                                           values_only=True)]
+
+    expected = [("LA1", 10), ("LA2", None), ("LA3", 30), (None, None),
+                ("Notes", None)]
+
+    assert actual == expected
+
+
+def test_check_latest_year(tmp_path):
+    """
+    Tests the check_latest_year function moves a time series (with years as
+    rows) up one row where the latest year is not the reporting year.
+    """
+    output_path = tmp_path / "template.xlsx"
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = "Table 1"
+    for n, row in enumerate(range(2, 13)):
+        sht.cell(row, 1).value = str(2010 + n)
+        sht.cell(row, 2).value = n
+        sht.cell(row, 3).value = "=B" + str(row) + "*2"
+    sht["C13"] = "mark_last_col"
+    template.save(output_path)
+
+    wb = write_session.open_workbook(output_path, "openpyxl")
+    write_openpyxl.check_latest_year(wb, "Table 1", "A12", "2021")
+    write_session.save_workbook(wb)
+
+    sht = openpyxl.load_workbook(output_path)["Table 1"]
+
+    assert sht["A2"].value == "2011"
+    assert sht["B2"].value == 1
+    assert sht["C2"].value == "=B2*2"
+    assert sht["A11"].value == "2020"
+    assert sht["A12"].value == "2021"
+
+
+def create_headers_template(output_path, sheetname):
+    """
+    Creates a template with a two column table (headers in row 7 and data in
+    rows 8 to 9 of columns B and C), with a merged cell and a column with a
+    custom width to the right of the table.
+    """
+    template = openpyxl.Workbook()
+    sht = template.active
+    sht.title = sheetname
+    sht["B7"], sht["C7"] = "2020-21", "2021-22"
+    for row in [8, 9]:
+        sht.cell(row, 2).value = 1
+        sht.cell(row, 3).value = 2
+    sht.column_dimensions["C"].width = 12
+    sht["E1"] = "Notes"
+    sht.merge_cells("E1:F1")
+    sht.column_dimensions["E"].width = 30
+    template.save(output_path)
+
+
+@pytest.mark.parametrize("columns, notes_col", [
+    (["2018-19", "2019-20", "2020-21", "2021-22"], "G"),
+    (["2021-22"], "D")])
+def test_write_to_excel_with_headers(tmp_path, columns, notes_col):
+    """
+    Tests the write_to_excel_with_headers function inserts or deletes columns
+    at the end of the existing table to match the dataframe columns, moving
+    the merged cell and column width to the right of the table with them.
+    """
+    output_path = tmp_path / "template.xlsx"
+    create_headers_template(output_path, "Table 2")
+
+    input_df = pd.DataFrame([[n + 10 for n in range(len(columns))]] * 2,
+                            columns=columns)
+
+    wb = write_session.open_workbook(output_path, "openpyxl")
+    write_openpyxl.write_to_excel_with_headers(input_df, wb, "Table 2", "B8",
+                                               "B7")
+    write_session.save_workbook(wb)
+
+    sht = openpyxl.load_workbook(output_path)["Table 2"]
+    last_col = 1 + len(columns)
+    headers = [cell.value for cell in sht[7][1:last_col + 1]]
+    values = [[cell.value for cell in row[1:last_col + 1]]
+              for row in sht.iter_rows(min_row=8, max_row=9)]
+
+    assert headers == columns + [None]
+    assert values == [[n + 10 for n in range(len(columns))] + [None]] * 2
+    assert sht[notes_col + "1"].value == "Notes"
+    notes_index = openpyxl.utils.column_index_from_string(notes_col)
+    assert [str(cell_range) for cell_range in sht.merged_cells.ranges] == [
+        f"{notes_col}1:{openpyxl.utils.get_column_letter(notes_index + 1)}1"]
+    assert sht.column_dimensions[notes_col].width == 30
+    if len(columns) > 2:
+        # Inserted columns take the width of the column to their left
+        assert sht.column_dimensions["D"].width == 12
+        assert sht.column_dimensions["E"].width == 12
+
+
+def test_write_to_excel_with_headers_table_20(tmp_path):
+    """
+    Tests the write_to_excel_with_headers function applies the Table 20
+    borders and labels across the written columns.
+    """
+    output_path = tmp_path / "template.xlsx"
+    create_headers_template(output_path, "Table 20c")
+
+    input_df = pd.DataFrame([[1, 2, 3]] * 2,
+                            columns=["2019-20", "2020-21", "2021-22"])
+
+    wb = write_session.open_workbook(output_path, "openpyxl")
+    write_openpyxl.write_to_excel_with_headers(input_df, wb, "Table 20c",
+                                               "B8", "B7")
+    write_session.save_workbook(wb)
+
+    sht = openpyxl.load_workbook(output_path)["Table 20c"]
+
+    for col in range(2, 5):
+        assert sht.cell(5, col).border.top.style == "thin"
+        assert sht.cell(5, col).border.bottom.style == "thin"
+        # The header border is applied around rows 5 to 7
+        assert sht.cell(7, col).border.bottom.style == "thin"
+        # The bottom border is applied to the row below the data
+        assert sht.cell(10, col).border.bottom.style == "thin"
+    assert sht.cell(5, 5).border.top.style is None
+    assert sht["B5"].value == ("Contacts by Local Authority of patient "
+                               "residence (thousands)")
+    assert sht["D4"].value == "Thousands"